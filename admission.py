@@ -0,0 +1,190 @@
+"""
+Admission control for the public API
+Booking, order, booking lookup, STK push and sign-in requests are rate
+limited per client and per route, and may only occupy part of the worker's
+request slots, so a scraper or a retry loop can neither saturate the single
+SQLite writer nor starve the Safaricom callbacks: those are never rate limited
+and always have the reserved slots to themselves.
+
+Rate limits use GCRA, the single-number form of a token bucket: each key
+stores only the time at which its bucket will be full again, so a check is
+one dict read and one dict write with no lock. Two threads racing on the same
+key can at worst both be admitted, which costs one request of slack.
+"""
+
+import math
+import os
+import threading
+import time
+
+# Requests per second and burst, per client and for the route as a whole
+DEFAULT_LIMITS = {
+    'create_booking': {'client': (10 / 60, 5), 'route': (2.0, 20)},
+    'create_marketplace_order': {'client': (10 / 60, 5), 'route': (2.0, 20)},
+    'get_booking': {'client': (1.0, 20), 'route': (20.0, 100)},
+    'list_bookings': {'client': (1.0, 10), 'route': (5.0, 20)},
+    'initiate_stk_push': {'client': (3 / 60, 3), 'route': (1.0, 10)},
+    # Password guessing
+    'staff_login': {'client': (5 / 60, 5), 'route': (1.0, 10)},
+}
+
+# Safaricom callbacks and health probes: never limited, never refused a slot
+PRIORITY_ENDPOINTS = (
+    'mpesa_validation', 'mpesa_confirmation', 'mpesa_callback', 'stk_push_callback',
+    'liveness', 'readiness'
+)
+
+# Requests served at once per worker process (its thread count) and how many
+# of those only priority endpoints may use
+MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 16))
+RESERVED_SLOTS = int(os.getenv('ADMISSION_RESERVED_SLOTS', 4))
+
+# Clients remembered per limiter before idle ones are dropped
+MAX_KEYS = 10000
+
+
+class RateLimiter:
+    """Token bucket (as GCRA) per key"""
+
+    def __init__(self, rate, burst, max_keys=MAX_KEYS):
+        """
+        Args:
+            rate: Requests per second allowed on average
+            burst: Requests allowed back to back
+        """
+        self.interval = 1.0 / rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> time the bucket is full again (theoretical arrival time)
+        self._tat = {}
+
+    def hit(self, key, now=None):
+        """
+        Take one request from the key's bucket
+
+        Returns:
+            0 if admitted, else seconds until a request would be
+        """
+        now = now or time.monotonic()
+        tat = max(self._tat.get(key, now), now)
+        allowed_at = tat + self.interval - self.burst * self.interval
+        if now < allowed_at:
+            return allowed_at - now
+        if len(self._tat) >= self.max_keys and key not in self._tat:
+            self._prune(now)
+        self._tat[key] = tat + self.interval
+        return 0
+
+    def refund(self, key):
+        """Give back the request taken by the last hit() for a key"""
+        tat = self._tat.get(key)
+        if tat is not None:
+            self._tat[key] = tat - self.interval
+
+    def _prune(self, now):
+        """Forget keys whose bucket is already full again"""
+        for key, tat in list(self._tat.items()):
+            if tat <= now:
+                self._tat.pop(key, None)
+
+
+class AdmissionController:
+    """
+    Per-route rate limits plus request slots with a priority reserve
+
+    A request counts against its route's budget only once its client's own
+    limit admits it, so one client hammering a route cannot use up the route
+    for everyone else:
+
+    >>> controller = AdmissionController({'get_booking': {'client': (1.0, 5), 'route': (1.0, 10)}})
+    >>> for _ in range(200):
+    ...     reason, _ = controller.admit('get_booking', '10.0.0.1')
+    ...     if reason is None:
+    ...         controller.release()
+    >>> controller.admit('get_booking', '10.0.0.1')[0]
+    'rate_limited'
+    >>> controller.admit('get_booking', '10.0.0.2')
+    (None, 0)
+    """
+
+    def __init__(self, limits=DEFAULT_LIMITS, priority=PRIORITY_ENDPOINTS,
+                 max_in_flight=MAX_IN_FLIGHT, reserved=RESERVED_SLOTS):
+        """
+        Args:
+            limits: {endpoint: {'client': (rate, burst), 'route': (rate, burst)}}
+            priority: Endpoints that bypass limits and use the reserved slots
+            max_in_flight: Requests handled at once in this process
+            reserved: Slots kept free for priority endpoints
+        """
+        self.limits = {
+            endpoint: {scope: RateLimiter(*spec) for scope, spec in scopes.items()}
+            for endpoint, scopes in limits.items()
+        }
+        self.priority = frozenset(priority)
+        self.max_in_flight = max_in_flight
+        self.reserved = min(reserved, max_in_flight - 1)
+        self._slots = threading.BoundedSemaphore(max_in_flight - self.reserved)
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.priority_admitted = 0
+        self.rejected = {}
+
+    def admit(self, endpoint, client):
+        """
+        Decide whether to serve a request
+
+        Returns:
+            (None, 0) if admitted, else (reason, retry_after seconds) with
+            reason 'rate_limited' or 'overloaded'. An admitted request
+            that is not a priority one holds a slot until release().
+        """
+        if endpoint in self.priority:
+            self._count('priority_admitted')
+            return None, 0
+
+        limiters = self.limits.get(endpoint)
+        if limiters:
+            # The route bucket is only charged for requests the client's admits
+            wait = limiters['client'].hit(client) if 'client' in limiters else 0
+            if not wait and 'route' in limiters:
+                wait = limiters['route'].hit(endpoint)
+                if wait and 'client' in limiters:
+                    limiters['client'].refund(client)
+            if wait:
+                self._reject(endpoint, 'rate_limited')
+                return 'rate_limited', wait
+
+        if not self._slots.acquire(blocking=False):
+            self._reject(endpoint, 'overloaded')
+            return 'overloaded', 1
+        self._count('admitted')
+        return None, 0
+
+    def release(self):
+        """Give back the slot of an admitted non-priority request"""
+        self._slots.release()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _reject(self, endpoint, reason):
+        with self._lock:
+            counts = self.rejected.setdefault(endpoint, {'rate_limited': 0, 'overloaded': 0})
+            counts[reason] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'max_in_flight': self.max_in_flight,
+                'reserved_slots': self.reserved,
+                'admitted': self.admitted,
+                'priority_admitted': self.priority_admitted,
+                'rejected': {endpoint: dict(counts) for endpoint, counts in self.rejected.items()}
+            }
+
+
+def retry_after_header(seconds):
+    """Retry-After value: whole seconds, at least 1"""
+    return str(max(1, math.ceil(seconds)))
@@ -4,12 +4,12 @@ Bridge Server API for Community Tourism Relay System
 This handles web bookings and converts them to SMS for community stewards
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import sqlite3
 import os
-from datetime import datetime
-import uuid
+from datetime import date, datetime, timedelta
 import json
 
 # Import Safaricom API integration
@@ -20,9 +20,71 @@ except ImportError:
     SAFARICOM_ENABLED = False
     print("Warning: Safaricom API integration not available. Install dependencies and configure safaricom_config.py")
 
+from static_cache import StaticFileCache
+from gallery_manifest import GalleryManifest
+from catalog import (
+    init_catalog, parse_fields, catalog_revision,
+    list_products, get_product, update_product, search_products, price_band_clause
+)
+from orders import init_orders, create_order, sales_summary
+from sync import init_sync, changes_since
+from service_worker import ServiceWorkerScript
+from sms_replies import apply_replies, reply_template, MAX_BATCH_SIZE
+from sms_gateway import gateway_from_env, init_sms_outbox, queue_sms, record_delivery, SmsDispatcher
+from steward_digest import init_steward_alerts, queue_alert, alert_summary, is_urgent, DigestScheduler
+from booking_codes import next_code, normalize_code, code_range, CODE_LENGTH
+import reservations
+from reservations import (
+    init_reservations, create_holds, secure_holds, release_holds, start_checkout,
+    checkout_booking, fail_checkout, availability, CapacityError, HoldExpirer
+)
+from admission import AdmissionController, retry_after_header
+from auth import ROLE_PASSWORDS, TOKEN_TTL, check_password, issue_token, has_role, require_role
+
 app = Flask(__name__, static_folder='.')
 CORS(app)  # Enable CORS for frontend
 
+# Behind a reverse proxy, take the client address from X-Forwarded-For
+# (TRUSTED_PROXIES = number of proxies in front of the app)
+if int(os.getenv('TRUSTED_PROXIES', 0)):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('TRUSTED_PROXIES')))
+
+# Rate limits on public endpoints, with request slots reserved for M-Pesa callbacks
+admission = AdmissionController()
+
+@app.before_request
+def admit_request():
+    """Refuse rate-limited clients (429) and public requests beyond their slots (503)"""
+    reason, retry_after = admission.admit(request.endpoint, request.remote_addr)
+    if reason:
+        response = jsonify({
+            'error': 'Too many requests' if reason == 'rate_limited' else 'Server busy, try again shortly',
+            'retry_after': retry_after_header(retry_after)
+        })
+        response.status_code = 429 if reason == 'rate_limited' else 503
+        response.headers['Retry-After'] = retry_after_header(retry_after)
+        return response
+    g.admitted = request.endpoint not in admission.priority
+
+@app.teardown_request
+def release_request(exc):
+    if g.pop('admitted', False):
+        admission.release()
+
+# Static file engine: small files served from memory, large ones via file wrapper
+static_files = StaticFileCache(
+    '.',
+    max_file_size=int(os.getenv('STATIC_CACHE_MAX_FILE_SIZE', 256 * 1024)),
+    max_cache_bytes=int(os.getenv('STATIC_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    max_age=int(os.getenv('STATIC_MAX_AGE', 0))
+)
+
+# Service worker, versioned by the content of the files it precaches
+service_worker = ServiceWorkerScript('.')
+
+# Gallery metadata (dimensions, placeholders, srcset), rebuilt when images/ changes
+gallery = GalleryManifest('images', os.getenv('GALLERY_MANIFEST', 'gallery_manifest.json'))
+
 # Database setup
 DB_NAME = 'ctr_database.db'
 
@@ -99,30 +161,111 @@ def init_db():
             ])
         ))
     
+    # Marketplace catalogue (seeded from products/products.json on first run)
+    init_catalog(cursor)
+    
+    # Marketplace orders and their running sales aggregates
+    init_orders(cursor)
+    
+    # Outbound SMS queue
+    init_sms_outbox(cursor)
+    init_steward_alerts(cursor)
+    
+    # Capacity held by unpaid bookings and STK checkouts, released on expiry
+    init_reservations(cursor)
+    
+    # Change log behind the delta-sync endpoint (needs the tables above)
+    init_sync(cursor)
+    
     conn.commit()
     conn.close()
 
 # Initialize database on startup
 init_db()
 
-def generate_booking_code():
-    """Generate a unique booking code"""
-    date_str = datetime.now().strftime("%Y%m%d")
-    unique_id = str(uuid.uuid4())[:8].upper()
-    return f"V{date_str}-{unique_id}"
+# Outbound SMS: bulk sends through the configured gateway from a background thread
+sms_provider = gateway_from_env()
+sms_dispatcher = SmsDispatcher(DB_NAME, sms_provider)
+# Booking alerts collapsed into one digest per steward per window
+digest_scheduler = DigestScheduler(DB_NAME, sms_dispatcher)
+# Releases expired reservation holds and abandoned STK checkouts
+hold_expirer = HoldExpirer(DB_NAME)
+
+def start_background_workers():
+    """
+    Start this process's SMS dispatcher, digest scheduler and hold expirer
+    Each also starts on its first wake(), but after a restart there may be
+    SMS retries, digests and expiries due before any booking arrives, so
+    every worker calls this when it starts (gunicorn.conf.py).
+    """
+    sms_dispatcher.wake()
+    digest_scheduler.wake()
+    hold_expirer.wake()
+
+def generate_booking_code(cursor):
+    """
+    Generate a unique, time-ordered booking code (see booking_codes.py)
+    Called under the write lock, so the code cannot be taken between the
+    check and the insert.
+    """
+    while True:
+        booking_code = next_code()
+        cursor.execute('SELECT 1 FROM bookings WHERE booking_code = ?', (booking_code,))
+        if cursor.fetchone() is None:
+            return booking_code
 
 def send_sms_to_steward(phone, message):
     """
-    Send SMS to steward via SMS gateway
-    In production, integrate with Africa's Talking, Moya Messenger, or Safaricom API
+    Queue an SMS to a steward in the outbox
+    The dispatcher sends queued messages in bulk through the configured
+    gateway (SMS_GATEWAY, see sms_gateway.py); delivery reports arrive at
+    /api/sms/delivery.
     """
-    # TODO: Implement actual SMS sending
-    # For now, just log it
-    print(f"[SMS TO STEWARD {phone}]")
-    print(message)
-    print("-" * 50)
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        queue_sms(conn.cursor(), phone, message)
+        conn.commit()
+    finally:
+        conn.close()
+    sms_dispatcher.wake()
     return True
 
+def send_alert_to_steward(phone, booking_code, summary, message, urgent):
+    """
+    Hold a booking alert for the steward's next digest (see steward_digest.py)
+    Urgent alerts are sent at once together with any alerts already waiting.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        queue_alert(conn.cursor(), phone, booking_code, summary, message, urgent)
+        conn.commit()
+    finally:
+        conn.close()
+    digest_scheduler.wake()
+    return True
+
+def alert_overbooked(booking_code, services):
+    """
+    Tell the steward at once that a booking was paid after its hold expired
+    and some services no longer have room (status 'overbooked')
+    """
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        row = conn.execute('''
+            SELECT steward_contact, arrival_date, num_visitors, tourist_contact
+            FROM bookings WHERE booking_code = ?
+        ''', (booking_code,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return False
+    steward_phone, arrival_date, num_visitors, contact = row
+    print(f"[HOLDS] Paid booking {booking_code} is over capacity for: {', '.join(services)}")
+    message = (f"OVERBOOKED {booking_code}: paid after its hold expired, no room left on "
+               f"{arrival_date} for {num_visitors} in {', '.join(services)}. "
+               f"Please arrange or refund. Tel {contact}")
+    return send_alert_to_steward(steward_phone, booking_code, message, message, True)
+
 def send_email_confirmation(email, booking_code, booking_details):
     """
     Send email confirmation to tourist
@@ -138,12 +281,22 @@ def send_email_confirmation(email, booking_code, booking_details):
 @app.route('/')
 def index():
     """Serve the main HTML file"""
-    return send_from_directory('.', 'index.html')
+    return static_files.serve('index.html')
+
+@app.route('/sw.js')
+def serve_service_worker():
+    """Serve the service worker with its precache list and version filled in"""
+    body, version = service_worker.render()
+    response = app.response_class(body, mimetype='application/javascript')
+    response.set_etag(version)
+    # Browsers must revalidate so a new version is picked up on the next visit
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/<path:path>')
 def serve_static(path):
     """Serve static files"""
-    return send_from_directory('.', path)
+    return static_files.serve(path)
 
 @app.route('/api/booking', methods=['POST'])
 def create_booking():
@@ -166,21 +319,19 @@ def create_booking():
                 if field not in data or not data[field]:
                     return jsonify({'error': f'Missing required card field: {field}'}), 400
         
-        # Generate booking code
-        booking_code = generate_booking_code()
-        
-        # Get community steward info
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('SELECT steward_name, steward_phone FROM communities WHERE community_name = ?', 
-                      ('Il Ngwesi',))
-        community = cursor.fetchone()
-        
-        if not community:
-            conn.close()
-            return jsonify({'error': 'Community not found'}), 500
-        
-        steward_name, steward_phone = community
+        # Validate values before taking the write lock
+        num_visitors = data['numVisitors']
+        if isinstance(num_visitors, bool) or not isinstance(num_visitors, int) or num_visitors < 1:
+            return jsonify({'error': 'numVisitors must be a positive integer'}), 400
+        services = data['services']
+        if not isinstance(services, list) or not services or not all(isinstance(s, str) for s in services):
+            return jsonify({'error': 'services must be a non-empty list of service codes'}), 400
+        if isinstance(data['totalAmount'], bool) or not isinstance(data['totalAmount'], (int, float)):
+            return jsonify({'error': 'totalAmount must be a number'}), 400
+        try:
+            date.fromisoformat(str(data['arrivalDate']))
+        except ValueError:
+            return jsonify({'error': 'arrivalDate must be a date as YYYY-MM-DD'}), 400
         
         # Prepare payment info
         payment_info = {
@@ -197,30 +348,67 @@ def create_booking():
         elif payment_method == 'paypal':
             payment_info['paypal_ready'] = True
         
-        # Insert booking into database
-        cursor.execute('''
-            INSERT INTO bookings (
-                booking_code, tourist_name, tourist_contact, tourist_email,
-                arrival_date, num_visitors, requested_services, steward_contact,
-                total_amount, special_requests, status, payment_status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            booking_code,
-            data['touristName'],
-            data['touristPhone'],
-            data['touristEmail'],
-            data['arrivalDate'],
-            data['numVisitors'],
-            json.dumps(data['services']),
-            steward_phone,
-            data['totalAmount'],
-            data.get('specialRequests', ''),
-            'pending',
-            json.dumps(payment_info)
-        ))
-        
-        conn.commit()
-        conn.close()
+        # Holds and the booking are written in one BEGIN IMMEDIATE transaction,
+        # so concurrent bookings for the last places are decided one at a time.
+        # Every exit rolls back or commits, so the write lock is never left held.
+        conn = reservations.connect(DB_NAME)
+        try:
+            cursor = conn.cursor()
+            reservations.begin_immediate(conn)
+            
+            # Generate booking code
+            booking_code = generate_booking_code(cursor)
+            
+            # Get community steward info
+            cursor.execute('SELECT steward_name, steward_phone FROM communities WHERE community_name = ?', 
+                          ('Il Ngwesi',))
+            community = cursor.fetchone()
+            
+            if not community:
+                conn.rollback()
+                return jsonify({'error': 'Community not found'}), 500
+            
+            steward_name, steward_phone = community
+            
+            # Hold the places until the booking is paid or the hold expires
+            create_holds(cursor, booking_code, data['arrivalDate'], services, num_visitors)
+            
+            # Insert booking into database
+            cursor.execute('''
+                INSERT INTO bookings (
+                    booking_code, tourist_name, tourist_contact, tourist_email,
+                    arrival_date, num_visitors, requested_services, steward_contact,
+                    total_amount, special_requests, status, payment_status
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                booking_code,
+                data['touristName'],
+                data['touristPhone'],
+                data['touristEmail'],
+                data['arrivalDate'],
+                num_visitors,
+                json.dumps(services),
+                steward_phone,
+                data['totalAmount'],
+                data.get('specialRequests', ''),
+                'pending',
+                json.dumps(payment_info)
+            ))
+            
+            conn.commit()
+        except CapacityError as e:
+            conn.rollback()
+            return jsonify({
+                'error': str(e),
+                'service': e.service,
+                'available': e.available
+            }), 409
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        hold_expirer.wake()
         
         # Prepare SMS message for steward
         services_map = {
@@ -240,14 +428,21 @@ Visitors: {data['numVisitors']} {'person' if data['numVisitors'] == 1 else 'peop
 Requested: {services_list}
 Contact: {data['touristPhone']}
 Email: {data['touristEmail']}
-Reply: CONFIRM {booking_code} [YES/NO for each service]
+Reply: {reply_template(booking_code, data['services'])}
 Code: {booking_code}"""
         
         if data.get('specialRequests'):
             sms_message += f"\nNotes: {data['specialRequests']}"
         
-        # Send SMS to steward
-        send_sms_to_steward(steward_phone, sms_message)
+        # Alert the steward: urgent arrivals now, the rest in the next digest
+        send_alert_to_steward(
+            steward_phone,
+            booking_code,
+            alert_summary(booking_code, data['arrivalDate'], data['numVisitors'],
+                          data['services'], data['touristPhone']),
+            sms_message,
+            is_urgent(data['arrivalDate'])
+        )
         
         # Send email confirmation to tourist
         email_message = f"""
@@ -286,6 +481,10 @@ People of Wildlife
 @app.route('/api/booking/<booking_code>', methods=['GET'])
 def get_booking(booking_code):
     """Get booking status by code"""
+    booking_code = normalize_code(booking_code)
+    if not booking_code:
+        return jsonify({'error': 'Invalid booking code'}), 400
+    
     try:
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
@@ -319,52 +518,127 @@ def get_booking(booking_code):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/bookings', methods=['GET'])
+@require_role('community')
+def list_bookings():
+    """
+    Bookings made between ?from=YYYY-MM-DD and ?to=YYYY-MM-DD (UTC, inclusive)
+    Needs a community dashboard token: tourists' names are listed.
+    Booking codes sort by creation time, so the dates become a range scan of
+    the booking_code index; codes from before time-ordered codes are not listed.
+    """
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('to', request.args['from']), '%Y-%m-%d') + timedelta(days=1)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from (and optionally to) must be dates as YYYY-MM-DD'}), 400
+    
+    try:
+        low, high = code_range(start, end)
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT booking_code, tourist_name, arrival_date, num_visitors,
+                   requested_services, status, payment_status, total_amount
+            FROM bookings
+            WHERE booking_code >= ? AND booking_code < ? AND length(booking_code) = ?
+            ORDER BY booking_code
+        ''', (low, high, CODE_LENGTH))
+        rows = cursor.fetchall()
+        conn.close()
+    
+        return jsonify({
+            'from': request.args['from'],
+            'to': request.args.get('to', request.args['from']),
+            'bookings': [{
+                'booking_code': row[0],
+                'tourist_name': row[1],
+                'arrival_date': row[2],
+                'num_visitors': row[3],
+                'requested_services': json.loads(row[4]),
+                'status': row[5],
+                'payment_status': row[6],
+                'total_amount': float(row[7])
+            } for row in rows]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/sms/incoming', methods=['POST'])
 def receive_sms():
     """
     Receive SMS from stewards (webhook endpoint)
-    Format: "CONFIRM V20240314-001 WALK YES HOME YES"
+    Format: "CONFIRM V20240314-1A2B3C4D WALK YES HOME NO" (see sms_replies.py)
+    Accepts one message {from, message} or a gateway batch {messages: [...]};
+    a batch is applied in a single transaction.
     """
     try:
-        data = request.json
-        phone = data.get('from')
-        message = data.get('message', '').strip().upper()
-        
-        # Parse confirmation message
-        if message.startswith('CONFIRM'):
-            parts = message.split()
-            if len(parts) >= 2:
-                booking_code = parts[1]
-                
-                # Update booking status
-                conn = sqlite3.connect(DB_NAME)
-                cursor = conn.cursor()
-                
-                # Parse confirmed services from message
-                # This is simplified - in production, parse more carefully
-                confirmed_services = []
-                if 'WALK YES' in message or 'GUIDED_WALK YES' in message:
-                    confirmed_services.append('guided_walk')
-                if 'HOME YES' in message or 'HOMESTAY YES' in message:
-                    confirmed_services.append('homestay')
-                # Add more parsing logic as needed
-                
-                cursor.execute('''
-                    UPDATE bookings
-                    SET status = 'confirmed',
-                        confirmed_services = ?
-                    WHERE booking_code = ?
-                ''', (json.dumps(confirmed_services), booking_code))
-                
-                conn.commit()
-                conn.close()
-                
-                # Send confirmation email/SMS to tourist
-                # TODO: Implement notification to tourist
-                
-                return jsonify({'success': True, 'message': 'Booking confirmed'}), 200
+        data = request.json or {}
+        batch = isinstance(data, list) or 'messages' in data
+        messages = data if isinstance(data, list) else data.get('messages', [data])
+        
+        if not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages):
+            return jsonify({'error': 'messages must be a list of {from, message} objects'}), 400
+        if len(messages) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} messages per request'}), 400
+        
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        try:
+            results = apply_replies(cursor, messages)
+            # Declined services give their places back
+            for result in results:
+                for booking in result['bookings']:
+                    release_holds(cursor, booking['booking_code'], booking['declined_services'])
+            conn.commit()
+        finally:
+            conn.close()
+        
+        # Send confirmation email/SMS to tourist
+        # TODO: Implement notification to tourist
+        
+        if batch:
+            return jsonify({
+                'success': True,
+                'processed': len(results),
+                'confirmed': sum(1 for r in results for b in r['bookings'] if b['status'] == 'confirmed'),
+                'results': results
+            }), 200
+        
+        result = results[0]
+        if not result['bookings']:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid SMS format',
+                'errors': result['errors']
+            }), 400
+        return jsonify({
+            'success': True,
+            'message': 'Booking confirmed' if any(b['status'] == 'confirmed' for b in result['bookings'])
+                       else 'Booking declined',
+            'bookings': result['bookings'],
+            'errors': result['errors']
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sms/delivery', methods=['POST'])
+def receive_sms_delivery_report():
+    """Delivery reports from the SMS gateway (JSON or form-encoded, per provider)"""
+    try:
+        payload = request.get_json(silent=True) or request.form.to_dict()
+        reports = sms_provider.parse_delivery_reports(payload)
+        
+        conn = sqlite3.connect(DB_NAME)
+        try:
+            updated = record_delivery(conn.cursor(), reports)
+            conn.commit()
+        finally:
+            conn.close()
         
-        return jsonify({'success': False, 'message': 'Invalid SMS format'}), 400
+        return jsonify({'success': True, 'updated': updated}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -386,21 +660,29 @@ def mpesa_validation():
         bill_ref_number = data.get('BillRefNumber', '')  # Booking code
         msisdn = data.get('MSISDN', '')
         
+        # Mistyped account numbers fail the check character: no lookup needed
+        booking_ref = normalize_code(bill_ref_number)
+        if not booking_ref:
+            return jsonify({
+                "ResultCode": "C2B00012",
+                "ResultDesc": "Rejected - Invalid Account Number"
+            }), 200
+        
         # Validate the transaction
         # Check if booking exists and amount matches
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT booking_code, total_amount, payment_status
+            SELECT booking_code, total_amount, payment_status, status
             FROM bookings
             WHERE booking_code = ?
-        ''', (bill_ref_number,))
+        ''', (booking_ref,))
         
         booking = cursor.fetchone()
         conn.close()
         
         if booking:
-            booking_code, expected_amount, payment_status = booking
+            booking_code, expected_amount, payment_status, status = booking
             
             # Check if already paid
             if payment_status == 'paid':
@@ -409,6 +691,13 @@ def mpesa_validation():
                     "ResultDesc": "Rejected - Payment already received"
                 }), 200
             
+            # Holds released: the places may have gone to someone else
+            if status in ('expired', 'declined'):
+                return jsonify({
+                    "ResultCode": "C2B00012",
+                    "ResultDesc": "Rejected - Booking no longer open"
+                }), 200
+            
             # Validate amount (allow small variance for rounding)
             if abs(trans_amount - expected_amount) > 1.0:
                 return jsonify({
@@ -458,50 +747,65 @@ def mpesa_confirmation():
         last_name = data.get('LastName', '')
         org_account_balance = data.get('OrgAccountBalance', '0.00')
         
-        # Update booking payment status
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        # Check if booking exists
-        cursor.execute('''
-            SELECT booking_code, tourist_name, tourist_email, total_amount, payment_status
-            FROM bookings
-            WHERE booking_code = ?
-        ''', (bill_ref_number,))
-        
-        booking = cursor.fetchone()
-        
-        if booking:
-            booking_code, tourist_name, tourist_email, expected_amount, payment_status = booking
+        # Update booking payment status (under the write lock: places may
+        # have to be taken again for a late payment)
+        overbooked = []
+        conn = reservations.connect(DB_NAME)
+        try:
+            cursor = conn.cursor()
+            reservations.begin_immediate(conn)
             
-            # Update payment status
-            cursor.execute('''
-                UPDATE bookings
-                SET payment_status = 'paid',
-                    amount_paid = ?
-                WHERE booking_code = ?
-            ''', (trans_amount, booking_code))
+            # Check if booking exists (an account number failing the check character cannot)
+            booking = None
+            booking_ref = normalize_code(bill_ref_number)
+            if booking_ref:
+                cursor.execute('''
+                    SELECT booking_code, tourist_name, tourist_email, total_amount, payment_status
+                    FROM bookings
+                    WHERE booking_code = ?
+                ''', (booking_ref,))
+                booking = cursor.fetchone()
             
-            # Record transaction
-            cursor.execute('''
-                INSERT INTO transactions (booking_code, mpesa_code, amount, status, distribution_json)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                booking_code,
-                trans_id,
-                trans_amount,
-                'completed',
-                json.dumps({
-                    'trans_id': trans_id,
-                    'trans_time': trans_time,
-                    'msisdn': msisdn,
-                    'customer_name': f"{first_name} {middle_name} {last_name}".strip(),
-                    'org_balance': org_account_balance
-                })
-            ))
+            if booking:
+                booking_code, tourist_name, tourist_email, expected_amount, payment_status = booking
+                
+                # Update payment status
+                cursor.execute('''
+                    UPDATE bookings
+                    SET payment_status = 'paid',
+                        amount_paid = ?
+                    WHERE booking_code = ?
+                ''', (trans_amount, booking_code))
+                overbooked = secure_holds(cursor, booking_code)
+                
+                # Record transaction
+                cursor.execute('''
+                    INSERT INTO transactions (booking_code, mpesa_code, amount, status, distribution_json)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    booking_code,
+                    trans_id,
+                    trans_amount,
+                    'completed',
+                    json.dumps({
+                        'trans_id': trans_id,
+                        'trans_time': trans_time,
+                        'msisdn': msisdn,
+                        'customer_name': f"{first_name} {middle_name} {last_name}".strip(),
+                        'org_balance': org_account_balance
+                    })
+                ))
             
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             conn.close()
+        
+        if booking:
+            if overbooked:
+                alert_overbooked(booking_code, overbooked)
             
             # TODO: Send confirmation email/SMS to tourist
             # TODO: Notify steward of payment
@@ -510,7 +814,6 @@ def mpesa_confirmation():
             print(f"[M-PESA CONFIRMATION] Payment processed for booking {booking_code}")
             
         else:
-            conn.close()
             print(f"[M-PESA CONFIRMATION] Warning: Booking {bill_ref_number} not found")
         
         # Always return success to M-Pesa
@@ -534,13 +837,338 @@ def mpesa_callback():
 
 @app.route('/api/availability', methods=['GET'])
 def check_availability():
-    """Check community availability (placeholder)"""
-    # In production, this would query steward or maintain availability calendar
+    """Places left per service on ?date=YYYY-MM-DD (unpaid bookings count until their hold expires)"""
+    arrival_date = request.args.get('date')
+    if not arrival_date:
+        return jsonify({
+            'available': True,
+            'message': 'Pass ?date=YYYY-MM-DD for places left per service, or contact the steward'
+        }), 200
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        services = availability(conn.cursor(), arrival_date)
+        conn.close()
+        
+        return jsonify({
+            'date': arrival_date,
+            'available': any(s['available'] > 0 for s in services.values()),
+            'services': services
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the worker is up and answering (touches nothing else)"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()}), 200
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: the database is reachable and its schema is in place"""
+    try:
+        conn = sqlite3.connect(DB_NAME, timeout=2)
+        try:
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)",
+                ('bookings', 'reservation_holds', 'sms_outbox')
+            )}
+        finally:
+            conn.close()
+        if len(tables) < 3:
+            return jsonify({'status': 'not ready', 'reason': 'database schema missing'}), 503
+        return jsonify({'status': 'ready', 'pid': os.getpid()}), 200
+        
+    except sqlite3.Error as e:
+        return jsonify({'status': 'not ready', 'reason': str(e)}), 503
+
+@app.route('/api/admission/metrics', methods=['GET'])
+def get_admission_metrics():
+    """Admitted and rejected requests of this worker process"""
+    return jsonify(admission.snapshot()), 200
+
+@app.route('/api/reservations/metrics', methods=['GET'])
+def get_reservation_metrics():
+    """Write-lock contention and hold counters of this worker process"""
+    return jsonify(reservations.metrics.snapshot()), 200
+
+@app.route('/api/gallery', methods=['GET'])
+def get_gallery():
+    """Paginated gallery entries with intrinsic sizes, placeholders and srcset"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(48, max(1, int(request.args.get('per_page', 12))))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+    
+    try:
+        response = jsonify(gallery.page(page, per_page))
+        response.set_etag(f'{gallery.version}-{page}-{per_page}')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/products', methods=['GET'])
+def list_catalog_products():
+    """
+    List marketplace products
+    Query: after (keyset cursor), limit, category, ids, fields, include_inactive
+    (merchant token only)
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        after = int(request.args.get('after', 0))
+        limit = int(request.args.get('limit', 24))
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    
+    # Unlisted products are only shown to merchants
+    include_inactive = request.args.get('include_inactive') == '1'
+    if include_inactive and not has_role('merchant'):
+        return jsonify({'error': 'include_inactive needs a merchant sign-in'}), 401
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        # The whole catalogue shares one revision, so a matching ETag skips the query
+        etag = f'catalog-{catalog_revision(cursor)}'
+        if request.if_none_match.contains(etag):
+            conn.close()
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        items, next_cursor = list_products(
+            cursor,
+            fields=fields,
+            after=after,
+            limit=limit,
+            category=request.args.get('category') or None,
+            ids=ids,
+            include_inactive=include_inactive
+        )
+        conn.close()
+        
+        response = jsonify({'items': items, 'next_cursor': next_cursor})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache' if include_inactive else 'no-cache'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/products/search', methods=['GET'])
+def search_catalog_products():
+    """
+    Full-text product search with facet counts
+    Query: q, category, price_band, limit, offset, fields
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = int(request.args.get('limit', 24))
+        offset = int(request.args.get('offset', 0))
+        price_band = request.args.get('price_band') or None
+        if price_band:
+            price_band_clause(price_band)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        # Results only change with the catalogue; browsers key the ETag by URL
+        etag = f'search-{catalog_revision(cursor)}'
+        if request.if_none_match.contains(etag):
+            conn.close()
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        results = search_products(
+            cursor,
+            request.args.get('q', ''),
+            fields=fields,
+            category=request.args.get('category') or None,
+            price_band=price_band,
+            limit=limit,
+            offset=offset
+        )
+        conn.close()
+        
+        response = jsonify(results)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/products/<int:product_id>', methods=['GET'])
+def get_catalog_product(product_id):
+    """Get a single marketplace product (supports ?fields= and If-None-Match)"""
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        product, revision = get_product(cursor, product_id, fields, include_inactive=has_role('merchant'))
+        conn.close()
+        
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        
+        response = jsonify(product)
+        response.set_etag(f'product-{product_id}-{revision}')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/auth/login', methods=['POST'])
+def staff_login():
+    """
+    Sign in to a dashboard
+    Body: role ('merchant' or 'community'), username, password. Returns a bearer token.
+    """
+    data = request.json or {}
+    role = data.get('role')
+    username = str(data.get('username') or '').strip()
+    
+    if role not in ROLE_PASSWORDS or not username:
+        return jsonify({'error': f"role (one of: {', '.join(ROLE_PASSWORDS)}) and username are required"}), 400
+    if not check_password(role, data.get('password')):
+        return jsonify({'error': 'Wrong username or password'}), 401
+    
     return jsonify({
-        'available': True,
-        'message': 'Contact steward for current availability'
+        'token': issue_token(role, username),
+        'role': role,
+        'username': username,
+        'expires_in': TOKEN_TTL
     }), 200
 
+@app.route('/api/products/<int:product_id>', methods=['PUT', 'PATCH'])
+@require_role('merchant')
+def update_catalog_product(product_id):
+    """
+    Update a marketplace product (merchant edits, needs a merchant token)
+    Send If-Match with the product's ETag to reject edits made against a stale copy
+    """
+    try:
+        # Anything but a JSON object is rejected by update_product
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        _, revision = get_product(cursor, product_id, ('id',), include_inactive=True)
+        if revision is None:
+            conn.close()
+            return jsonify({'error': 'Product not found'}), 404
+        
+        if request.if_match and not request.if_match.contains(f'product-{product_id}-{revision}'):
+            conn.close()
+            return jsonify({'error': 'Product was modified by someone else; reload and retry'}), 412
+        
+        try:
+            update_product(cursor, product_id, data)
+        except ValueError as e:
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+        
+        conn.commit()
+        product, revision = get_product(cursor, product_id, include_inactive=True)
+        conn.close()
+        
+        response = jsonify({'success': True, 'product': product})
+        response.set_etag(f'product-{product_id}-{revision}')
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/orders', methods=['POST'])
+def create_marketplace_order():
+    """Place a marketplace order from checkout"""
+    try:
+        data = request.json or {}
+        
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        try:
+            order = create_order(cursor, data)
+        except ValueError as e:
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+        
+        conn.commit()
+        conn.close()
+        
+        return jsonify({'success': True, **order}), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sales/summary', methods=['GET'])
+def get_sales_summary():
+    """
+    Marketplace sales for the community dashboard
+    Query: days (per-day window, default 30), top (limit products)
+    """
+    try:
+        days = int(request.args.get('days', 30))
+        top = int(request.args['top']) if request.args.get('top') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        summary = sales_summary(cursor, days=days, top=top)
+        conn.close()
+        
+        return jsonify(summary)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sync', methods=['GET'])
+@require_role('community')
+def delta_sync():
+    """
+    Bookings, orders and payments changed since a client-held cursor
+    Needs a community dashboard token: the rows carry tourists' details.
+    Query: since (cursor from the previous response, 0 for a full sync), limit
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', 500))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        changes = changes_since(cursor, since=since, limit=limit)
+        conn.close()
+        
+        response = jsonify(changes)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/mpesa/register-urls', methods=['POST'])
 def register_mpesa_urls():
     """
@@ -601,11 +1229,15 @@ def initiate_stk_push():
         if not booking_code or not phone_number:
             return jsonify({'error': 'Missing booking_code or phone_number'}), 400
         
+        booking_code = normalize_code(booking_code)
+        if not booking_code:
+            return jsonify({'error': 'Invalid booking code'}), 400
+        
         # Get booking details
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT total_amount, payment_status, tourist_name
+            SELECT total_amount, payment_status, tourist_name, status
             FROM bookings
             WHERE booking_code = ?
         ''', (booking_code,))
@@ -616,10 +1248,12 @@ def initiate_stk_push():
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
         
-        total_amount, payment_status, tourist_name = booking
+        total_amount, payment_status, tourist_name, status = booking
         
         if payment_status == 'paid':
             return jsonify({'error': 'Booking already paid'}), 400
+        if status in ('expired', 'declined'):
+            return jsonify({'error': f'Booking {status}, please book again'}), 409
         
         # Format phone number (ensure it starts with 254)
         if not phone_number.startswith('254'):
@@ -641,14 +1275,19 @@ def initiate_stk_push():
         checkout_request_id = result.get('CheckoutRequestID')
         if checkout_request_id:
             conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE bookings
-                SET payment_status = 'pending_stk'
-                WHERE booking_code = ?
-            ''', (booking_code,))
-            conn.commit()
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE bookings
+                    SET payment_status = 'pending_stk'
+                    WHERE booking_code = ?
+                ''', (booking_code,))
+                # Falls back to 'pending' if no callback arrives in time
+                start_checkout(cursor, checkout_request_id, booking_code)
+                conn.commit()
+            finally:
+                conn.close()
+            hold_expirer.wake()
         
         return jsonify({
             'success': True,
@@ -697,56 +1336,88 @@ def stk_push_callback():
         
         if result_code == 0 and mpesa_receipt_number:
             # Payment successful
-            # Find booking by checkout request ID or phone number
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            # Try to find booking by phone number
-            cursor.execute('''
-                SELECT booking_code, total_amount
-                FROM bookings
-                WHERE tourist_contact LIKE ? AND payment_status = 'pending_stk'
-                ORDER BY created_at DESC
-                LIMIT 1
-            ''', (f'%{phone_number[-9:]}%',))
-            
-            booking = cursor.fetchone()
-            
-            if booking:
-                booking_code, expected_amount = booking
+            # Find booking by checkout request ID or phone number; a late
+            # callback still pays, even after the checkout timed out
+            overbooked = []
+            conn = reservations.connect(DB_NAME)
+            try:
+                cursor = conn.cursor()
+                reservations.begin_immediate(conn)
                 
-                # Update booking
-                cursor.execute('''
-                    UPDATE bookings
-                    SET payment_status = 'paid',
-                        amount_paid = ?
-                    WHERE booking_code = ?
-                ''', (amount / 100 if amount else expected_amount, booking_code))
+                booking = None
+                code = checkout_booking(cursor, checkout_request_id, pending_only=False)
+                if code:
+                    cursor.execute('''
+                        SELECT booking_code, total_amount FROM bookings WHERE booking_code = ?
+                    ''', (code,))
+                    booking = cursor.fetchone()
                 
-                # Record transaction
-                cursor.execute('''
-                    INSERT INTO transactions (booking_code, mpesa_code, amount, status, distribution_json)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    booking_code,
-                    mpesa_receipt_number,
-                    amount / 100 if amount else expected_amount,
-                    'completed',
-                    json.dumps({
-                        'checkout_request_id': checkout_request_id,
-                        'phone_number': phone_number,
-                        'result_code': result_code
-                    })
-                ))
+                if not booking:
+                    # Try to find booking by phone number
+                    cursor.execute('''
+                        SELECT booking_code, total_amount
+                        FROM bookings
+                        WHERE tourist_contact LIKE ? AND payment_status != 'paid'
+                          AND (payment_status = 'pending_stk'
+                               OR booking_code IN (SELECT booking_code FROM stk_checkouts))
+                        ORDER BY created_at DESC
+                        LIMIT 1
+                    ''', (f'%{str(phone_number)[-9:]}%',))
+                    booking = cursor.fetchone()
+                
+                if booking:
+                    booking_code, expected_amount = booking
+                    
+                    # Update booking
+                    cursor.execute('''
+                        UPDATE bookings
+                        SET payment_status = 'paid',
+                            amount_paid = ?
+                        WHERE booking_code = ?
+                    ''', (amount / 100 if amount else expected_amount, booking_code))
+                    overbooked = secure_holds(cursor, booking_code, checkout_request_id)
+                    
+                    # Record transaction
+                    cursor.execute('''
+                        INSERT INTO transactions (booking_code, mpesa_code, amount, status, distribution_json)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (
+                        booking_code,
+                        mpesa_receipt_number,
+                        amount / 100 if amount else expected_amount,
+                        'completed',
+                        json.dumps({
+                            'checkout_request_id': checkout_request_id,
+                            'phone_number': phone_number,
+                            'result_code': result_code
+                        })
+                    ))
                 
                 conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
                 conn.close()
-                
+            
+            if booking:
+                if overbooked:
+                    alert_overbooked(booking_code, overbooked)
                 print(f"[STK PUSH] Payment successful for booking {booking_code}")
             else:
-                conn.close()
                 print(f"[STK PUSH] Warning: Booking not found for phone {phone_number}")
         
+        elif checkout_request_id:
+            # Cancelled or failed: the visitor can start another checkout
+            conn = sqlite3.connect(DB_NAME)
+            try:
+                booking_code = fail_checkout(conn.cursor(), checkout_request_id)
+                conn.commit()
+            finally:
+                conn.close()
+            if booking_code:
+                print(f"[STK PUSH] Checkout for booking {booking_code} failed: {result_desc}")
+        
         # Always return success to Safaricom
         return jsonify({'ResultCode': 0, 'ResultDesc': 'Success'}), 200
         
@@ -757,6 +1428,7 @@ def stk_push_callback():
 if __name__ == '__main__':
     print("Starting Community Tourism Relay Bridge Server...")
     print("API endpoints available at http://localhost:5000/api/")
+    print("Development server; in production run: gunicorn -c gunicorn.conf.py app:app")
     
     if SAFARICOM_ENABLED:
         print("\nSafaricom Daraja API integration: ENABLED")
@@ -765,5 +1437,9 @@ if __name__ == '__main__':
         print("\nSafaricom Daraja API integration: DISABLED")
         print("Configure safaricom_config.py to enable M-Pesa integration")
     
-    app.run(debug=True, port=5000)
+    debug = os.getenv('FLASK_DEBUG') == '1'
+    # With the reloader, only the serving child runs the background threads
+    if not debug or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
+    app.run(debug=debug, port=5000)
 
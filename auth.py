@@ -0,0 +1,92 @@
+"""
+Staff sign-in
+Merchants and community stewards sign in with their role's password and get
+a signed, time-limited bearer token, which the dashboards send with the API
+calls that change the catalogue or return tourists' details. Passwords come
+from the environment (MERCHANT_PASSWORD, COMMUNITY_PASSWORD); a role without
+one cannot sign in, so its endpoints stay closed until it is set.
+
+Tokens are signed with SECRET_KEY. Without one a random key is made when the
+app is imported: preloaded gunicorn workers share it, but every restart signs
+everyone out.
+"""
+
+import hmac
+import os
+import secrets
+from functools import wraps
+
+from flask import request, jsonify, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+SECRET_KEY = os.getenv('SECRET_KEY') or secrets.token_hex(32)
+# Seconds a sign-in lasts
+TOKEN_TTL = int(os.getenv('AUTH_TOKEN_TTL', 12 * 3600))
+
+# Role -> environment variable holding its password
+ROLE_PASSWORDS = {
+    'merchant': 'MERCHANT_PASSWORD',
+    'community': 'COMMUNITY_PASSWORD',
+}
+
+_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='staff-token')
+
+
+def check_password(role, password):
+    """True if the password is the one configured for the role"""
+    expected = os.getenv(ROLE_PASSWORDS[role], '') if role in ROLE_PASSWORDS else ''
+    if not expected or not isinstance(password, str):
+        return False
+    return hmac.compare_digest(expected.encode(), password.encode())
+
+
+def issue_token(role, username):
+    """Signed token naming the role and the person signed in"""
+    return _serializer.dumps({'role': role, 'user': username})
+
+
+def read_token(token):
+    """
+    Claims of a bearer token
+
+    Returns:
+        {'role', 'user'}, or None if the token is forged or expired
+    """
+    try:
+        return _serializer.loads(token, max_age=TOKEN_TTL)
+    except BadSignature:
+        return None
+
+
+def request_claims():
+    """Claims of the current request's bearer token, or None"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return read_token(token.strip()) if scheme.lower() == 'bearer' and token else None
+
+
+def has_role(*roles):
+    """True if the current request carries a valid token for one of the roles"""
+    claims = request_claims()
+    return bool(claims) and claims.get('role') in roles
+
+
+def require_role(*roles):
+    """
+    Route decorator: 401 without a valid bearer token, 403 if it is for
+    another role. The claims are left in g.staff.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            claims = request_claims()
+            if not claims:
+                response = jsonify({'error': 'Sign in required'})
+                response.status_code = 401
+                response.headers['WWW-Authenticate'] = 'Bearer'
+                return response
+            if claims.get('role') not in roles:
+                return jsonify({'error': 'This account cannot do that'}), 403
+            g.staff = claims
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Parsing benchmark: full BeautifulSoup trees vs the single-pass html_scan
+Runs over saved copies of the scraped pages: the page bodies kept in the
+scrapers' HTTP cache, or any HTML files given on the command line.
+
+Usage: python benchmark_parsing.py [iterations] [page.html ...]
+"""
+
+import re
+import sqlite3
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from html_scan import LXML_ENABLED, scan_page
+from http_cache import CACHE_PATH
+
+
+def load_pages(paths):
+    """Page bodies from the given files, else every cached HTML body"""
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+        return pages
+
+    conn = sqlite3.connect(CACHE_PATH)
+    try:
+        rows = conn.execute(
+            "SELECT body FROM http_cache WHERE body IS NOT NULL AND filepath = ''"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows if b'<html' in row[0][:2048].lower()]
+
+
+def soup_extract(content, parser='html.parser'):
+    """What the scrapers used to do: one full tree, then a walk per extraction"""
+    soup = BeautifulSoup(content, parser)
+    images = soup.find_all('img')
+    backgrounds = soup.find_all(style=re.compile(r'background-image'))
+    stylesheets = soup.find_all('link', rel='stylesheet')
+    containers = soup.find_all(['div', 'article', 'li', 'a'], class_=re.compile(r'product|item|card|grid', re.I))
+    for img in images:
+        img.find_parent(['div', 'article', 'a', 'li'])
+    return len(images), len(backgrounds), len(stylesheets), len(containers)
+
+
+def scan_extract(content, use_lxml):
+    page = scan_page(content, use_lxml=use_lxml)
+    for img in page.images:
+        img.container_title
+    return len(page.images), len(page.background_styles), len(page.stylesheets)
+
+
+def run(func, pages, iterations):
+    """Milliseconds per page"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for content in pages:
+            func(content)
+    return (time.perf_counter() - start) * 1000 / (iterations * len(pages))
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages = load_pages(sys.argv[2:])
+    if not pages:
+        print(f"No saved pages: run a scraper first (fills {CACHE_PATH}) or pass HTML files")
+        sys.exit(1)
+
+    total_kb = sum(len(content) for content in pages) / 1024
+    print(f"Parsing benchmark: {len(pages)} pages, {total_kb:,.0f} KB, {iterations} iterations\n")
+
+    engines = [('BeautifulSoup html.parser', lambda c: soup_extract(c))]
+    if LXML_ENABLED:
+        engines.append(('BeautifulSoup lxml', lambda c: soup_extract(c, 'lxml')))
+    engines.append(('html_scan html.parser', lambda c: scan_extract(c, False)))
+    if LXML_ENABLED:
+        engines.append(('html_scan lxml', lambda c: scan_extract(c, True)))
+    else:
+        print("(lxml not installed: pip install lxml for the fastest backend)\n")
+
+    print(f"{'engine':<28} {'ms/page':>10} {'speed-up':>10}")
+    print("-" * 50)
+    baseline = None
+    for label, func in engines:
+        ms = run(func, pages, iterations)
+        baseline = baseline or ms
+        print(f"{label:<28} {ms:>10.2f} {baseline / ms:>9.1f}x")
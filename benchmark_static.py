@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: StaticFileCache vs Flask's send_from_directory
+Drives both engines through the WSGI test client against files in this repo.
+
+Usage: python benchmark_static.py [requests_per_file]
+"""
+
+import os
+import sys
+import time
+
+from flask import Flask, send_from_directory
+
+from static_cache import StaticFileCache
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLES = {
+    'html/css/js': ['index.html', 'styles.css', 'script.js', 'cart.js'],
+    'thumbnails': [
+        'images/content_visit_2016_04_04_staying-at-il-ngwesi_Beading-3-300x200.jpg',
+        'images/content_visit_2016_04_04_staying-at-il-ngwesi_Elephants-at-waterhole-300x200.jpg',
+    ],
+    'large images': [
+        'images/content_visit_2016_04_04_staying-at-il-ngwesi_Beading-3.jpg',
+        'images/content_visit_2016_04_04_staying-at-il-ngwesi_Elephants-at-waterhole.jpg',
+    ],
+}
+
+
+def build_app():
+    """Flask app exposing both serving paths side by side"""
+    app = Flask(__name__, static_folder=None)
+    engine = StaticFileCache(ROOT)
+
+    @app.route('/legacy/<path:path>')
+    def legacy(path):
+        return send_from_directory(ROOT, path)
+
+    @app.route('/cached/<path:path>')
+    def cached(path):
+        return engine.serve(path)
+
+    return app, engine
+
+
+def run(client, prefix, files, iterations):
+    """Issue `iterations` GETs per file and return (requests/sec, MB/sec)"""
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for path in files:
+            response = client.get(f'/{prefix}/{path}')
+            total_bytes += len(response.get_data())
+            response.close()
+    elapsed = time.perf_counter() - start
+    count = iterations * len(files)
+    return count / elapsed, total_bytes / elapsed / (1024 * 1024)
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    app, engine = build_app()
+    client = app.test_client()
+
+    print(f"Static serving benchmark ({iterations} requests per file)\n")
+    print(f"{'group':<14} {'engine':<20} {'req/s':>10} {'MB/s':>10}")
+    print("-" * 56)
+
+    for group, files in SAMPLES.items():
+        files = [f for f in files if os.path.exists(os.path.join(ROOT, f))]
+        if not files:
+            continue
+
+        # Warm the cache so the measurement reflects steady state
+        run(client, 'cached', files, 1)
+
+        for label, prefix in (('send_from_directory', 'legacy'), ('StaticFileCache', 'cached')):
+            rps, mbps = run(client, prefix, files, iterations)
+            print(f"{group:<14} {label:<20} {rps:>10,.0f} {mbps:>10,.1f}")
+
+    print(f"\nCache: {engine.stats()}")
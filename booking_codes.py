@@ -0,0 +1,172 @@
+"""
+Booking codes
+Short, time-ordered booking codes: V, six characters of seconds since
+2024-01-01 UTC, four characters of per-process sequence and a check character,
+all in Crockford base32 (no I, L, O or U). "V2269F506HBP" is 12 characters,
+the most an STK push account reference takes.
+
+Codes sort by the second they were issued, so new bookings are appended to
+the end of the booking_code index and bookings made in a date range are a key
+range (code_range()). Within a process the sequence is monotonic; each process
+starts every second at a random point of the sequence space, and
+create_booking checks the code is unused under the write lock, so workers
+never hand out the same code. The check character (Luhn mod 32) catches
+every single mistyped character and most swapped neighbours, so typos are
+rejected before any database lookup. Codes from before this scheme
+(V<yyyymmdd>-<8 hex digits>) are still accepted.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+VALUES = {char: value for value, char in enumerate(ALPHABET)}
+# Characters people type for the ones Crockford base32 leaves out
+CONFUSABLES = {'O': '0', 'I': '1', 'L': '1'}
+
+PREFIX = 'V'
+EPOCH = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+TIME_CHARS = 6        # 32**6 seconds: until 2058
+SEQUENCE_CHARS = 4    # 32**4 codes per second per process
+CODE_LENGTH = len(PREFIX) + TIME_CHARS + SEQUENCE_CHARS + 1
+
+SEQUENCE_SPACE = len(ALPHABET) ** SEQUENCE_CHARS
+
+# Regex for codes in free text (SMS replies), before normalize_code();
+# confusable letters and grouping hyphens (V2269-F506-HBP) are allowed so
+# they can be corrected
+CODE_PATTERN = rf'{PREFIX}(?:-?[0-9A-TV-Z]){{{CODE_LENGTH - 1}}}'
+LEGACY_CODE_PATTERN = rf'{PREFIX}\d{{8}}-[0-9A-F]{{8}}'
+LEGACY_CODE = re.compile(LEGACY_CODE_PATTERN)
+
+
+def encode(value, length):
+    """Fixed-width base32 of a non-negative integer"""
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    if value:
+        raise ValueError('Value does not fit in the code')
+    return ''.join(reversed(chars))
+
+
+def decode(text):
+    """Integer value of base32 text"""
+    value = 0
+    for char in text:
+        value = value * 32 + VALUES[char]
+    return value
+
+
+def check_char(payload):
+    """Luhn mod 32 check character of a base32 payload"""
+    total = 0
+    for position, char in enumerate(reversed(payload)):
+        value = VALUES[char]
+        # Double every other character, starting with the rightmost
+        if position % 2 == 0:
+            value *= 2
+            value = value // 32 + value % 32
+        total += value
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+def normalize_code(text):
+    """
+    Canonical form of a booking code as typed
+
+    Upper-cases, drops spaces and hyphens and maps O to 0 and I/L to 1,
+    then checks the check character.
+
+    Returns:
+        The code, or None if it is not a valid booking code
+    """
+    if not text:
+        return None
+    text = str(text).strip().upper()
+    if LEGACY_CODE.fullmatch(text):
+        return text
+
+    text = ''.join(CONFUSABLES.get(char, char) for char in text if char not in ' -')
+    if len(text) != CODE_LENGTH or not text.startswith(PREFIX):
+        return None
+    payload = text[len(PREFIX):-1]
+    if any(char not in VALUES for char in text[len(PREFIX):]):
+        return None
+    if check_char(payload) != text[-1]:
+        return None
+    return text
+
+
+def code_time(code):
+    """UTC datetime a code was issued, or None for legacy codes"""
+    if LEGACY_CODE.fullmatch(code):
+        return None
+    seconds = decode(code[len(PREFIX):len(PREFIX) + TIME_CHARS])
+    return datetime.fromtimestamp(EPOCH + seconds, timezone.utc)
+
+
+def time_prefix(moment):
+    """Code prefix of a datetime (naive means UTC) or Unix time"""
+    if isinstance(moment, datetime):
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        moment = moment.timestamp()
+    seconds = min(max(int(moment) - EPOCH, 0), len(ALPHABET) ** TIME_CHARS - 1)
+    return PREFIX + encode(seconds, TIME_CHARS)
+
+
+def code_range(start, end):
+    """
+    Key range of the codes issued in [start, end)
+
+    Returns:
+        (low, high) for booking_code >= low AND booking_code < high
+    """
+    return time_prefix(start), time_prefix(end)
+
+
+class BookingCodeGenerator:
+    """Monotonic code source for one process (safe to share between threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._second = None
+        self._sequence = 0
+
+    def next_code(self, now=None):
+        """A new booking code, greater than every code this process issued before"""
+        with self._lock:
+            second = max(int((now or time.time()) - EPOCH), 0)
+            # Forked workers must not continue their parent's sequence
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._second = None
+
+            if self._second is not None and second <= self._second:
+                # Same second, or the clock stepped back: keep counting
+                self._sequence += 1
+                if self._sequence >= SEQUENCE_SPACE:
+                    self._second += 1
+                    self._sequence = random.randrange(SEQUENCE_SPACE // 2)
+            else:
+                self._second = second
+                # Random start in the lower half leaves room to count up
+                self._sequence = random.randrange(SEQUENCE_SPACE // 2)
+
+            payload = encode(self._second, TIME_CHARS) + encode(self._sequence, SEQUENCE_CHARS)
+            return PREFIX + payload + check_char(payload)
+
+
+generator = BookingCodeGenerator()
+
+
+def next_code():
+    """A new booking code from this process's generator"""
+    return generator.next_code()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Font build stage
+Subsets each face in assets/fonts to the characters the site uses, writes
+WOFF2 files next to the .otf sources, regenerates the @font-face rules in
+styles.css with unicode-range, and adds preload hints for the faces needed
+for first paint. Re-run after adding copy in a new script or alphabet.
+
+Usage:
+    python build_fonts.py            # build fonts, update styles.css and pages
+    python build_fonts.py --check    # report sizes without writing anything
+
+Requires: pip install fonttools brotli
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+
+try:
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+    FONTTOOLS_ENABLED = True
+except ImportError:
+    FONTTOOLS_ENABLED = False
+
+fonts_dir = os.path.join("assets", "fonts")
+stylesheet = "styles.css"
+
+# Face definitions, in the order the @font-face rules are emitted
+FACES = [
+    {'family': 'Freight Sans', 'file': 'FreightSansProBook-Regular', 'weight': 400, 'style': 'normal'},
+    {'family': 'Freight Sans', 'file': 'FreightSansProMedium-Regular', 'weight': 500, 'style': 'normal'},
+    {'family': 'Freight Sans', 'file': 'FreightSansProBold-Regular', 'weight': 700, 'style': 'normal'},
+    {'family': 'Utopia', 'file': 'UtopiaStd-Regular', 'weight': 400, 'style': 'normal'},
+    {'family': 'Utopia', 'file': 'UtopiaStd-Italic', 'weight': 400, 'style': 'italic'},
+    {'family': 'Utopia', 'file': 'UtopiaStd-Bold', 'weight': 700, 'style': 'normal'},
+]
+
+# Faces used above the fold on every page: body text and headings
+PRELOAD_FILES = ('FreightSansProBook-Regular', 'UtopiaStd-Bold')
+
+# Files scanned for the characters the site renders
+TEXT_SOURCES = ('*.html', '*.js', 'products/products.json')
+
+# Always kept so form input and product copy in Latin scripts still render
+BASE_CODEPOINTS = (
+    set(range(0x20, 0x7F))           # Basic Latin
+    | set(range(0xA0, 0x100))        # Latin-1 Supplement
+    | {0x2013, 0x2014, 0x2018, 0x2019, 0x201C, 0x201D, 0x2022, 0x2026, 0x20AC, 0x2122}
+)
+
+FONT_FACE_BEGIN = '/* @font-face rules generated by build_fonts.py - do not edit by hand */'
+FONT_FACE_END = '/* end of generated @font-face rules */'
+
+PRELOAD_PATTERN = re.compile(r'[ \t]*<link rel="preload" href="assets/fonts/[^"]+" as="font"[^>]*>\n')
+STYLESHEET_LINK = re.compile(r'^([ \t]*)<link rel="stylesheet" href="styles\.css">', re.MULTILINE)
+
+
+def site_codepoints(root='.'):
+    """Every character in the site's HTML, JS and product data, plus BASE_CODEPOINTS."""
+    codepoints = set(BASE_CODEPOINTS)
+    for pattern in TEXT_SOURCES:
+        for path in glob.glob(os.path.join(root, pattern)):
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            # Numeric entities render as characters too
+            text += ''.join(chr(int(n)) for n in re.findall(r'&#(\d+);', text) if int(n) < 0x110000)
+            codepoints.update(ord(c) for c in text if not c.isspace() or c == ' ')
+    return codepoints
+
+
+def unicode_range(codepoints):
+    """Compact CSS unicode-range value for a set of codepoints."""
+    ranges = []
+    for cp in sorted(codepoints):
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return ', '.join(
+        f'U+{start:X}' if start == end else f'U+{start:X}-{end:X}'
+        for start, end in ranges
+    )
+
+
+def subset_face(source, target, codepoints):
+    """
+    Write a WOFF2 subset of a font
+
+    Returns:
+        Set of codepoints the subset actually covers
+    """
+    font = TTFont(source)
+    covered = set(font.getBestCmap()) & codepoints
+
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['kern', 'liga', 'clig', 'calt', 'ccmp', 'locl', 'mark', 'mkmk']
+    options.hinting = False
+    options.desubroutinize = True
+    options.name_IDs = [1, 2]
+    options.notdef_outline = True
+
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=covered)
+    subsetter.subset(font)
+    font.flavor = 'woff2'
+    font.save(target)
+    return covered
+
+
+def font_face_rules(faces):
+    """@font-face CSS for the built faces (WOFF2 first, original OTF as fallback)."""
+    rules = []
+    for face in faces:
+        rules.append(
+            "@font-face {\n"
+            f"    font-family: '{face['family']}';\n"
+            f"    src: url('assets/fonts/{face['file']}.woff2') format('woff2'),\n"
+            f"         url('assets/fonts/{face['file']}.otf') format('opentype');\n"
+            f"    font-weight: {face['weight']};\n"
+            f"    font-style: {face['style']};\n"
+            "    font-display: swap;\n"
+            f"    unicode-range: {face['unicode_range']};\n"
+            "}"
+        )
+    return '\n\n'.join(rules)
+
+
+def update_stylesheet(path, rules):
+    """Replace the generated block (or the original hand-written rules) in styles.css."""
+    with open(path, encoding='utf-8') as f:
+        css = f.read()
+
+    block = f'{FONT_FACE_BEGIN}\n{rules}\n{FONT_FACE_END}'
+    if FONT_FACE_BEGIN in css:
+        start = css.index(FONT_FACE_BEGIN)
+        end = css.index(FONT_FACE_END) + len(FONT_FACE_END)
+        css = css[:start] + block + css[end:]
+    else:
+        # First run: replace the hand-written @font-face rules
+        match = re.search(r'(?:@font-face\s*\{[^}]*\}\s*)+', css)
+        if not match:
+            raise ValueError(f'No @font-face rules found in {path}')
+        css = css[:match.start()] + block + '\n\n' + css[match.end():]
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(css)
+
+
+def update_preloads(html_paths, files):
+    """Insert <link rel="preload"> hints ahead of the styles.css link in each page."""
+    updated = 0
+    for path in html_paths:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        stripped = PRELOAD_PATTERN.sub('', html)
+        match = STYLESHEET_LINK.search(stripped)
+        if not match:
+            continue
+        indent = match.group(1)
+        hints = ''.join(
+            f'{indent}<link rel="preload" href="assets/fonts/{name}.woff2" as="font" type="font/woff2" crossorigin>\n'
+            for name in files
+        )
+        html_new = stripped[:match.start()] + hints + stripped[match.start():]
+        if html_new != html:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(html_new)
+            updated += 1
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--check', action='store_true', help='Report sizes without writing files')
+    args = parser.parse_args()
+
+    if not FONTTOOLS_ENABLED:
+        print("fontTools is not installed: pip install fonttools brotli")
+        sys.exit(1)
+
+    codepoints = site_codepoints()
+    print(f"Site uses {len(codepoints)} distinct characters\n")
+    print(f"{'face':<32} {'otf':>10} {'woff2':>10} {'glyphs':>7}")
+    print("-" * 62)
+
+    total_before = total_after = 0
+    for face in FACES:
+        source = os.path.join(fonts_dir, f"{face['file']}.otf")
+        target = os.path.join(fonts_dir, f"{face['file']}.woff2")
+        if args.check:
+            target = os.path.join(fonts_dir, f".{face['file']}.check.woff2")
+
+        covered = subset_face(source, target, codepoints)
+        face['unicode_range'] = unicode_range(covered)
+
+        before, after = os.path.getsize(source), os.path.getsize(target)
+        total_before += before
+        total_after += after
+        print(f"{face['file']:<32} {before:>10,} {after:>10,} {len(covered):>7}")
+        if args.check:
+            os.remove(target)
+
+    print("-" * 62)
+    print(f"{'total':<32} {total_before:>10,} {total_after:>10,}")
+    preload_bytes = sum(
+        os.path.getsize(os.path.join(fonts_dir, f"{name}.otf")) for name in PRELOAD_FILES
+    )
+    print(f"\nFirst-paint font bytes: {preload_bytes:,} (otf)", end='')
+    if not args.check:
+        preload_bytes = sum(
+            os.path.getsize(os.path.join(fonts_dir, f"{name}.woff2")) for name in PRELOAD_FILES
+        )
+        print(f" -> {preload_bytes:,} (woff2)")
+
+        update_stylesheet(stylesheet, font_face_rules(FACES))
+        pages = update_preloads(sorted(glob.glob('*.html')), PRELOAD_FILES)
+        print(f"Updated {stylesheet} and preload hints in {pages} pages")
+    else:
+        print()
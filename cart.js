@@ -1,4 +1,12 @@
 // Shopping Cart System
+
+// Product text comes from merchant edits; escape it before building HTML
+function escapeHtml(value) {
+    return String(value == null ? '' : value)
+        .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+}
+
 class ShoppingCart {
     constructor() {
         this.items = this.loadCart();
@@ -108,10 +116,10 @@ class ShoppingCart {
                 <div class="cart-notification-icon">✓</div>
                 <div class="cart-notification-info">
                     <div class="cart-notification-title">Added to Cart!</div>
-                    <div class="cart-notification-product">${product.name}</div>
+                    <div class="cart-notification-product">${escapeHtml(product.name)}</div>
                     <div class="cart-notification-price">KES ${product.price.toLocaleString()}</div>
                 </div>
-                <img src="${product.image}" alt="${product.name}" class="cart-notification-image" onerror="this.style.display='none';">
+                <img src="${escapeHtml(product.image)}" alt="${escapeHtml(product.name)}" class="cart-notification-image" onerror="this.style.display='none';">
             </div>
             <div class="cart-notification-actions">
                 <a href="cart.html" class="cart-notification-link">View Cart (${this.getItemCount()})</a>
@@ -167,9 +175,9 @@ class ShoppingCart {
 
         cartItems.innerHTML = this.items.map(item => `
             <div class="cart-item">
-                <img src="${item.image}" alt="${item.name}" class="cart-item-image" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 viewBox=%270 0 200 200%27%3E%3Crect fill=%27%23f3f4f6%27 width=%27200%27 height=%27200%27/%3E%3Ctext fill=%27%239ca3af%27 font-family=%27sans-serif%27 font-size=%2714%27 x=%2750%25%27 y=%2750%25%27 text-anchor=%27middle%27 dy=%27.3em%27%3ENo Image%3C/text%3E%3C/svg%3E'">
+                <img src="${escapeHtml(item.image)}" alt="${escapeHtml(item.name)}" class="cart-item-image" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 viewBox=%270 0 200 200%27%3E%3Crect fill=%27%23f3f4f6%27 width=%27200%27 height=%27200%27/%3E%3Ctext fill=%27%239ca3af%27 font-family=%27sans-serif%27 font-size=%2714%27 x=%2750%25%27 y=%2750%25%27 text-anchor=%27middle%27 dy=%27.3em%27%3ENo Image%3C/text%3E%3C/svg%3E'">
                 <div class="cart-item-details">
-                    <h4 class="cart-item-name">${item.name}</h4>
+                    <h4 class="cart-item-name">${escapeHtml(item.name)}</h4>
                     <div class="cart-item-price">KES ${item.price.toLocaleString()}</div>
                     <div class="cart-item-quantity">
                         <button class="qty-btn" onclick="cart.updateQuantity(${item.id}, ${item.quantity - 1})">−</button>
@@ -223,11 +231,11 @@ class ShoppingCart {
         cartItems.innerHTML = this.items.map(item => `
             <div class="cart-page-item">
                 <div class="cart-page-item-image">
-                    <img src="${item.image}" alt="${item.name}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 viewBox=%270 0 200 200%27%3E%3Crect fill=%27%23f3f4f6%27 width=%27200%27 height=%27200%27/%3E%3Ctext fill=%27%239ca3af%27 font-family=%27sans-serif%27 font-size=%2714%27 x=%2750%25%27 y=%2750%25%27 text-anchor=%27middle%27 dy=%27.3em%27%3ENo Image%3C/text%3E%3C/svg%3E'">
+                    <img src="${escapeHtml(item.image)}" alt="${escapeHtml(item.name)}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 viewBox=%270 0 200 200%27%3E%3Crect fill=%27%23f3f4f6%27 width=%27200%27 height=%27200%27/%3E%3Ctext fill=%27%239ca3af%27 font-family=%27sans-serif%27 font-size=%2714%27 x=%2750%25%27 y=%2750%25%27 text-anchor=%27middle%27 dy=%27.3em%27%3ENo Image%3C/text%3E%3C/svg%3E'">
                 </div>
                 <div class="cart-page-item-info">
-                    <h3 class="cart-page-item-name">${item.name}</h3>
-                    <div class="cart-page-item-category">${item.category}</div>
+                    <h3 class="cart-page-item-name">${escapeHtml(item.name)}</h3>
+                    <div class="cart-page-item-category">${escapeHtml(item.category)}</div>
                     <div class="cart-page-item-price">KES ${item.price.toLocaleString()}</div>
                 </div>
                 <div class="cart-page-item-quantity">
@@ -0,0 +1,443 @@
+"""
+Marketplace catalogue
+SQLite-backed product catalogue seeded from products/products.json, with keyset
+pagination, field selection, a revision counter used for ETags and an FTS5
+search index kept current by triggers
+"""
+
+import json
+import os
+import re
+import sqlite3
+
+CATALOG_SEED_PATH = os.path.join('products', 'products.json')
+
+# Columns clients may request with ?fields=
+PRODUCT_FIELDS = (
+    'id', 'name', 'category', 'price', 'description', 'image',
+    'source_url', 'active', 'revision', 'updated_at'
+)
+
+# Returned when no ?fields= is given - what a product card needs
+DEFAULT_FIELDS = ('id', 'name', 'category', 'price', 'description', 'image')
+
+# Columns a merchant may change through the update endpoint
+EDITABLE_FIELDS = ('name', 'category', 'price', 'description', 'image', 'active')
+
+CATEGORIES = ('jewelry', 'bags', 'clothing', 'home', 'art')
+
+MAX_PAGE_SIZE = 100
+
+# Price bands reported as search facets: (key, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = (
+    ('under-2000', 0, 2000),
+    ('2000-4000', 2000, 4000),
+    ('4000-8000', 4000, 8000),
+    ('8000-plus', 8000, None),
+)
+
+# bm25 column weights for products_fts (name, description, category)
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0)
+
+SEARCH_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts5_available():
+    try:
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+        finally:
+            conn.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+FULL_TEXT_SEARCH_ENABLED = _fts5_available()
+
+
+def init_catalog(cursor, seed_path=CATALOG_SEED_PATH):
+    """Create the catalogue tables and seed them on first run"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            category TEXT,
+            price DECIMAL,
+            description TEXT,
+            image TEXT,
+            source_url TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            revision INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_category
+        ON products (category, id)
+    ''')
+
+    # Single-row counter bumped on every catalogue write; drives ETags
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('revision', 0)
+    ''')
+
+    cursor.execute('SELECT COUNT(*) FROM products')
+    if cursor.fetchone()[0] == 0:
+        seed_catalog(cursor, seed_path)
+
+    init_search_index(cursor)
+
+
+def init_search_index(cursor):
+    """
+    Create the FTS5 index over product name, description and category
+    The index is an external-content table kept in step with products by
+    triggers, so every catalogue write updates it incrementally.
+
+    Without FTS5 in the SQLite build, search falls back to LIKE scans.
+    """
+    if not FULL_TEXT_SEARCH_ENABLED:
+        print("Warning: SQLite FTS5 not available; product search will use LIKE scans")
+        return
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, category,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_update
+        AFTER UPDATE OF name, description, category ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+            INSERT INTO products_fts (rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+    ''')
+
+    if not exists:
+        # Index rows that predate the search index
+        cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+def seed_catalog(cursor, seed_path=CATALOG_SEED_PATH):
+    """
+    Load products.json into the catalogue
+    Entries without a price are scraped images that have not been listed yet;
+    they are stored inactive so merchants can price and publish them later.
+    """
+    try:
+        with open(seed_path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[CATALOG] Could not read seed file {seed_path}: {e}")
+        return 0
+
+    next_id = max([e['id'] for e in entries if isinstance(e.get('id'), int)] or [0]) + 1
+    revision = _bump_revision(cursor)
+    rows = []
+    for entry in entries:
+        product_id = entry.get('id')
+        if not isinstance(product_id, int):
+            product_id = next_id
+            next_id += 1
+        image = entry.get('image')
+        rows.append((
+            product_id,
+            entry['name'],
+            entry.get('category'),
+            entry.get('price'),
+            entry.get('description', ''),
+            f"products/{image}" if image else None,
+            entry.get('url'),
+            1 if entry.get('price') is not None else 0,
+            revision
+        ))
+
+    cursor.executemany('''
+        INSERT INTO products (id, name, category, price, description, image,
+                              source_url, active, revision)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
+
+
+def parse_fields(param):
+    """
+    Validate a comma-separated ?fields= value
+
+    Returns:
+        Tuple of column names (always including id)
+
+    Raises:
+        ValueError: if an unknown field is requested
+    """
+    if not param:
+        return DEFAULT_FIELDS
+    fields = [f.strip() for f in param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return tuple(dict.fromkeys(fields))
+
+
+def catalog_revision(cursor):
+    """Current catalogue revision (changes on every write)"""
+    cursor.execute("SELECT value FROM catalog_meta WHERE key = 'revision'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def list_products(cursor, fields=DEFAULT_FIELDS, after=0, limit=24,
+                  category=None, ids=None, include_inactive=False):
+    """
+    One keyset page of products ordered by id
+
+    Args:
+        cursor: sqlite3 cursor
+        fields: Columns to return
+        after: Return products with id greater than this cursor
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        category: Optional category filter
+        ids: Optional list of product ids to restrict to
+        include_inactive: Include unlisted products
+
+    Returns:
+        (list of product dicts, next cursor or None on the last page)
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    clauses = ['id > ?']
+    params = [int(after)]
+
+    if not include_inactive:
+        clauses.append('active = 1')
+    if category:
+        clauses.append('category = ?')
+        params.append(category)
+    if ids:
+        clauses.append(f"id IN ({','.join('?' * len(ids))})")
+        params.extend(ids)
+
+    # Fetch one extra row to learn whether another page exists
+    cursor.execute(f'''
+        SELECT {', '.join(fields)}
+        FROM products
+        WHERE {' AND '.join(clauses)}
+        ORDER BY id
+        LIMIT ?
+    ''', (*params, limit + 1))
+
+    rows = cursor.fetchall()
+    items = [dict(zip(fields, row)) for row in rows[:limit]]
+    next_cursor = items[-1]['id'] if len(rows) > limit else None
+    return items, next_cursor
+
+
+def get_product(cursor, product_id, fields=DEFAULT_FIELDS, include_inactive=False):
+    """
+    Single product with the requested fields
+
+    Args:
+        include_inactive: Return the product even if it is unlisted
+
+    Returns:
+        (product dict, row revision), or (None, None) if it does not exist
+    """
+    cursor.execute(f'''
+        SELECT revision, {', '.join(fields)}
+        FROM products
+        WHERE id = ?{'' if include_inactive else ' AND active = 1'}
+    ''', (product_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None, None
+    return dict(zip(fields, row[1:])), row[0]
+
+
+def update_product(cursor, product_id, changes):
+    """
+    Apply merchant edits to a product
+
+    Raises:
+        ValueError: if changes is not an object, a field is not editable or
+            a value is invalid
+
+    Returns:
+        True if the product exists and was updated
+    """
+    if not isinstance(changes, dict):
+        raise ValueError('Body must be a JSON object of fields to change')
+    unknown = [k for k in changes if k not in EDITABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Field(s) not editable: {', '.join(unknown)}")
+    if not changes:
+        raise ValueError('No fields to update')
+
+    if 'name' in changes and not str(changes['name']).strip():
+        raise ValueError('name must not be empty')
+    if 'category' in changes and changes['category'] not in CATEGORIES:
+        raise ValueError(f"category must be one of: {', '.join(CATEGORIES)}")
+    if 'price' in changes:
+        try:
+            changes['price'] = float(changes['price'])
+        except (TypeError, ValueError):
+            raise ValueError('price must be a number')
+        if changes['price'] < 0:
+            raise ValueError('price must not be negative')
+    if 'active' in changes:
+        changes['active'] = 1 if changes['active'] else 0
+
+    cursor.execute('SELECT price FROM products WHERE id = ?', (product_id,))
+    row = cursor.fetchone()
+    if not row:
+        return False
+    # Scraped entries have no price until a merchant sets one
+    if changes.get('active') and changes.get('price', row[0]) is None:
+        raise ValueError('Set a price before listing the product')
+
+    revision = _bump_revision(cursor)
+    assignments = ', '.join(f'{k} = ?' for k in changes)
+    cursor.execute(f'''
+        UPDATE products
+        SET {assignments}, revision = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (*changes.values(), revision, product_id))
+    return True
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression
+    Every word becomes a quoted prefix term, so "bead neck" matches
+    "Beaded Necklace" and FTS5 operators in user input are never interpreted.
+    """
+    tokens = SEARCH_TOKEN.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def price_band_clause(band):
+    """SQL condition (and params) for a PRICE_BANDS key"""
+    for key, low, high in PRICE_BANDS:
+        if key == band:
+            if high is None:
+                return 'p.price >= ?', [low]
+            return 'p.price >= ? AND p.price < ?', [low, high]
+    raise ValueError(f"price_band must be one of: {', '.join(b[0] for b in PRICE_BANDS)}")
+
+
+def search_products(cursor, text, fields=DEFAULT_FIELDS, category=None,
+                    price_band=None, limit=24, offset=0):
+    """
+    Ranked full-text search with category and price-band facet counts
+    An empty query browses the whole active catalogue.
+
+    Facets are disjunctive: category counts ignore the category filter and
+    price-band counts ignore the price filter, so the UI can show how many
+    results each alternative selection would give.
+
+    Returns:
+        dict with items, total and facets
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    offset = max(0, int(offset))
+    tokens = SEARCH_TOKEN.findall(text or '')
+
+    source = 'products p'
+    base_clauses = ['p.active = 1']
+    base_params = []
+    order = 'p.id'
+    if tokens and FULL_TEXT_SEARCH_ENABLED:
+        source = 'products_fts JOIN products p ON p.id = products_fts.rowid'
+        base_clauses.insert(0, 'products_fts MATCH ?')
+        base_params.append(build_match_query(text))
+        order = 'bm25(products_fts, {}, {}, {})'.format(*SEARCH_WEIGHTS)
+    elif tokens:
+        # Unranked substring match on every token
+        for token in tokens:
+            base_clauses.append("(p.name LIKE ? OR p.description LIKE ? OR p.category LIKE ?)")
+            base_params.extend([f'%{token}%'] * 3)
+
+    clauses = base_clauses + (['p.category = ?'] if category else [])
+    params = base_params + ([category] if category else [])
+    if price_band:
+        sql, band_params = price_band_clause(price_band)
+        clauses.append(sql)
+        params.extend(band_params)
+
+    columns = ', '.join(f'p.{f}' for f in fields)
+    cursor.execute(f'''
+        SELECT {columns}
+        FROM {source}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+    ''', (*params, limit, offset))
+    items = [dict(zip(fields, row)) for row in cursor.fetchall()]
+
+    # One grouped pass yields the total and both facets
+    band_cases = ' '.join(
+        f"WHEN p.price >= {low}" + (f" AND p.price < {high}" if high is not None else '') + f" THEN '{key}'"
+        for key, low, high in PRICE_BANDS
+    )
+    cursor.execute(f'''
+        SELECT p.category, CASE {band_cases} END AS band, COUNT(*)
+        FROM {source}
+        WHERE {' AND '.join(base_clauses)}
+        GROUP BY p.category, band
+    ''', base_params)
+
+    total = 0
+    category_counts = {}
+    band_counts = {key: 0 for key, _, _ in PRICE_BANDS}
+    for row_category, band, count in cursor.fetchall():
+        category_matches = not category or row_category == category
+        band_matches = not price_band or band == price_band
+        if category_matches and band_matches:
+            total += count
+        if band_matches and row_category:
+            category_counts[row_category] = category_counts.get(row_category, 0) + count
+        if category_matches and band:
+            band_counts[band] += count
+
+    return {
+        'items': items,
+        'total': total,
+        'facets': {
+            'category': category_counts,
+            'price_band': band_counts
+        }
+    }
+
+
+def _bump_revision(cursor):
+    cursor.execute("UPDATE catalog_meta SET value = value + 1 WHERE key = 'revision'")
+    return catalog_revision(cursor)
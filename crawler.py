@@ -0,0 +1,644 @@
+"""
+Incremental crawl engine shared by the scraper scripts
+Pages are taken from a deduplicating frontier, handed to pluggable extractors
+(gallery images, CSS backgrounds, product cards) and the assets they find are
+downloaded through the shared fetcher. Crawl state lives in SQLite next to
+the HTTP cache, so a re-run only processes pages whose content changed and an
+interrupted run picks up where it stopped.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import zlib
+from urllib.parse import (parse_qs, parse_qsl, urldefrag, urlencode, urljoin,
+                          urlparse, urlunparse)
+
+from fetcher import PART_SUFFIX
+from html_scan import scan_page
+from http_cache import CACHE_PATH
+
+# Attributes that may hold an image URL, most to least preferred
+IMAGE_SOURCE_ATTRIBUTES = ('data-full-image', 'data-full', 'data-large', 'data-original',
+                           'src', 'data-src', 'data-lazy-src')
+
+# WordPress-style resized variants: name-1024x683.jpg
+SIZE_SUFFIX = re.compile(r'-\d+x\d+\.(jpg|jpeg|png|gif|webp)', re.IGNORECASE)
+
+CSS_URL = re.compile(r'url\(["\']?([^"\')]+)["\']?\)')
+CSS_IMAGE_URL = re.compile(r'url\(["\']?([^"\']+\.(?:jpg|jpeg|png|gif|webp|svg))["\']?\)', re.IGNORECASE)
+CSS_IMPORT = re.compile(r'@import\s+(?:url\(\s*)?["\']?([^"\')\s;]+)', re.IGNORECASE)
+
+# Pages fetched concurrently per step of a crawl
+PAGE_BATCH = 4
+
+
+def sanitize_filename(filename):
+    """Sanitize filename for filesystem."""
+    # Remove or replace invalid characters
+    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
+    # Remove leading/trailing spaces and dots
+    filename = filename.strip(' .')
+    return filename
+
+
+def page_name(url):
+    """Filename prefix for images found on a page"""
+    return urlparse(url).path.strip('/').replace('/', '_') or 'home'
+
+
+def full_size_url(url):
+    """URL of the original image behind a resized variant (name-300x200.jpg -> name.jpg)"""
+    return SIZE_SUFFIX.sub(lambda m: '.' + m.group(1), url)
+
+
+def largest_srcset_url(srcset):
+    """Widest candidate of a srcset attribute ("url1 300w, url2 768w, ..."), or None"""
+    candidates = re.findall(r'(\S+)\s+(\d+)w', srcset or '')
+    if not candidates:
+        return None
+    return max(candidates, key=lambda candidate: int(candidate[1]))[0]
+
+
+def image_source(img, attributes=IMAGE_SOURCE_ATTRIBUTES):
+    """First non-empty image URL attribute of an <img> tag"""
+    for attribute in attributes:
+        if img.get(attribute):
+            return img.get(attribute)
+    return None
+
+
+class Asset:
+    """An image found on a page"""
+
+    def __init__(self, url, name=None, candidates=(), shared=False, link=None):
+        """
+        Args:
+            url: Absolute image URL
+            name: Optional label (e.g. the product name on a product card)
+            link: Optional absolute URL the image links to (e.g. the product page)
+            candidates: Other URLs of the same image (srcset entries, the
+                un-suffixed original) a probing crawl may pick instead
+            shared: Site-wide asset (e.g. from the theme stylesheet), saved
+                once per crawl for the first page that uses it
+        """
+        self.url = url
+        self.name = name
+        self.shared = shared
+        self.link = link
+        self.candidates = [url] + [c for c in dict.fromkeys(candidates) if c != url]
+        self.width = None
+        self.height = None
+
+
+class GalleryImages:
+    """<img> tags, preferring the widest srcset candidate, then the full-size original"""
+
+    def extract(self, crawler, url, page):
+        print(f"  Found {len(page.images)} <img> tags")
+
+        for img in page.images:
+            srcset = [urljoin(url, candidate) for candidate, _ in
+                      re.findall(r'(\S+)\s+(\d+)w', img.get('srcset') or '')]
+            img_url = image_source(img)
+            img_url = urljoin(url, img_url) if img_url else None
+            # Every listed size plus the un-suffixed original each one implies
+            candidates = srcset + ([img_url] if img_url else [])
+            candidates += [full_size_url(candidate) for candidate in candidates]
+
+            largest_url = largest_srcset_url(img.get('srcset'))
+            if largest_url:
+                yield Asset(urljoin(url, largest_url), candidates=candidates)
+            elif img_url:
+                yield Asset(full_size_url(img_url), candidates=candidates)
+
+
+class CssBackgrounds:
+    """background-image URLs in style attributes and, optionally, linked stylesheets"""
+
+    def __init__(self, stylesheets=True):
+        self.stylesheets = stylesheets
+        # Absolute stylesheet URL -> image URLs it references, @imports included.
+        # Pages share the theme CSS, so each file is fetched and scanned once per run.
+        self._stylesheet_images = {}
+
+    def extract(self, crawler, url, page):
+        print(f"  Found {len(page.background_styles)} elements with background-image")
+
+        for style in page.background_styles:
+            match = CSS_URL.search(style)
+            if match:
+                img_url = urljoin(url, match.group(1))
+                yield Asset(img_url, candidates=[full_size_url(img_url)])
+
+        if not self.stylesheets:
+            return
+
+        for css_url in page.stylesheets:
+            for img_url in self.stylesheet_images(crawler, urljoin(url, css_url)):
+                yield Asset(img_url, shared=True)
+
+    def stylesheet_images(self, crawler, css_url):
+        """Image URLs referenced by a stylesheet and everything it @imports"""
+        if css_url in self._stylesheet_images:
+            return self._stylesheet_images[css_url]
+        # Placeholder first, so an @import cycle ends here
+        self._stylesheet_images[css_url] = []
+
+        try:
+            css_text = crawler.fetcher.fetch(css_url).decode('utf-8', errors='replace')
+        except Exception as e:
+            print(f"  Error processing CSS {css_url}: {e}")
+            return []
+
+        images = [urljoin(css_url, img_url) for img_url in CSS_IMAGE_URL.findall(css_text)]
+        for imported in CSS_IMPORT.findall(css_text):
+            images += self.stylesheet_images(crawler, urljoin(css_url, imported))
+
+        images = list(dict.fromkeys(images))
+        self._stylesheet_images[css_url] = images
+        return images
+
+
+class ProductCards:
+    """Product images named from their alt text or the card's title"""
+
+    SKIP_WORDS = ('logo', 'icon', 'avatar', 'banner', 'header', 'footer')
+    SOURCE_ATTRIBUTES = ('src', 'data-src', 'data-lazy-src', 'data-original', 'data-full-image')
+
+    def extract(self, crawler, url, page):
+        print(f"  Found {len(page.images)} <img> tags")
+
+        for img in page.images:
+            img_url = image_source(img, self.SOURCE_ATTRIBUTES)
+            if not img_url:
+                continue
+            img_url = urljoin(url, img_url)
+
+            # Skip logos, icons and other page furniture
+            if any(skip in img_url.lower() for skip in self.SKIP_WORDS):
+                continue
+
+            name = self.product_name(img)
+            if name and len(name) > 3:
+                yield Asset(img_url, name, link=urljoin(url, img.link) if img.link else None)
+
+    def product_name(self, img):
+        """Product name from the alt text, falling back to the card's title element"""
+        alt_text = img.get('alt', '')
+
+        if not alt_text or alt_text in ['', 'Product image', 'Image']:
+            alt_text = img.container_title
+
+        if alt_text:
+            alt_text = alt_text.strip()
+            # Remove common prefixes/suffixes
+            alt_text = re.sub(r'^Maasai\s+', '', alt_text, flags=re.I)
+            alt_text = re.sub(r'\s*-\s*Authentic.*$', '', alt_text)
+            alt_text = alt_text[:100]  # Limit length
+        return alt_text
+
+
+class Paginated:
+    """
+    Follows ?page=N links of a listing for as long as its pages have items
+
+    Wraps another extractor. When the furthest page queued so far has items,
+    the next `lookahead` pages are queued together so the crawler fetches
+    them as one batch; the first page without items is taken as the end of
+    the listing, and pages past it yield nothing.
+    """
+
+    def __init__(self, extractor, param='page', lookahead=PAGE_BATCH):
+        self.extractor = extractor
+        self.param = param
+        self.lookahead = lookahead
+        self.last_page = None
+        self.queued_to = 1
+
+    def page_number(self, url):
+        values = parse_qs(urlparse(url).query).get(self.param)
+        return int(values[0]) if values and values[0].isdigit() else 1
+
+    def page_url(self, url, number):
+        parts = urlparse(url)
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                 if key != self.param]
+        if number > 1:
+            query.append((self.param, str(number)))
+        return urlunparse(parts._replace(query=urlencode(query)))
+
+    def extract(self, crawler, url, page):
+        number = self.page_number(url)
+        if self.last_page is not None and number > self.last_page:
+            return []
+
+        assets = list(self.extractor.extract(crawler, url, page))
+        if assets and number >= self.queued_to:
+            self.queued_to = number + self.lookahead
+            for following in range(number + 1, self.queued_to + 1):
+                crawler.enqueue(self.page_url(url, following))
+        elif not assets:
+            print(f"  No items on page {number}: end of listing")
+            self.last_page = number if self.last_page is None else min(self.last_page, number)
+        return assets
+
+
+def variant_key(filename):
+    """Filename with any -WxH size suffix removed: shared by every size of one image"""
+    stem, ext = os.path.splitext(filename)
+    return re.sub(r'-\d+x\d+$', '', stem) + ext.lower()
+
+
+class ImageInventory:
+    """
+    Sizes of the files in an output directory, read once per run
+
+    Files are grouped by variant_key(), so finding the other sizes of an
+    image is a dictionary lookup instead of a directory listing.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._sizes = {}
+        self._variants = {}
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(PART_SUFFIX):
+                self.record(entry.name, entry.stat().st_size)
+
+    def size(self, filename):
+        """Size of a file in bytes, or None if it is not in the directory"""
+        return self._sizes.get(filename)
+
+    def record(self, filename, size):
+        self._sizes[filename] = size
+        self._variants.setdefault(variant_key(filename), set()).add(filename)
+
+    def discard(self, filename):
+        self._sizes.pop(filename, None)
+        self._variants.get(variant_key(filename), set()).discard(filename)
+
+    def variants(self, filename):
+        """Other sizes of the same image as {filename: size}"""
+        return {
+            name: self._sizes[name]
+            for name in self._variants.get(variant_key(filename), ())
+            if name != filename
+        }
+
+
+def page_filename(asset, page_url):
+    """Default naming: <page name>_<image file name>"""
+    filename = os.path.basename(urlparse(asset.url).path)
+    if not filename or '.' not in filename:
+        # crc32 rather than hash(): names must be stable across runs
+        filename = f"image_{zlib.crc32(asset.url.encode()) % 10000}.jpg"
+    return f"{sanitize_filename(page_name(page_url))}_{sanitize_filename(filename)}"
+
+
+class CrawlState:
+    """Frontier and per-asset progress of named crawls, persisted in SQLite"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS crawl_pages (
+                crawl TEXT NOT NULL,
+                url TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                sha256 TEXT,
+                crawled_at REAL,
+                PRIMARY KEY (crawl, url)
+            );
+            CREATE TABLE IF NOT EXISTS crawl_assets (
+                crawl TEXT NOT NULL,
+                page_url TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                url TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                size INTEGER,
+                width INTEGER,
+                height INTEGER,
+                link TEXT,
+                PRIMARY KEY (crawl, page_url, filepath)
+            );
+        ''')
+        # Crawl states created before image dimensions and links were recorded
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(crawl_assets)')]
+        for column, kind in (('width', 'INTEGER'), ('height', 'INTEGER'), ('link', 'TEXT')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE crawl_assets ADD COLUMN {column} {kind}')
+        self.conn.commit()
+
+    def add_page(self, crawl, url):
+        """Add a URL to the frontier; returns False if it is already known"""
+        cursor = self.conn.execute(
+            '''INSERT OR IGNORE INTO crawl_pages (crawl, url, seq)
+               SELECT ?, ?, COALESCE(MAX(seq), 0) + 1 FROM crawl_pages WHERE crawl = ?''',
+            (crawl, url, crawl)
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def pending_count(self, crawl):
+        """Pages left unfinished by the last run; failed pages are queued again"""
+        self.conn.execute(
+            "UPDATE crawl_pages SET status = 'pending' WHERE crawl = ? AND status = 'failed'", (crawl,)
+        )
+        self.conn.commit()
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM crawl_pages WHERE crawl = ? AND status = 'pending'", (crawl,)
+        ).fetchone()[0]
+
+    def restart(self, crawl):
+        """Queue every known page again for a fresh pass"""
+        self.conn.execute("UPDATE crawl_pages SET status = 'pending' WHERE crawl = ?", (crawl,))
+        self.conn.commit()
+
+    def next_pages(self, crawl, limit):
+        """(url, sha256 of the last crawled body) of the oldest pending pages"""
+        return self.conn.execute(
+            '''SELECT url, sha256 FROM crawl_pages
+               WHERE crawl = ? AND status = 'pending' ORDER BY seq LIMIT ?''',
+            (crawl, limit)
+        ).fetchall()
+
+    def finish_page(self, crawl, url, sha256, status='done'):
+        """Mark a page crawled ('failed' if it or any of its assets could not be fetched)"""
+        self.conn.execute(
+            '''UPDATE crawl_pages SET status = ?, sha256 = ?, crawled_at = ?
+               WHERE crawl = ? AND url = ?''',
+            (status, sha256, time.time(), crawl, url)
+        )
+        self.conn.commit()
+
+    def set_assets(self, crawl, page_url, assets):
+        """
+        Replace a page's asset list, keeping the progress of unchanged entries
+
+        Args:
+            assets: (filepath, url, name, width, height, link) tuples in page order
+        """
+        self.conn.execute(
+            f'''DELETE FROM crawl_assets WHERE crawl = ? AND page_url = ?
+                AND filepath NOT IN ({','.join('?' * len(assets))})''',
+            [crawl, page_url] + [asset[0] for asset in assets]
+        )
+        self.conn.executemany(
+            '''INSERT INTO crawl_assets
+                   (crawl, page_url, filepath, url, position, name, width, height, link)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (crawl, page_url, filepath) DO UPDATE SET
+                   position = excluded.position,
+                   name = excluded.name,
+                   width = excluded.width,
+                   height = excluded.height,
+                   link = excluded.link,
+                   status = CASE WHEN url = excluded.url THEN status ELSE 'pending' END,
+                   url = excluded.url''',
+            [(crawl, page_url, filepath, url, position, name, width, height, link)
+             for position, (filepath, url, name, width, height, link) in enumerate(assets)]
+        )
+        self.conn.commit()
+
+    def page_assets(self, crawl, page_url):
+        """Assets of one page as dicts, in page order"""
+        rows = self.conn.execute(
+            '''SELECT filepath, url, name, status, size FROM crawl_assets
+               WHERE crawl = ? AND page_url = ? ORDER BY position''',
+            (crawl, page_url)
+        ).fetchall()
+        return [
+            {'filepath': row[0], 'url': row[1], 'name': row[2], 'status': row[3], 'size': row[4]}
+            for row in rows
+        ]
+
+    def asset_owner(self, crawl, url, page_url):
+        """Another page of the crawl that already has this image URL, or None"""
+        row = self.conn.execute(
+            '''SELECT page_url FROM crawl_assets
+               WHERE crawl = ? AND url = ? AND page_url != ? LIMIT 1''',
+            (crawl, url, page_url)
+        ).fetchone()
+        return row[0] if row else None
+
+    def finish_asset(self, crawl, page_url, filepath, status, size=None):
+        self.conn.execute(
+            '''UPDATE crawl_assets SET status = ?, size = COALESCE(?, size)
+               WHERE crawl = ? AND page_url = ? AND filepath = ?''',
+            (status, size, crawl, page_url, filepath)
+        )
+        self.conn.commit()
+
+    def results(self, crawl):
+        """Downloaded assets of the whole crawl as dicts, in frontier and page order"""
+        rows = self.conn.execute(
+            '''SELECT a.page_url, a.filepath, a.url, a.name, a.size, a.width, a.height, a.link
+               FROM crawl_assets a
+               JOIN crawl_pages p ON p.crawl = a.crawl AND p.url = a.page_url
+               WHERE a.crawl = ? AND a.status = 'done'
+               ORDER BY p.seq, a.position''',
+            (crawl,)
+        ).fetchall()
+        return [
+            {'page_url': row[0], 'filepath': row[1], 'url': row[2], 'name': row[3],
+             'size': row[4], 'width': row[5], 'height': row[6], 'link': row[7]}
+            for row in rows
+        ]
+
+    def close(self):
+        self.conn.close()
+
+
+class Crawler:
+    """Runs a named crawl: frontier -> concurrent page fetches -> extractors -> concurrent downloads"""
+
+    def __init__(self, name, seeds, extractors, output_dir, fetcher,
+                 naming=page_filename, revalidate=False, on_download=None,
+                 probe=False, page_batch=PAGE_BATCH, state_path=CACHE_PATH):
+        """
+        Args:
+            name: Crawl name; separates this crawl's state from the others
+            seeds: Page URLs to start from
+            extractors: Objects with extract(crawler, url, page) yielding Assets,
+                where page is the html_scan.PageScan of the page
+            output_dir: Directory images are saved to
+            fetcher: Shared Fetcher (ideally with an HttpCache attached)
+            naming: naming(asset, page_url) -> filename inside output_dir;
+                assets that map to the same file on a page are downloaded once
+            revalidate: Re-check already downloaded images with a conditional
+                request even when their page has not changed
+            on_download: Optional callback(crawler, asset_row, size) after each new download
+            probe: Probe every candidate URL of an asset with a Range request and
+                download the one with the most pixels
+            page_batch: Pending pages fetched concurrently at a time (the
+                fetcher's per-host limits still apply)
+            state_path: SQLite file holding the crawl state
+        """
+        self.name = name
+        self.seeds = seeds
+        self.extractors = extractors
+        self.output_dir = output_dir
+        self.fetcher = fetcher
+        self.naming = naming
+        self.revalidate = revalidate
+        self.on_download = on_download
+        self.probe = probe
+        self.page_batch = page_batch
+        self.state = CrawlState(state_path)
+        os.makedirs(output_dir, exist_ok=True)
+        self.inventory = None
+        # Shared assets already claimed by a page in this run
+        self.shared_urls = set()
+
+    def enqueue(self, url):
+        """Add a page to the frontier (extractors call this for links worth following)"""
+        return self.state.add_page(self.name, urldefrag(url)[0])
+
+    def run(self):
+        """
+        Crawl until the frontier is empty
+
+        Returns:
+            Number of images downloaded in this run
+        """
+        pending = self.state.pending_count(self.name)
+        if pending:
+            print(f"Resuming crawl '{self.name}': {pending} pages left or failed in the last run")
+        else:
+            self.state.restart(self.name)
+
+        for seed in self.seeds:
+            self.enqueue(seed)
+        self.inventory = ImageInventory(self.output_dir)
+
+        downloaded = 0
+        while True:
+            pages = self.state.next_pages(self.name, self.page_batch)
+            if not pages:
+                break
+            # Fetch the batch concurrently, then process it in frontier order
+            bodies = {url: (content, error) for url, content, error
+                      in self.fetcher.map(self.fetcher.fetch, [url for url, _ in pages])}
+            for url, previous_sha256 in pages:
+                downloaded += self.crawl_page(url, previous_sha256, *bodies[url])
+        return downloaded
+
+    def crawl_page(self, url, previous_sha256, content, error=None):
+        """Extract a fetched page's assets if it changed and download what is missing"""
+        print(f"\nScraping: {url}")
+
+        if error:
+            print(f"  Error scraping {url}: {error}")
+            self.state.finish_page(self.name, url, previous_sha256, 'failed')
+            return 0
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        if sha256 != previous_sha256 or not self.state.page_assets(self.name, url):
+            self.state.set_assets(self.name, url, self.extract(url, scan_page(content)))
+        else:
+            print("  Page unchanged since the last crawl")
+
+        downloaded, failed = self.download_assets(url)
+        self.state.finish_page(self.name, url, sha256, 'failed' if failed else 'done')
+        return downloaded
+
+    def extract(self, url, page):
+        """
+        Run every extractor over a page
+
+        Returns:
+            (filepath, url, name, width, height, link) tuples, deduplicated by file
+        """
+        found = [asset for extractor in self.extractors
+                 for asset in extractor.extract(self, url, page)]
+        if self.probe:
+            self.pick_largest(found)
+
+        assets = {}
+        for asset in found:
+            if asset.shared:
+                if asset.url in self.shared_urls or self.state.asset_owner(self.name, asset.url, url):
+                    continue
+                self.shared_urls.add(asset.url)
+            filepath = os.path.join(self.output_dir, self.naming(asset, url))
+            assets.setdefault(filepath, (filepath, asset.url, asset.name, asset.width,
+                                         asset.height, asset.link))
+        return list(assets.values())
+
+    def pick_largest(self, assets):
+        """Point each asset at its candidate with the most pixels, probing headers only"""
+        urls = list(dict.fromkeys(c for asset in assets for c in asset.candidates))
+        if not urls:
+            return
+        print(f"  Probing {len(urls)} candidate images...")
+
+        dimensions = {}
+        for candidate, size, error in self.fetcher.map(self.fetcher.probe, urls):
+            if size:
+                dimensions[candidate] = size
+
+        for asset in assets:
+            probed = [c for c in asset.candidates if c in dimensions]
+            if not probed:
+                continue
+            # max() keeps the first of equal candidates, i.e. the extractor's own pick
+            best = max(probed, key=lambda c: dimensions[c][0] * dimensions[c][1])
+            asset.url = best
+            asset.width, asset.height = dimensions[best]
+
+    def download_assets(self, page_url):
+        """
+        Download a page's outstanding assets concurrently
+
+        Returns:
+            (images downloaded, images that failed)
+        """
+        jobs = []
+        for asset in self.state.page_assets(self.name, page_url):
+            filename = os.path.basename(asset['filepath'])
+            have = self.inventory.size(filename)
+            if have is None or self.revalidate:
+                jobs.append(asset)
+            elif asset['status'] != 'done':
+                # Complete files only ever appear via an atomic rename
+                print(f"  Skipping (already exists): {filename}")
+                self.state.finish_asset(self.name, page_url, asset['filepath'], 'done', have)
+            elif asset['size'] is not None and have != asset['size']:
+                # Not the file this crawl saved there (replaced or truncated)
+                jobs.append(asset)
+
+        if not jobs:
+            return 0, 0
+
+        print(f"  Downloading {len(jobs)} images...")
+        downloaded = failed = 0
+        for asset, size, error in self.fetcher.map(
+                lambda asset: self.fetcher.download(asset['url'], asset['filepath']), jobs):
+            filename = os.path.basename(asset['filepath'])
+            if error:
+                print(f"  Error downloading {asset['url']}: {error}")
+                self.state.finish_asset(self.name, page_url, asset['filepath'], 'failed')
+                failed += 1
+                continue
+            if size is None:
+                print(f"  Unchanged: {filename}")
+            else:
+                print(f"  Downloaded: {filename} ({size:,} bytes)")
+                downloaded += 1
+                self.inventory.record(filename, size)
+                if self.on_download:
+                    self.on_download(self, asset, size)
+            self.state.finish_asset(self.name, page_url, asset['filepath'], 'done', size)
+        return downloaded, failed
+
+    def results(self):
+        return self.state.results(self.name)
+
+    def close(self):
+        self.state.close()
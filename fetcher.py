@@ -0,0 +1,481 @@
+"""
+Shared fetch engine for the scraper scripts
+Requests run on a thread pool with a per-host concurrency cap and an adaptive
+per-host token bucket, so downloads overlap without hammering any one server
+and slow down when it signals overload (429/5xx, Retry-After). With an
+HttpCache attached, pages and downloads are revalidated with conditional
+requests instead of fetched again.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from http_cache import conditional_headers
+from image_headers import DEFAULT_PROBE_BYTES, image_format, image_size
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+DEFAULT_WORKERS = 8
+# Simultaneous requests to one host
+DEFAULT_PER_HOST = 4
+# Requests per second to one host, and how many may start back to back
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 4
+# Floor for the rate after repeated back-offs
+MIN_RATE = 0.5
+
+# Responses that mean "slow down" and are retried
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+# Back-off before retry n is BACKOFF_BASE * 2**n seconds unless Retry-After says otherwise
+BACKOFF_BASE = 1.0
+MAX_RETRY_AFTER = 120
+
+REQUEST_TIMEOUT = 30
+
+# Downloads stream through <filepath>.part in chunks of this many bytes
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = '.part'
+
+# Leading bytes requested when probing an image's dimensions
+PROBE_BYTES = 8 * 1024
+
+
+def content_range(response):
+    """
+    (first byte, total length) from a 206 response's Content-Range header
+
+    Returns:
+        (None, None) if the header is missing or unparseable
+    """
+    match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('Content-Range', ''))
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), (int(total) if total != '*' else None)
+
+
+def unsatisfied_length(response):
+    """Total length from a 416 response's Content-Range (bytes */<length>), or None"""
+    match = re.match(r'bytes \*/(\d+)', response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
+
+
+def advertised_sha256(headers):
+    """SHA-256 of the whole image from a Repr-Digest or Digest header, or None"""
+    for name in ('Repr-Digest', 'Digest'):
+        match = re.search(r'sha-256=:?([A-Za-z0-9+/=]+):?', headers.get(name, ''), re.I)
+        if match:
+            return base64.b64decode(match.group(1))
+    return None
+
+
+def digest_matches(headers, sha256):
+    """
+    Check a body's SHA-256 against a Repr-Digest or Digest header
+
+    Returns:
+        False only if the server sent a sha-256 digest that does not match
+    """
+    advertised = advertised_sha256(headers)
+    return advertised is None or advertised == sha256
+
+
+def file_sha256(path):
+    """SHA-256 object fed with a file's contents"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256
+
+
+def retry_after(response):
+    """Seconds the server asked us to wait (Retry-After as seconds or HTTP date), or None"""
+    value = response.headers.get('Retry-After', '').strip()
+    if value.isdigit():
+        seconds = int(value)
+    else:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+class HostThrottle:
+    """
+    Per-host token bucket with a concurrency cap
+
+    Each host starts at `rate` requests per second (bursts of up to `burst`).
+    When a host pushes back (429, 5xx, Retry-After) its rate is halved and
+    every request to it pauses; successful responses win the rate back step
+    by step, so a shop under load sees the crawl slow down on its own.
+    """
+
+    def __init__(self, per_host=DEFAULT_PER_HOST, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.per_host = per_host
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._buckets = {}
+
+    def _bucket(self, host, now):
+        """Token state of a host, refilled up to the present (caller holds the lock)"""
+        bucket = self._buckets.setdefault(
+            host, {'tokens': self.burst, 'rate': self.rate, 'updated': now, 'paused_until': 0}
+        )
+        bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        bucket['updated'] = now
+        return bucket
+
+    def acquire(self, host):
+        with self._lock:
+            slot = self._slots.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        slot.acquire()
+
+        # Wait for a token (or the end of a pause), sleeping outside the lock
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._bucket(host, now)
+                if now < bucket['paused_until']:
+                    wait = bucket['paused_until'] - now
+                elif bucket['tokens'] >= 1:
+                    bucket['tokens'] -= 1
+                    return
+                else:
+                    wait = (1 - bucket['tokens']) / bucket['rate']
+            time.sleep(wait)
+
+    def release(self, host):
+        self._slots[host].release()
+
+    def back_off(self, host, delay):
+        """Halve a host's rate and hold all its requests for `delay` seconds"""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host, now)
+            bucket['rate'] = max(MIN_RATE, bucket['rate'] / 2)
+            bucket['tokens'] = 0
+            bucket['paused_until'] = max(bucket['paused_until'], now + delay)
+
+    def recover(self, host):
+        """Step a host's rate back up after a successful response"""
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket and bucket['rate'] < self.rate:
+                bucket['rate'] = min(self.rate, bucket['rate'] + self.rate / 10)
+
+
+class Fetcher:
+    """Thread-pooled HTTP client shared by the scrapers"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                 rate=DEFAULT_RATE, burst=DEFAULT_BURST, timeout=REQUEST_TIMEOUT,
+                 user_agent=USER_AGENT, cache=None, max_retries=MAX_RETRIES):
+        """
+        Args:
+            workers: Size of the download thread pool
+            per_host: Maximum simultaneous requests to one host
+            rate: Requests per second to one host while it is healthy
+            burst: Requests that may start back to back after a quiet spell
+            timeout: Per-request timeout in seconds
+            user_agent: User-Agent header sent with every request
+            cache: Optional HttpCache used for conditional requests
+            max_retries: Retries after a 429/5xx response or connection error
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.cache = cache
+        self.max_retries = max_retries
+        self.throttle = HostThrottle(per_host, rate, burst)
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def _session(self):
+        """requests.Session is not thread-safe, so each worker gets its own"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = self.user_agent
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        """
+        Issue one throttled request, retrying when the host pushes back
+
+        429/5xx responses and connection errors are retried up to max_retries
+        times, after the server's Retry-After or an exponential back-off.
+
+        Raises:
+            requests.HTTPError: For error responses (after any retries)
+        """
+        host = urlparse(url).netloc
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.throttle.acquire(host)
+            try:
+                response = self._session().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = BACKOFF_BASE * 2 ** attempt
+                print(f"  {host}: {e.__class__.__name__}, retrying in {delay:.1f}s")
+                self.throttle.back_off(host, delay)
+                continue
+            finally:
+                self.throttle.release(host)
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            delay = retry_after(response)
+            if delay is None:
+                delay = BACKOFF_BASE * 2 ** attempt
+            response.close()
+            print(f"  {host}: HTTP {response.status_code}, slowing down and retrying in {delay:.1f}s")
+            self.throttle.back_off(host, delay)
+
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        self.throttle.recover(host)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('HEAD', url, **kwargs)
+
+    def fetch(self, url):
+        """
+        Body of a page or stylesheet, revalidated against the cache
+
+        Returns:
+            Response body as bytes (the cached copy when the server sends 304)
+        """
+        entry = self.cache.get(url) if self.cache else None
+        if entry is None or entry['body'] is None:
+            entry = None
+
+        response = self.get(url, headers=conditional_headers(entry) if entry else None)
+        if entry and response.status_code == 304:
+            self.cache.touch(url, response.headers)
+            return entry['body']
+
+        if self.cache:
+            self.cache.put(url, response.headers, len(response.content), body=response.content)
+        return response.content
+
+    def download(self, url, filepath):
+        """
+        Stream a URL into a file
+
+        The body is written in chunks to <filepath>.part and only renamed into
+        place once its length (and checksum, when the server sends one) checks
+        out, so an interrupted run never leaves a truncated image behind. A
+        leftover .part file is resumed with a Range request, guarded by
+        If-Range so an image that changed meanwhile is fetched from the start.
+        A 416 means the .part file already reaches the end: it is moved into
+        place if its length and checksum check out. Otherwise it is discarded,
+        as it is after a 206 starting at the wrong byte, and the image is
+        fetched again from the start.
+
+        When the cache says this URL was last saved to this file and the file
+        is still intact, the request is conditional and a 304 leaves the file
+        untouched.
+
+        Returns:
+            Number of bytes in the file, or None if the file was already current
+
+        Raises:
+            IOError: If the transfer ended short (the .part file is kept for the
+                next attempt) or the body failed its checksum
+        """
+        part_path = filepath + PART_SUFFIX
+        entry = self.cache.get(url, filepath) if self.cache else None
+        if entry and not (os.path.exists(filepath)
+                          and os.path.getsize(filepath) == entry['content_length']):
+            entry = None
+
+        # A resume the server cannot honour is retried once from the start
+        for resume in (True, False):
+            # Byte ranges only line up on the unencoded body
+            headers = {'Accept-Encoding': 'identity'}
+            if entry:
+                headers.update(conditional_headers(entry))
+
+            # Resume only when we know which version of the image the partial file holds
+            offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+            partial = self.cache.get(url, part_path) if self.cache and offset else None
+            validator = partial and (partial['etag'] or partial['last_modified'])
+            if validator:
+                headers['Range'] = f'bytes={offset}-'
+                headers['If-Range'] = validator
+
+            try:
+                response = self.get(url, headers=headers, stream=True)
+            except requests.HTTPError as e:
+                if not (validator and e.response is not None and e.response.status_code == 416):
+                    raise
+                # Nothing past the offset: the last run may have stopped between
+                # writing the final byte and renaming the file
+                size = self._finish_part(url, filepath, part_path, partial, e.response)
+                if size is not None:
+                    return size
+                continue
+
+            with response:
+                if entry and response.status_code == 304:
+                    self.cache.touch(url, response.headers, filepath)
+                    return None
+
+                sha256 = hashlib.sha256()
+                md5 = None
+                if validator and response.status_code == 206:
+                    if content_range(response)[0] != offset:
+                        print(f"  {url}: server resumed at the wrong byte, downloading again")
+                        self._discard_part(url, part_path)
+                        continue
+                    mode = 'ab'
+                    expected = content_range(response)[1]
+                    sha256 = file_sha256(part_path)
+                elif response.status_code == 200:
+                    # Fresh transfer (a 200 to a ranged request means the image changed)
+                    mode = 'wb'
+                    length = response.headers.get('Content-Length')
+                    expected = int(length) if length and length.isdigit() else None
+                    if 'Content-MD5' in response.headers:
+                        md5 = hashlib.md5()
+                else:
+                    raise IOError(f"unexpected HTTP {response.status_code} to a download")
+
+                # Remember the validators (and any advertised checksum) of what
+                # is now in the .part file
+                if self.cache:
+                    advertised = advertised_sha256(response.headers)
+                    self.cache.put(url, response.headers, expected, filepath=part_path,
+                                   sha256=advertised.hex() if advertised else None)
+
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        sha256.update(chunk)
+                        if md5:
+                            md5.update(chunk)
+            break
+
+        size = os.path.getsize(part_path)
+        if expected is not None and size != expected:
+            raise IOError(f"incomplete download ({size} of {expected} bytes)")
+
+        mismatch = (
+            (md5 and base64.b64encode(md5.digest()).decode() != response.headers['Content-MD5'].strip())
+            or not digest_matches(response.headers, sha256.digest())
+        )
+        if mismatch:
+            self._discard_part(url, part_path)
+            raise IOError("checksum mismatch")
+
+        os.replace(part_path, filepath)
+        if self.cache:
+            self.cache.forget(url, part_path)
+            self.cache.put(url, response.headers, size, filepath=filepath,
+                           sha256=sha256.hexdigest())
+        return size
+
+    def _finish_part(self, url, filepath, part_path, partial, response):
+        """
+        Settle a 416 to a resumed download: move the .part file into place if
+        it is the whole image, otherwise discard it
+
+        Returns:
+            Number of bytes in the file, or None if the .part file was discarded
+        """
+        size = os.path.getsize(part_path)
+        total = unsatisfied_length(response) or partial['content_length']
+        sha256 = file_sha256(part_path)
+        expected = bytes.fromhex(partial['sha256']) if partial['sha256'] else advertised_sha256(response.headers)
+        if size != total or (expected is not None and sha256.digest() != expected):
+            print(f"  {url}: partial file does not match the image, downloading again")
+            self._discard_part(url, part_path)
+            return None
+
+        os.replace(part_path, filepath)
+        self.cache.forget(url, part_path)
+        self.cache.put(url, {'ETag': partial['etag'], 'Last-Modified': partial['last_modified']},
+                       size, filepath=filepath, sha256=sha256.hexdigest())
+        return size
+
+    def _discard_part(self, url, part_path):
+        """Delete a partial download and the validators recorded for it"""
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        if self.cache:
+            self.cache.forget(url, part_path)
+
+    def probe(self, url, probe_bytes=PROBE_BYTES):
+        """
+        Pixel dimensions of a remote image, read from its first bytes
+
+        Asks for a byte range so only the header crosses the network; servers
+        that ignore Range have the transfer cut off after probe_bytes.
+
+        Returns:
+            (width, height), or None if the header could not be parsed
+        """
+        headers = {'Accept-Encoding': 'identity', 'Range': f'bytes=0-{probe_bytes - 1}'}
+        data = b''
+        with self.get(url, headers=headers, stream=True) as response:
+            for chunk in response.iter_content(4096):
+                data += chunk
+                if len(data) >= probe_bytes:
+                    break
+        data = data[:probe_bytes]
+
+        size = image_size(data)
+        if (size is None and image_format(data) == 'jpeg'
+                and len(data) == probe_bytes < DEFAULT_PROBE_BYTES):
+            # SOF marker sits beyond a large metadata block
+            return self.probe(url, DEFAULT_PROBE_BYTES)
+        return size
+
+    def map(self, func, items):
+        """
+        Run func(item) for every item on the pool
+
+        Yields:
+            (item, result, error) in completion order; error is None on success
+        """
+        futures = {self._pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
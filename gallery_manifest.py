@@ -0,0 +1,227 @@
+"""
+Gallery manifest
+Computes per-image metadata for the gallery once (intrinsic size, placeholder
+colour, srcset candidates) and caches it on disk. The manifest is rebuilt when
+the images directory changes; unchanged files reuse their previous entries.
+"""
+
+import json
+import os
+import re
+import threading
+
+from image_headers import read_image_size
+
+try:
+    from PIL import Image
+    PLACEHOLDERS_ENABLED = True
+except ImportError:
+    PLACEHOLDERS_ENABLED = False
+
+# Gallery contents, in display order (service preview images are excluded)
+GALLERY_ITEMS = [
+    ('content_visit_cropped-Sundowner-9.jpg', 'Sundowner Experience'),
+    ('content_visit_2016_04_04_staying-at-il-ngwesi_Pool-Jan-2016-8.jpg', 'Infinity Pool'),
+    ('content_visit_2016_04_04_staying-at-il-ngwesi_Main-House-Night-9.jpg', 'Main House at Night'),
+    ('content_visit_2016_04_04_staying-at-il-ngwesi_Camera-Kenya-2-336.jpg', 'Wildlife Photography'),
+    ('content_visit_2016_04_04_staying-at-il-ngwesi_Manyatta-Hunting-8.jpg', 'Cultural Experience'),
+    ('content_visit_2016_04_04_staying-at-il-ngwesi_Camera-Kenya-2-516.jpg', 'Conservancy Views'),
+    ('content_visit_2016_04_04_staying-at-il-ngwesi_Beef-and-Wine-10.jpg', 'Dining Experience'),
+    ('content_visit_Il-Ngwesi-Elephant.jpg', 'Elephant Encounter'),
+    ('content_visit_Mukogodo-Escarpment.jpg', 'Mukogodo Escarpment'),
+    ('content_visit_Dancing-at-the-Manyatta.jpg', 'Manyatta Dancing'),
+    ('content_visit_Manyatta-Dancing-7b.jpg', 'Cultural Celebration'),
+    ('content_visit_Pool-Air-9.jpg', 'Pool & Views'),
+    ('content_visit_Il-Ngwesi-Board-Directors-.jpg', 'Community Leadership'),
+]
+
+# WordPress-style resized variants: name-1024x683.jpg
+VARIANT_PATTERN = re.compile(r'^(?P<stem>.+)-(?P<width>\d+)x(?P<height>\d+)(?P<ext>\.[A-Za-z]+)$')
+
+MANIFEST_VERSION = 1
+
+
+def dominant_color(filepath):
+    """Average colour of the image as a hex string, or None without Pillow"""
+    if not PLACEHOLDERS_ENABLED:
+        return None
+    try:
+        with Image.open(filepath) as img:
+            img.draft('RGB', (64, 64))  # Let the JPEG decoder downscale cheaply
+            r, g, b = img.convert('RGB').resize((1, 1), Image.BOX).getpixel((0, 0))
+    except Exception:
+        return None
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+class GalleryManifest:
+    """Lazily (re)built, disk-backed manifest of gallery images"""
+
+    def __init__(self, images_dir, manifest_path, items=GALLERY_ITEMS, url_prefix='images/'):
+        """
+        Args:
+            images_dir: Directory holding the gallery images and their variants
+            manifest_path: JSON file the computed manifest is cached in
+            items: Ordered (filename, title) pairs shown in the gallery
+            url_prefix: Prefix used to build image URLs
+        """
+        self.images_dir = images_dir
+        self.manifest_path = manifest_path
+        self.items = items
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self._signature = None
+        self._entries = None
+
+    def entries(self):
+        """Current manifest entries, rebuilding if the images directory changed"""
+        signature = self._directory_signature()
+        if signature == self._signature and self._entries is not None:
+            return self._entries
+
+        with self._lock:
+            if signature == self._signature and self._entries is not None:
+                return self._entries
+
+            cached = self._read_manifest()
+            if cached and cached.get('signature') == signature:
+                entries = cached['entries']
+            else:
+                files, entries = self._build(cached.get('files', {}) if cached else {})
+                self._write_manifest(signature, files, entries)
+
+            self._signature = signature
+            self._entries = entries
+            return entries
+
+    @property
+    def version(self):
+        """Opaque token that changes whenever the manifest is rebuilt"""
+        self.entries()
+        return f'{MANIFEST_VERSION}-{self._signature}'
+
+    def page(self, page=1, per_page=12):
+        """
+        One page of gallery entries
+
+        Returns:
+            dict with items, page, per_page, total and next_page (None on the last page)
+        """
+        entries = self.entries()
+        total = len(entries)
+        start = (page - 1) * per_page
+        items = entries[start:start + per_page]
+        return {
+            'items': items,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'next_page': page + 1 if start + per_page < total else None
+        }
+
+    def _directory_signature(self):
+        """Directory mtime changes whenever a file is added, removed or renamed"""
+        try:
+            return str(os.stat(self.images_dir).st_mtime_ns)
+        except OSError:
+            return None
+
+    def _build(self, previous_files):
+        """
+        Compute entries, reusing per-file results whose size and mtime are unchanged
+
+        Returns:
+            (per-file info keyed by filename, ordered gallery entries)
+        """
+        try:
+            filenames = os.listdir(self.images_dir)
+        except OSError:
+            filenames = []
+
+        # Index resized variants by the full-size filename they derive from
+        variants = {}
+        for filename in filenames:
+            match = VARIANT_PATTERN.match(filename)
+            if match:
+                base = match.group('stem') + match.group('ext')
+                variants.setdefault(base, []).append((int(match.group('width')), filename))
+
+        present = set(filenames)
+        files = {}
+        entries = []
+        for filename, title in self.items:
+            if filename not in present:
+                continue
+
+            info = self._file_info(filename, previous_files.get(filename))
+            if info is None:
+                continue
+            files[filename] = info
+
+            width, height = info['width'], info['height']
+            candidates = sorted(variants.get(filename, []))
+            srcset = [
+                {'src': f'{self.url_prefix}{variant}', 'width': variant_width}
+                for variant_width, variant in candidates
+                if variant_width < width
+            ]
+            srcset.append({'src': f'{self.url_prefix}{filename}', 'width': width})
+
+            entries.append({
+                'file': filename,
+                'title': title,
+                'src': f'{self.url_prefix}{filename}',
+                'width': width,
+                'height': height,
+                'color': info['color'],
+                'srcset': srcset
+            })
+        return files, entries
+
+    def _file_info(self, filename, previous):
+        """Dimensions and placeholder colour for one file."""
+        filepath = os.path.join(self.images_dir, filename)
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+
+        if previous and previous.get('mtime_ns') == st.st_mtime_ns and previous.get('size') == st.st_size:
+            return previous
+
+        size = read_image_size(filepath)
+        if size is None:
+            return None
+
+        return {
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'width': size[0],
+            'height': size[1],
+            'color': dominant_color(filepath)
+        }
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('version') != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self, signature, files, entries):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'signature': signature,
+            'files': files,
+            'entries': entries
+        }
+        tmp_path = f'{self.manifest_path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, separators=(',', ':'))
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            print(f"[GALLERY] Could not write manifest: {e}")
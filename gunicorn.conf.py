@@ -0,0 +1,55 @@
+"""
+Production server settings (gunicorn)
+A pre-fork pool of worker processes, each with a few threads, serving the
+preloaded app: app.py is imported once in the master, so the schema check,
+catalogue seeding and config parsing run once and workers fork from it.
+Threads do not survive the fork, so each worker starts its own SMS
+dispatcher, digest scheduler and hold expirer once it has booted
+(post_worker_init), including workers replacing recycled ones.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Graceful reload: kill -HUP <master pid> starts fresh workers (re-reading
+this file) and lets the old ones finish their requests. Because the app is
+preloaded, new code needs a new master: kill -USR2 <master pid>, then
+kill -QUIT the old master once the new one is serving.
+Add or remove a worker: kill -TTIN / -TTOU <master pid>
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# One process per core: SQLite has a single writer, so more processes add
+# lock contention rather than throughput
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+# Threads per worker overlap slow gateway and Safaricom calls
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = True
+
+# Recycle a worker after this many requests (jittered so they do not all
+# restart together), bounding slow leaks
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+# M-Pesa expects answers within 8 seconds; anything near this is stuck
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+# Seconds workers get to finish in-flight requests on reload or shutdown
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.getenv('ACCESS_LOG', '-')
+errorlog = '-'
+
+# Admission slots per worker match its threads (see admission.py)
+os.environ.setdefault('ADMISSION_MAX_IN_FLIGHT', str(threads))
+os.environ.setdefault('ADMISSION_RESERVED_SLOTS', str(max(1, threads // 4)))
+
+
+def post_worker_init(worker):
+    """Start the background threads of a freshly forked worker"""
+    from app import start_background_workers
+    start_background_workers()
@@ -0,0 +1,213 @@
+"""
+Single-pass HTML scanning for the scrapers
+Instead of building a full BeautifulSoup tree and walking it once per
+extractor, the page is tokenized once (with lxml's C parser when installed,
+otherwise the standard library's) and only the pieces the extractors use are
+kept: <img> tags with the title of the card they sit in, elements with a
+background-image style, and stylesheet links.
+"""
+
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+    LXML_ENABLED = True
+except ImportError:
+    LXML_ENABLED = False
+
+# Ancestors searched for a product name (as img.find_parent([...]) did)
+CONTAINER_TAGS = ('div', 'article', 'a', 'li')
+TITLE_TAGS = ('h2', 'h3', 'h4', 'a')
+TITLE_CLASS = re.compile(r'product|title|name', re.I)
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+def decode_html(content):
+    """Decode a page using its <meta> charset, then UTF-8, then Windows-1252"""
+    match = META_CHARSET.search(content[:4096])
+    declared = match.group(1).decode('ascii') if match else None
+    for encoding in (declared, 'utf-8'):
+        if encoding:
+            try:
+                return content.decode(encoding)
+            except (LookupError, UnicodeDecodeError):
+                pass
+    return content.decode('windows-1252', errors='replace')
+
+
+class ScannedImage:
+    """An <img> tag's attributes plus the title found in its nearest container"""
+
+    def __init__(self, attrs, container, link=None):
+        """
+        Args:
+            attrs: The tag's attributes
+            container: Innermost open div/article/a/li when the tag was seen
+            link: href of the innermost <a> around the tag, or None
+        """
+        self.attrs = attrs
+        self._container = container
+        self.link = link
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    @property
+    def container_title(self):
+        """Text of the first title element inside the nearest div/article/a/li, or ''"""
+        if self._container is None or self._container['title'] is None:
+            return ''
+        return ''.join(self._container['title'])
+
+
+class PageScan:
+    """
+    Collects what the extractors need in one pass over the parser's events
+
+    Attributes:
+        images: ScannedImage per <img> (with its enclosing link), in document order
+        background_styles: style attribute of every element using background-image
+        stylesheets: href of every <link rel="stylesheet">
+    """
+
+    def __init__(self):
+        self.images = []
+        self.background_styles = []
+        self.stylesheets = []
+        # Open div/article/a/li elements, innermost last, and open title elements
+        self._containers = []
+        self._titles = []
+        # Text of the current text node; parsers may deliver it in pieces
+        self._text = []
+
+    def start(self, tag, attrs):
+        self._flush_text()
+        tag = tag.lower()
+        style = attrs.get('style')
+        if style and 'background-image' in style:
+            self.background_styles.append(style)
+
+        if tag == 'img':
+            link = next((container['href'] for container in reversed(self._containers)
+                         if container['tag'] == 'a'), None)
+            self.images.append(ScannedImage(attrs, self._containers[-1] if self._containers else None, link))
+            return
+        if tag == 'link':
+            if 'stylesheet' in (attrs.get('rel') or '').lower().split() and attrs.get('href'):
+                self.stylesheets.append(attrs['href'])
+            return
+
+        if tag in TITLE_TAGS and TITLE_CLASS.search(attrs.get('class') or ''):
+            # Becomes the title of every enclosing container that has none yet
+            text = []
+            claimed = False
+            for container in self._containers:
+                if container['title'] is None:
+                    container['title'] = text
+                    claimed = True
+            if claimed:
+                self._titles.append((tag, text))
+        if tag in CONTAINER_TAGS:
+            self._containers.append({'tag': tag, 'title': None, 'href': attrs.get('href')})
+
+    def end(self, tag):
+        self._flush_text()
+        tag = tag.lower()
+        if tag in CONTAINER_TAGS:
+            self._close(self._containers, tag, lambda container: container['tag'])
+        if tag in TITLE_TAGS:
+            self._close(self._titles, tag, lambda title: title[0])
+
+    def data(self, text):
+        if self._titles:
+            self._text.append(text)
+
+    def close(self):
+        self._flush_text()
+        return self
+
+    def _flush_text(self):
+        """Add the finished text node, stripped like get_text(strip=True), to open titles"""
+        if not self._text:
+            return
+        text = ''.join(self._text).strip()
+        self._text = []
+        if text:
+            for _, title in self._titles:
+                title.append(text)
+
+    @staticmethod
+    def _close(stack, tag, tag_of):
+        """Pop up to and including the innermost open element named tag (tolerates bad nesting)"""
+        for index in range(len(stack) - 1, -1, -1):
+            if tag_of(stack[index]) == tag:
+                del stack[index:]
+                return
+
+
+class _StdlibScanner(HTMLParser):
+    """Feeds html.parser events into a PageScan"""
+
+    def __init__(self, scan):
+        super().__init__(convert_charrefs=True)
+        self.scan = scan
+
+    def handle_starttag(self, tag, attrs):
+        self.scan.start(tag, {name: value or '' for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.scan.end(tag)
+
+    def handle_endtag(self, tag):
+        self.scan.end(tag)
+
+    def handle_data(self, data):
+        self.scan.data(data)
+
+
+class _LxmlTarget:
+    """lxml parser target adapter (lxml passes attributes as a read-only mapping)"""
+
+    def __init__(self, scan):
+        self.scan = scan
+
+    def start(self, tag, attrib):
+        self.scan.start(tag, dict(attrib))
+
+    def end(self, tag):
+        self.scan.end(tag)
+
+    def data(self, data):
+        self.scan.data(data)
+
+    def close(self):
+        return self.scan.close()
+
+
+def scan_page(content, use_lxml=LXML_ENABLED):
+    """
+    Scan an HTML document in one pass
+
+    Args:
+        content: Page body as bytes or str
+        use_lxml: Use lxml's parser (default when it is installed)
+
+    Returns:
+        PageScan with the page's images, background styles and stylesheets
+    """
+    if isinstance(content, bytes):
+        content = decode_html(content)
+
+    scan = PageScan()
+    if use_lxml:
+        parser = etree.HTMLParser(target=_LxmlTarget(scan))
+        parser.feed(content)
+        return parser.close()
+
+    scanner = _StdlibScanner(scan)
+    scanner.feed(content)
+    scanner.close()
+    return scan.close()
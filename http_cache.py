@@ -0,0 +1,127 @@
+"""
+Persistent HTTP validator cache for the scraper scripts
+Remembers the ETag, Last-Modified and Content-Length of every URL fetched
+(with the body of pages and stylesheets, or the file a download was saved
+to), so later runs can send conditional requests and treat a 304 as "reuse
+what we already have".
+"""
+
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = '.http_cache.db'
+
+
+class HttpCache:
+    """SQLite-backed cache of response validators keyed by URL and target file"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Shared by the fetcher's worker threads; every access holds the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT NOT NULL,
+                filepath TEXT NOT NULL DEFAULT '',
+                etag TEXT,
+                last_modified TEXT,
+                content_length INTEGER,
+                sha256 TEXT,
+                body BLOB,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (url, filepath)
+            )
+        ''')
+        # Caches created before checksums were recorded
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(http_cache)')]
+        if 'sha256' not in columns:
+            self._conn.execute('ALTER TABLE http_cache ADD COLUMN sha256 TEXT')
+        self._conn.commit()
+
+    def get(self, url, filepath=''):
+        """
+        Cached entry for a URL
+
+        Args:
+            url: Requested URL
+            filepath: File the URL was downloaded to ('' for cached bodies);
+                the scrapers save one URL under several page-prefixed names
+
+        Returns:
+            Dict with etag, last_modified, content_length, sha256 and body,
+            or None if the URL has not been fetched (to that file) before
+        """
+        with self._lock:
+            row = self._conn.execute(
+                '''SELECT etag, last_modified, content_length, sha256, body
+                   FROM http_cache WHERE url = ? AND filepath = ?''',
+                (url, filepath)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'content_length': row[2],
+            'sha256': row[3],
+            'body': row[4]
+        }
+
+    def put(self, url, headers, content_length, filepath='', body=None, sha256=None):
+        """
+        Record the validators of a full (200) response
+
+        Args:
+            url: Requested URL
+            headers: Response headers
+            content_length: Size of the stored body or file in bytes
+            filepath: File the body was written to (downloads)
+            body: Response body to keep (pages and stylesheets)
+            sha256: Hex SHA-256 of the downloaded file
+        """
+        with self._lock:
+            self._conn.execute(
+                '''INSERT OR REPLACE INTO http_cache
+                   (url, filepath, etag, last_modified, content_length, sha256, body, fetched_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (url, filepath, headers.get('ETag'), headers.get('Last-Modified'),
+                 content_length, sha256, body, time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, url, headers, filepath=''):
+        """Refresh an entry after a 304, keeping any new validators the server sent"""
+        with self._lock:
+            self._conn.execute(
+                '''UPDATE http_cache
+                   SET etag = COALESCE(?, etag),
+                       last_modified = COALESCE(?, last_modified),
+                       fetched_at = ?
+                   WHERE url = ? AND filepath = ?''',
+                (headers.get('ETag'), headers.get('Last-Modified'), time.time(), url, filepath)
+            )
+            self._conn.commit()
+
+    def forget(self, url, filepath=''):
+        """Drop an entry (e.g. the validators of an abandoned partial download)"""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM http_cache WHERE url = ? AND filepath = ?', (url, filepath)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers for a cached entry"""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
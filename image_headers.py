@@ -0,0 +1,111 @@
+"""
+Image header parsing
+Reads pixel dimensions from the first bytes of JPEG, PNG, GIF and WebP files
+without decoding the image
+"""
+
+import struct
+
+# Enough for the header of almost every web image; JPEGs with large EXIF
+# blocks fall back to reading more of the file
+DEFAULT_PROBE_BYTES = 64 * 1024
+
+# JPEG start-of-frame markers that carry the frame dimensions
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+
+
+def image_format(data):
+    """Identify the image format from its magic bytes ('jpeg', 'png', 'gif', 'webp' or None)"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def image_size(data):
+    """
+    Return (width, height) parsed from the leading bytes of an image
+
+    Args:
+        data: The first bytes of the file (the whole file also works)
+
+    Returns:
+        (width, height) tuple, or None if the header is unknown or truncated
+    """
+    fmt = image_format(data)
+    try:
+        if fmt == 'png':
+            if data[12:16] != b'IHDR':
+                return None
+            return struct.unpack('>II', data[16:24])
+        if fmt == 'gif':
+            return struct.unpack('<HH', data[6:10])
+        if fmt == 'webp':
+            return _webp_size(data)
+        if fmt == 'jpeg':
+            return _jpeg_size(data)
+    except struct.error:
+        return None
+    return None
+
+
+def read_image_size(filepath, probe_bytes=DEFAULT_PROBE_BYTES):
+    """Read just enough of a file to return its (width, height), or None"""
+    with open(filepath, 'rb') as f:
+        data = f.read(probe_bytes)
+        size = image_size(data)
+        if size is None and image_format(data) == 'jpeg' and len(data) == probe_bytes:
+            # SOF marker sits beyond a large metadata block
+            size = image_size(data + f.read())
+    return size
+
+
+def _jpeg_size(data):
+    """Walk JPEG segments until a start-of-frame marker."""
+    offset = 2
+    length = len(data)
+    while offset + 4 <= length:
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # Standalone markers carry no length
+            offset += 2
+            continue
+
+        segment_length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > length:
+                return None
+            height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + segment_length
+    return None
+
+
+def _webp_size(data):
+    """Dimensions from a VP8, VP8L or VP8X chunk."""
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        bits = struct.unpack('<I', data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None
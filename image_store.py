@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Content-addressed image store for marketplace product images.
+Blobs are keyed by SHA-256 so byte-identical files are stored once, and a
+perceptual hash (dHash) flags near-duplicates for manual review.
+
+Usage:
+    python image_store.py              # dry run: print the dedupe report
+    python image_store.py --apply      # ingest blobs and rewrite products.json
+    python image_store.py --apply --prune   # also delete the original files
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+try:
+    from PIL import Image
+    PERCEPTUAL_HASH_ENABLED = True
+except ImportError:
+    PERCEPTUAL_HASH_ENABLED = False
+
+products_dir = "products"
+blobs_dirname = "blobs"
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Maximum Hamming distance between dHashes to call two images near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 6
+
+
+def sha256_file(filepath, chunk_size=1024 * 1024):
+    """Hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dhash(filepath, hash_size=8):
+    """
+    64-bit difference hash: compares neighbouring pixels of a downscaled
+    greyscale image, so re-encodes and resizes hash to nearby values
+    """
+    if not PERCEPTUAL_HASH_ENABLED:
+        return None
+    try:
+        with Image.open(filepath) as img:
+            img = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+            pixels = img.tobytes()
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+class ImageStore:
+    """Content-addressed blob store rooted under a products directory"""
+
+    def __init__(self, root=products_dir):
+        self.root = root
+        self.blobs_dir = os.path.join(root, blobs_dirname)
+
+    def blob_path(self, digest, ext):
+        """Path of a blob relative to the store root (as referenced by products.json)."""
+        return f"{blobs_dirname}/{digest[:2]}/{digest}{ext.lower()}"
+
+    def put(self, filepath, digest=None):
+        """
+        Copy a file into the store if its content is not already present
+
+        Returns:
+            (relative blob path, True if a new blob was written)
+        """
+        digest = digest or sha256_file(filepath)
+        ext = os.path.splitext(filepath)[1] or '.bin'
+        relative = self.blob_path(digest, ext)
+        target = os.path.join(self.root, relative)
+
+        if os.path.exists(target):
+            return relative, False
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.tmp"
+        shutil.copyfile(filepath, tmp_path)
+        os.replace(tmp_path, target)
+        return relative, True
+
+    def scan(self):
+        """
+        Hash every image in the products directory (outside the blob store)
+
+        Returns:
+            List of dicts with filename, size, sha256 and dhash
+        """
+        entries = []
+        for filename in sorted(os.listdir(self.root)):
+            filepath = os.path.join(self.root, filename)
+            if not os.path.isfile(filepath) or not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            entries.append({
+                'filename': filename,
+                'size': os.path.getsize(filepath),
+                'sha256': sha256_file(filepath),
+                'dhash': dhash(filepath)
+            })
+        return entries
+
+
+def build_report(entries, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Group exact duplicates by SHA-256 and pair near-duplicates by dHash."""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry['sha256'], []).append(entry)
+
+    exact_duplicates = []
+    bytes_reclaimed = 0
+    for digest, members in groups.items():
+        if len(members) > 1:
+            exact_duplicates.append({
+                'sha256': digest,
+                'size': members[0]['size'],
+                'files': [m['filename'] for m in members]
+            })
+            bytes_reclaimed += members[0]['size'] * (len(members) - 1)
+
+    # One representative per blob; compare perceptual hashes pairwise
+    canonical = [members[0] for members in groups.values() if members[0]['dhash'] is not None]
+    near_duplicates = []
+    for i, a in enumerate(canonical):
+        for b in canonical[i + 1:]:
+            distance = hamming(a['dhash'], b['dhash'])
+            if distance <= threshold:
+                near_duplicates.append({
+                    'files': [a['filename'], b['filename']],
+                    'distance': distance
+                })
+
+    return {
+        'files': len(entries),
+        'unique_blobs': len(groups),
+        'total_bytes': sum(e['size'] for e in entries),
+        'bytes_reclaimed': bytes_reclaimed,
+        'exact_duplicates': exact_duplicates,
+        'near_duplicates': near_duplicates,
+        'perceptual_hash': PERCEPTUAL_HASH_ENABLED
+    }
+
+
+def rewrite_products_json(store, digests):
+    """Point each products.json entry at its canonical blob."""
+    json_path = os.path.join(store.root, 'products.json')
+    if not os.path.exists(json_path):
+        return 0
+
+    with open(json_path) as f:
+        products = json.load(f)
+
+    rewritten = 0
+    for product in products:
+        source = product.get('source_image') or product.get('image')
+        if source in digests:
+            digest, relative = digests[source]
+            product['source_image'] = source
+            product['image'] = relative
+            product['sha256'] = digest
+            rewritten += 1
+
+    tmp_path = f"{json_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(products, f, indent=2)
+    os.replace(tmp_path, json_path)
+    return rewritten
+
+
+def print_report(report):
+    """Human-readable dedupe summary."""
+    print(f"Files scanned:      {report['files']}")
+    print(f"Unique blobs:       {report['unique_blobs']}")
+    print(f"Total size:         {report['total_bytes']:,} bytes")
+    print(f"Bytes reclaimed:    {report['bytes_reclaimed']:,} bytes")
+
+    print(f"\nExact duplicates ({len(report['exact_duplicates'])} groups):")
+    for group in report['exact_duplicates']:
+        print(f"  {group['sha256'][:12]}  {group['size']:,} bytes")
+        for filename in group['files']:
+            print(f"    - {filename}")
+
+    if not report['perceptual_hash']:
+        print("\nNear-duplicate detection skipped (install Pillow to enable)")
+        return
+
+    print(f"\nNear duplicates ({len(report['near_duplicates'])} pairs, review manually):")
+    for pair in report['near_duplicates']:
+        print(f"  distance {pair['distance']}:")
+        for filename in pair['files']:
+            print(f"    - {filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--root', default=products_dir, help='Products directory')
+    parser.add_argument('--apply', action='store_true', help='Ingest blobs and rewrite products.json')
+    parser.add_argument('--prune', action='store_true', help='Delete originals after ingesting (requires --apply)')
+    parser.add_argument('--threshold', type=int, default=NEAR_DUPLICATE_THRESHOLD,
+                        help='Max dHash distance for near-duplicates')
+    parser.add_argument('--report', help='Also write the report as JSON to this path')
+    args = parser.parse_args()
+
+    if args.prune and not args.apply:
+        parser.error('--prune requires --apply')
+
+    store = ImageStore(args.root)
+    entries = store.scan()
+    report = build_report(entries, args.threshold)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not args.apply:
+        print("\nDry run - pass --apply to ingest blobs and rewrite products.json")
+        sys.exit(0)
+
+    digests = {}
+    written = 0
+    for entry in entries:
+        relative, created = store.put(os.path.join(store.root, entry['filename']), entry['sha256'])
+        digests[entry['filename']] = (entry['sha256'], relative)
+        written += created
+
+    rewritten = rewrite_products_json(store, digests)
+    print(f"\nStored {written} new blobs in {store.blobs_dir}")
+    print(f"Rewrote {rewritten} products.json entries")
+
+    if args.prune:
+        for entry in entries:
+            os.remove(os.path.join(store.root, entry['filename']))
+        print(f"Removed {len(entries)} original files")
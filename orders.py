@@ -0,0 +1,291 @@
+"""
+Marketplace orders
+Orders placed at checkout, priced from the catalogue, with per-product and
+per-day sales aggregates updated in the same transaction as each order so the
+sales summary never has to scan the order history
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+# Matches cart.js: KES 500 shipping below KES 10,000, free above
+SHIPPING_FEE = 500
+FREE_SHIPPING_THRESHOLD = 10000
+
+PAYMENT_METHODS = ('mpesa', 'card', 'paypal', 'cash')
+
+REQUIRED_CUSTOMER_FIELDS = ('fullName', 'email', 'phone', 'street', 'city', 'county')
+
+MAX_ORDER_QUANTITY = 100
+
+# Longest window the sales summary reports per-day figures for
+MAX_SUMMARY_DAYS = 366
+
+
+def init_orders(cursor):
+    """Create the order and sales aggregate tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_code TEXT UNIQUE NOT NULL,
+            customer_name TEXT NOT NULL,
+            customer_email TEXT NOT NULL,
+            customer_phone TEXT NOT NULL,
+            shipping_address TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            subtotal DECIMAL NOT NULL,
+            shipping DECIMAL NOT NULL,
+            total_amount DECIMAL NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            unit_price DECIMAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            line_total DECIMAL NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)
+    ''')
+
+    # Running totals, one row per product ever sold
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_by_product (
+            product_id INTEGER PRIMARY KEY,
+            product_name TEXT NOT NULL,
+            category TEXT,
+            image TEXT,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL NOT NULL DEFAULT 0,
+            first_sold TIMESTAMP,
+            last_sold TIMESTAMP
+        )
+    ''')
+    # Running totals across all orders (single row)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            orders INTEGER NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO sales_totals (id) VALUES (1)')
+    # Running totals, one row per calendar day with sales
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_by_day (
+            day DATE PRIMARY KEY,
+            orders INTEGER NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue DECIMAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def generate_order_code():
+    """Generate a unique order code"""
+    date_str = datetime.now().strftime("%Y%m%d")
+    unique_id = str(uuid.uuid4())[:8].upper()
+    return f"M{date_str}-{unique_id}"
+
+
+def shipping_cost(subtotal):
+    return 0 if subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_FEE
+
+
+def create_order(cursor, data):
+    """
+    Record a checkout order and fold it into the sales aggregates
+    Prices and names come from the catalogue, not the client's cart.
+
+    Args:
+        cursor: sqlite3 cursor (the caller commits)
+        data: Checkout payload with customer fields, paymentMethod and
+              items [{id, quantity}]
+
+    Raises:
+        ValueError: if a field is missing or an item is unknown or unlisted
+
+    Returns:
+        dict with order_code, items, subtotal, shipping and total
+    """
+    missing = [f for f in REQUIRED_CUSTOMER_FIELDS if not str(data.get(f) or '').strip()]
+    if missing:
+        raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+
+    payment_method = data.get('paymentMethod', 'mpesa')
+    if payment_method not in PAYMENT_METHODS:
+        raise ValueError(f"paymentMethod must be one of: {', '.join(PAYMENT_METHODS)}")
+
+    # Merge repeated lines for the same product
+    quantities = {}
+    for item in data.get('items') or []:
+        try:
+            product_id = int(item['id'])
+            quantity = int(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each item needs a numeric id and quantity')
+        if quantity < 1:
+            raise ValueError('Item quantity must be at least 1')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise ValueError('Order has no items')
+    if any(q > MAX_ORDER_QUANTITY for q in quantities.values()):
+        raise ValueError(f'Item quantity must not exceed {MAX_ORDER_QUANTITY}')
+
+    ids = list(quantities)
+    cursor.execute(f'''
+        SELECT id, name, category, price, image
+        FROM products
+        WHERE active = 1 AND id IN ({','.join('?' * len(ids))})
+    ''', ids)
+    catalogue = {row[0]: row[1:] for row in cursor.fetchall()}
+    unavailable = [str(i) for i in ids if i not in catalogue]
+    if unavailable:
+        raise ValueError(f"Product(s) not available: {', '.join(unavailable)}")
+
+    lines = []
+    for product_id, quantity in quantities.items():
+        name, category, price, image = catalogue[product_id]
+        lines.append({
+            'product_id': product_id,
+            'product_name': name,
+            'category': category,
+            'image': image,
+            'unit_price': price,
+            'quantity': quantity,
+            'line_total': price * quantity
+        })
+
+    subtotal = sum(line['line_total'] for line in lines)
+    shipping = shipping_cost(subtotal)
+    total = subtotal + shipping
+    address = ', '.join(
+        str(data[f]).strip() for f in ('street', 'city', 'postalCode', 'county') if data.get(f)
+    )
+
+    now = datetime.now()
+    created_at = now.strftime('%Y-%m-%d %H:%M:%S')
+    order_code = generate_order_code()
+    cursor.execute('''
+        INSERT INTO orders (
+            order_code, customer_name, customer_email, customer_phone,
+            shipping_address, payment_method, subtotal, shipping, total_amount, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        order_code,
+        data['fullName'].strip(),
+        data['email'].strip(),
+        data['phone'].strip(),
+        address,
+        payment_method,
+        subtotal,
+        shipping,
+        total,
+        created_at
+    ))
+    order_id = cursor.lastrowid
+
+    cursor.executemany('''
+        INSERT INTO order_items (order_id, product_id, product_name, unit_price, quantity, line_total)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (order_id, l['product_id'], l['product_name'], l['unit_price'], l['quantity'], l['line_total'])
+        for l in lines
+    ])
+
+    cursor.executemany('''
+        INSERT INTO sales_by_product (
+            product_id, product_name, category, image, quantity, revenue, first_sold, last_sold
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (product_id) DO UPDATE SET
+            product_name = excluded.product_name,
+            category = excluded.category,
+            image = excluded.image,
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue,
+            last_sold = excluded.last_sold
+    ''', [
+        (l['product_id'], l['product_name'], l['category'], l['image'],
+         l['quantity'], l['line_total'], created_at, created_at)
+        for l in lines
+    ])
+
+    units = sum(l['quantity'] for l in lines)
+    cursor.execute('''
+        INSERT INTO sales_by_day (day, orders, quantity, revenue)
+        VALUES (?, 1, ?, ?)
+        ON CONFLICT (day) DO UPDATE SET
+            orders = orders + 1,
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue
+    ''', (now.strftime('%Y-%m-%d'), units, subtotal))
+    cursor.execute('''
+        UPDATE sales_totals
+        SET orders = orders + 1, quantity = quantity + ?, revenue = revenue + ?
+        WHERE id = 1
+    ''', (units, subtotal))
+
+    return {
+        'order_code': order_code,
+        'items': [
+            {k: l[k] for k in ('product_id', 'product_name', 'unit_price', 'quantity', 'line_total')}
+            for l in lines
+        ],
+        'subtotal': subtotal,
+        'shipping': shipping,
+        'total': total
+    }
+
+
+def sales_summary(cursor, days=30, top=None):
+    """
+    Marketplace sales from the aggregate tables
+
+    Args:
+        cursor: sqlite3 cursor
+        days: Number of trailing days of per-day figures (capped at MAX_SUMMARY_DAYS)
+        top: Optional limit on the number of products returned
+
+    Returns:
+        dict with totals, products (best sellers first) and daily figures
+    """
+    days = max(1, min(int(days), MAX_SUMMARY_DAYS))
+
+    cursor.execute(f'''
+        SELECT product_id, product_name, category, image, quantity, revenue, first_sold, last_sold
+        FROM sales_by_product
+        ORDER BY quantity DESC, revenue DESC
+        {'LIMIT ?' if top else ''}
+    ''', (int(top),) if top else ())
+    columns = ('product_id', 'product_name', 'category', 'image',
+               'quantity', 'revenue', 'first_sold', 'last_sold')
+    products = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    cursor.execute('SELECT orders, quantity, revenue FROM sales_totals WHERE id = 1')
+    orders, quantity, revenue = cursor.fetchone()
+
+    since = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    cursor.execute('''
+        SELECT day, orders, quantity, revenue
+        FROM sales_by_day
+        WHERE day >= ?
+        ORDER BY day
+    ''', (since,))
+    daily = [
+        {'day': row[0], 'orders': row[1], 'quantity': row[2], 'revenue': row[3]}
+        for row in cursor.fetchall()
+    ]
+
+    return {
+        'totals': {'orders': orders, 'quantity': quantity, 'revenue': revenue},
+        'products': products,
+        'daily': daily
+    }
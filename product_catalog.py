@@ -0,0 +1,226 @@
+"""
+Incremental products.json builder
+Merges the products found by a crawl into the existing products/products.json
+instead of overwriting it: entries are matched by a stable product key (the
+product page handle, or the normalised name when the card has no link), and
+entries written before keys were recorded by name, image file or product link.
+The curated fields (id, category, price, description) are kept, and every
+entry records its image's SHA-256, pixel dimensions, thumbnails and when the
+product was first and last seen. The file is written atomically, one compact
+entry per line.
+"""
+
+import json
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from image_headers import read_image_size
+from image_store import sha256_file
+
+try:
+    from PIL import Image
+    THUMBNAILS_ENABLED = True
+except ImportError:
+    THUMBNAILS_ENABLED = False
+
+CATALOG_FILENAME = 'products.json'
+THUMBNAILS_DIRNAME = 'thumbs'
+
+# Thumbnail widths in pixels, as used by the marketplace grid and cart
+THUMBNAIL_WIDTHS = (200, 400)
+THUMBNAIL_QUALITY = 80
+
+# Key order of written entries (unknown keys follow), so diffs stay line-local
+ENTRY_FIELDS = (
+    'id', 'name', 'category', 'price', 'description', 'image', 'source_image',
+    'url', 'key', 'sha256', 'width', 'height', 'thumbnails', 'first_seen', 'last_seen'
+)
+
+# Names shorter than this are alt-text noise, not products
+MIN_NAME_LENGTH = 4
+
+PRODUCT_HANDLE = re.compile(r'/products/([^/?#]+)')
+
+
+def product_key(name, link=None):
+    """
+    Stable identity of a product
+
+    Args:
+        name: Product name from the card
+        link: URL the card links to, if any
+
+    Returns:
+        'handle:<shop handle>' when the link is a product page, else 'name:<normalised name>'
+    """
+    match = PRODUCT_HANDLE.search(urlparse(link).path) if link else None
+    if match:
+        return f'handle:{match.group(1).lower()}'
+    return f"name:{' '.join(name.lower().split())}"
+
+
+def make_thumbnails(products_dir, image, digest, widths=THUMBNAIL_WIDTHS):
+    """
+    JPEG thumbnails of a product image, named by content hash so unchanged
+    images keep theirs
+
+    Returns:
+        {width: path relative to products_dir}, or {} without Pillow
+    """
+    if not THUMBNAILS_ENABLED:
+        return {}
+
+    thumbnails = {}
+    try:
+        with Image.open(os.path.join(products_dir, image)) as img:
+            img = img.convert('RGB')
+            for width in widths:
+                relative = f'{THUMBNAILS_DIRNAME}/{digest[:16]}-{width}w.jpg'
+                path = os.path.join(products_dir, relative)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    height = max(1, round(img.height * width / img.width))
+                    thumb = img.resize((width, height), Image.LANCZOS) if width < img.width else img
+                    tmp_path = f'{path}.tmp'
+                    thumb.save(tmp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+                    os.replace(tmp_path, path)
+                thumbnails[str(width)] = relative
+    except Exception as e:
+        print(f"  Could not make thumbnails for {image}: {e}")
+        return {}
+    return thumbnails
+
+
+class CatalogBuilder:
+    """Merges crawl results into products.json"""
+
+    def __init__(self, products_dir, filename=CATALOG_FILENAME):
+        """
+        Args:
+            products_dir: Directory holding the product images and products.json
+            filename: Catalogue file name inside products_dir
+        """
+        self.products_dir = products_dir
+        self.path = os.path.join(products_dir, filename)
+        self.entries = self._read()
+        self.added = 0
+        self.updated = 0
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return []
+        except ValueError as e:
+            raise ValueError(f"{self.path} is not valid JSON; fix or remove it before merging") from e
+        return entries
+
+    def merge(self, results, seen_at=None):
+        """
+        Merge the downloaded products of a crawl
+
+        Args:
+            results: Crawler.results() rows (name, filepath, page_url, link)
+            seen_at: ISO-8601 timestamp of the crawl (default: now, UTC)
+
+        Returns:
+            Number of distinct products in the results
+        """
+        seen_at = seen_at or datetime.now(timezone.utc).isoformat(timespec='seconds')
+        by_key = {entry['key']: entry for entry in self.entries if entry.get('key')}
+        by_name = {product_key(entry['name']): entry for entry in self.entries if entry.get('name')}
+        # Entries written before keys were recorded may have been renamed by
+        # hand since; their image file and product link still identify them
+        legacy = [entry for entry in self.entries if not entry.get('key')]
+        by_image = {entry[field]: entry for entry in legacy
+                    for field in ('image', 'source_image') if entry.get(field)}
+        by_link = {entry['url']: entry for entry in legacy
+                   if entry.get('url') and PRODUCT_HANDLE.search(urlparse(entry['url']).path)}
+        next_id = max([e['id'] for e in self.entries if isinstance(e.get('id'), int)] or [0]) + 1
+
+        merged = set()
+        for result in results:
+            name = (result['name'] or '').strip()
+            if len(name) < MIN_NAME_LENGTH:
+                continue
+            key = product_key(name, result.get('link'))
+            if key in merged:
+                continue
+            merged.add(key)
+
+            entry = by_key.get(key)
+            if entry is None:
+                # Entries written before keys were recorded (or before the card
+                # had a link) are matched by name
+                candidate = by_name.get(product_key(name))
+                if candidate and candidate.get('key', product_key(name)) == product_key(name):
+                    entry = candidate
+            if entry is None:
+                entry = self._match_legacy(result, by_image, by_link)
+            if entry is None:
+                entry = {'id': next_id, 'name': name}
+                next_id += 1
+                self.entries.append(entry)
+                self._refresh_image(entry, result)
+                self.added += 1
+            elif self._refresh_image(entry, result):
+                self.updated += 1
+
+            entry['key'] = key
+            entry['url'] = result['link'] or result['page_url']
+            entry.setdefault('first_seen', seen_at)
+            entry['last_seen'] = seen_at
+            by_key[key] = entry
+        return len(merged)
+
+    def _match_legacy(self, result, by_image, by_link):
+        """
+        Entry without a key for a crawled product whose name no longer matches:
+        the one using the downloaded image file, else the one recorded with the
+        same product page link. Each is claimed at most once.
+        """
+        for candidates, value in ((by_image, os.path.basename(result['filepath'])),
+                                  (by_link, result.get('link'))):
+            entry = candidates.get(value) if value else None
+            if entry is not None and not entry.get('key'):
+                return entry
+        return None
+
+    def _refresh_image(self, entry, result):
+        """
+        Point an entry at the crawled image, recomputing size and thumbnails when it changed
+
+        Returns:
+            True if the image content differs from what the entry recorded
+        """
+        image = os.path.basename(result['filepath'])
+        digest = sha256_file(result['filepath'])
+        changed = digest != entry.get('sha256')
+
+        if changed or 'width' not in entry:
+            size = read_image_size(result['filepath'])
+            entry['width'], entry['height'] = size if size else (None, None)
+        if changed or not entry.get('thumbnails'):
+            entry['thumbnails'] = make_thumbnails(self.products_dir, image, digest)
+        # image_store may have moved an unchanged image onto a shared blob; keep that
+        if changed or not entry.get('source_image'):
+            entry['image'] = image
+            entry.pop('source_image', None)
+        entry['sha256'] = digest
+        return changed
+
+    def save(self):
+        """Write the catalogue atomically, one compact JSON object per line, ordered by id"""
+        entries = sorted(self.entries, key=lambda e: (not isinstance(e.get('id'), int), e.get('id') or 0))
+        lines = []
+        for entry in entries:
+            ordered = {field: entry[field] for field in ENTRY_FIELDS if field in entry}
+            ordered.update(entry)
+            lines.append(json.dumps(ordered, ensure_ascii=False, separators=(',', ':')))
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[\n' + ',\n'.join(lines) + '\n]\n')
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,511 @@
+"""
+Reservation holds
+A booking holds capacity for each requested service on its arrival date
+until it is paid (the hold is committed), the steward declines the service
+(released) or its time-to-live runs out (expired). STK push checkouts get
+the same treatment: a checkout nobody completes falls back from
+'pending_stk' to 'pending' when it times out.
+
+Expiry is driven by partial indexes ordered by expires_at over live rows
+only, so finding what is due (and counting what is held) never touches
+dead holds; expired rows are released in bounded batches by a background
+thread that sleeps until the next hold is due. Bookings take their holds
+inside BEGIN IMMEDIATE transactions, so two requests for the last places
+are serialised by SQLite's write lock and the loser sees the updated count.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Visitors per day each service can take (editable in the service_capacity table)
+DEFAULT_SERVICE_CAPACITY = {
+    'guided_walk': 20,
+    'homestay': 8,
+    'cultural_evening': 30,
+    'bush_breakfast': 20,
+    'rhino_sanctuary': 16,
+    'beading_workshop': 12,
+}
+
+# Seconds a booking holds its places before it must be paid
+HOLD_TTL = int(os.getenv('RESERVATION_HOLD_TTL', 24 * 60 * 60))
+# Seconds an STK push checkout stays 'pending_stk' without a callback
+STK_CHECKOUT_TTL = int(os.getenv('STK_CHECKOUT_TTL', 5 * 60))
+
+# Rows released per expiry statement
+EXPIRY_BATCH_SIZE = 500
+
+# Seconds a writer waits for SQLite's lock before giving up (sqlite3 busy timeout)
+LOCK_TIMEOUT = 10
+
+LIVE_STATUSES = ('held', 'committed')
+
+
+class CapacityError(Exception):
+    """Not enough places left for a service on the requested date"""
+
+    def __init__(self, service, arrival_date, requested, available):
+        super().__init__(
+            f"Only {available} place(s) left for {service} on {arrival_date} ({requested} requested)"
+        )
+        self.service = service
+        self.arrival_date = arrival_date
+        self.requested = requested
+        self.available = available
+
+
+class ContentionMetrics:
+    """Per-process counters for write-lock contention and hold outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transactions = 0
+            self.lock_wait_total = 0.0
+            self.lock_wait_max = 0.0
+            self.contended = 0
+            self.busy_errors = 0
+            self.sold_out = 0
+            self.holds_created = 0
+            self.holds_committed = 0
+            self.holds_released = 0
+            self.holds_expired = 0
+            self.checkouts_expired = 0
+
+    def count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def lock_acquired(self, waited):
+        with self._lock:
+            self.transactions += 1
+            self.lock_wait_total += waited
+            self.lock_wait_max = max(self.lock_wait_max, waited)
+            # Uncontended BEGIN IMMEDIATE takes microseconds
+            if waited > 0.001:
+                self.contended += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'transactions': self.transactions,
+                'contended_transactions': self.contended,
+                'lock_wait_avg_ms': round(self.lock_wait_total * 1000 / self.transactions, 3)
+                if self.transactions else 0.0,
+                'lock_wait_max_ms': round(self.lock_wait_max * 1000, 3),
+                'busy_errors': self.busy_errors,
+                'sold_out': self.sold_out,
+                'holds_created': self.holds_created,
+                'holds_committed': self.holds_committed,
+                'holds_released': self.holds_released,
+                'holds_expired': self.holds_expired,
+                'checkouts_expired': self.checkouts_expired
+            }
+
+
+metrics = ContentionMetrics()
+
+
+def init_reservations(cursor, capacity=DEFAULT_SERVICE_CAPACITY):
+    """Create the capacity, hold and STK checkout tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS service_capacity (
+            service TEXT PRIMARY KEY,
+            daily_capacity INTEGER NOT NULL
+        )
+    ''')
+    cursor.executemany(
+        'INSERT OR IGNORE INTO service_capacity (service, daily_capacity) VALUES (?, ?)',
+        capacity.items()
+    )
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reservation_holds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            booking_code TEXT NOT NULL,
+            service TEXT NOT NULL,
+            arrival_date DATE NOT NULL,
+            visitors INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'held',
+            expires_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Live places per date and service (capacity checks)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_live
+        ON reservation_holds (arrival_date, service, visitors)
+        WHERE status IN ('held', 'committed')
+    ''')
+    # Expiry order of open holds
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_expiry
+        ON reservation_holds (expires_at)
+        WHERE status = 'held'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_booking
+        ON reservation_holds (booking_code)
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stk_checkouts (
+            checkout_request_id TEXT PRIMARY KEY,
+            booking_code TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            expires_at REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stk_checkouts_expiry
+        ON stk_checkouts (expires_at)
+        WHERE status = 'pending'
+    ''')
+
+
+def connect(db_path):
+    """Connection for hold transactions (waits up to LOCK_TIMEOUT for the write lock)"""
+    return sqlite3.connect(db_path, timeout=LOCK_TIMEOUT)
+
+
+def begin_immediate(conn):
+    """
+    Take SQLite's write lock now rather than at the first write, recording
+    how long the caller waited for it
+
+    Raises:
+        sqlite3.OperationalError: if the lock was not free within the busy timeout
+    """
+    start = time.perf_counter()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+    except sqlite3.OperationalError:
+        metrics.count('busy_errors')
+        raise
+    metrics.lock_acquired(time.perf_counter() - start)
+
+
+def availability(cursor, arrival_date):
+    """
+    Places per service on a date
+
+    Returns:
+        {service: {capacity, held, available}}
+    """
+    cursor.execute('''
+        SELECT c.service, c.daily_capacity, COALESCE(SUM(h.visitors), 0)
+        FROM service_capacity c
+        LEFT JOIN reservation_holds h
+          ON h.service = c.service AND h.arrival_date = ? AND h.status IN ('held', 'committed')
+        GROUP BY c.service
+    ''', (arrival_date,))
+    return {
+        service: {'capacity': capacity, 'held': held, 'available': max(0, capacity - held)}
+        for service, capacity, held in cursor.fetchall()
+    }
+
+
+def create_holds(cursor, booking_code, arrival_date, services, visitors, ttl=HOLD_TTL, now=None):
+    """
+    Hold places for a booking (inside the caller's BEGIN IMMEDIATE transaction)
+
+    Expired holds are released first, so capacity freed by abandoned
+    bookings is available even if the expiry thread has not run yet.
+
+    Raises:
+        CapacityError: if any service lacks room; nothing is held then
+    """
+    now = now or time.time()
+    release_expired(cursor, now)
+
+    places = availability(cursor, arrival_date)
+    for service in services:
+        # Services without a configured capacity are not limited
+        if service in places and places[service]['available'] < visitors:
+            metrics.count('sold_out')
+            raise CapacityError(service, arrival_date, visitors, places[service]['available'])
+
+    cursor.executemany('''
+        INSERT INTO reservation_holds (booking_code, service, arrival_date, visitors, expires_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(booking_code, service, arrival_date, visitors, now + ttl) for service in services])
+    metrics.count('holds_created', len(services))
+
+
+def commit_holds(cursor, booking_code):
+    """Make a paid booking's holds permanent (the caller commits)"""
+    cursor.execute('''
+        UPDATE reservation_holds SET status = 'committed', expires_at = NULL
+        WHERE booking_code = ? AND status = 'held'
+    ''', (booking_code,))
+    metrics.count('holds_committed', cursor.rowcount)
+    cursor.execute('''
+        UPDATE stk_checkouts SET status = 'completed'
+        WHERE booking_code = ? AND status = 'pending'
+    ''', (booking_code,))
+
+
+def secure_holds(cursor, booking_code, checkout_request_id=None):
+    """
+    Secure the places of a booking that has just been paid (inside the
+    caller's BEGIN IMMEDIATE transaction)
+
+    Open holds are committed. Places whose hold already expired (a late
+    payment) are taken again if the service still has room; an expired
+    booking that gets all its places back returns to 'confirmed' or
+    'pending', one that does not becomes 'overbooked' for the steward to sort
+    out.
+
+    Args:
+        checkout_request_id: STK checkout that paid, marked completed even if
+            it had expired
+
+    Returns:
+        Services that could not be secured (empty when all places are held)
+    """
+    commit_holds(cursor, booking_code)
+    if checkout_request_id:
+        cursor.execute('''
+            UPDATE stk_checkouts SET status = 'completed' WHERE checkout_request_id = ?
+        ''', (checkout_request_id,))
+
+    cursor.execute('''
+        SELECT arrival_date, num_visitors, requested_services, confirmed_services, status
+        FROM bookings WHERE booking_code = ?
+    ''', (booking_code,))
+    row = cursor.fetchone()
+    if not row:
+        return []
+    arrival_date, visitors, requested, confirmed, status = row
+    services = json.loads(confirmed) if confirmed is not None else json.loads(requested)
+
+    cursor.execute('''
+        SELECT service FROM reservation_holds WHERE booking_code = ? AND status = 'committed'
+    ''', (booking_code,))
+    held = {service for (service,) in cursor.fetchall()}
+    missing = [service for service in services if service not in held]
+
+    places = availability(cursor, arrival_date) if missing else {}
+    short = [s for s in missing if s in places and places[s]['available'] < visitors]
+    retaken = [s for s in missing if s not in short]
+    if retaken:
+        cursor.executemany('''
+            INSERT INTO reservation_holds (booking_code, service, arrival_date, visitors, status)
+            VALUES (?, ?, ?, ?, 'committed')
+        ''', [(booking_code, service, arrival_date, visitors) for service in retaken])
+        metrics.count('holds_committed', len(retaken))
+
+    if short:
+        metrics.count('sold_out')
+        cursor.execute("UPDATE bookings SET status = 'overbooked' WHERE booking_code = ?", (booking_code,))
+    elif status == 'expired':
+        cursor.execute('''
+            UPDATE bookings SET status = ? WHERE booking_code = ?
+        ''', ('confirmed' if confirmed is not None else 'pending', booking_code))
+    return short
+
+
+def release_holds(cursor, booking_code, services=None):
+    """Give back a booking's places, or only those of the given services (the caller commits)"""
+    query = '''
+        UPDATE reservation_holds SET status = 'released', expires_at = NULL
+        WHERE booking_code = ? AND status = 'held'
+    '''
+    params = [booking_code]
+    if services is not None:
+        if not services:
+            return
+        query += f" AND service IN ({','.join('?' * len(services))})"
+        params += list(services)
+    cursor.execute(query, params)
+    metrics.count('holds_released', cursor.rowcount)
+
+
+def start_checkout(cursor, checkout_request_id, booking_code, ttl=STK_CHECKOUT_TTL):
+    """Record an STK push checkout that must complete within ttl seconds (the caller commits)"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO stk_checkouts (checkout_request_id, booking_code, expires_at)
+        VALUES (?, ?, ?)
+    ''', (checkout_request_id, booking_code, time.time() + ttl))
+
+
+def checkout_booking(cursor, checkout_request_id, pending_only=True):
+    """
+    Booking code of an STK checkout, or None
+
+    Args:
+        pending_only: Ignore checkouts that already completed, failed or
+            expired (payment callbacks pass False: a late success still pays)
+    """
+    query = 'SELECT booking_code FROM stk_checkouts WHERE checkout_request_id = ?'
+    if pending_only:
+        query += " AND status = 'pending'"
+    cursor.execute(query, (checkout_request_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def fail_checkout(cursor, checkout_request_id):
+    """
+    Close an STK checkout that was cancelled or failed, putting the booking
+    back to 'pending' payment unless another checkout is open (the caller commits)
+
+    Returns:
+        The booking code, or None if the checkout was unknown or already closed
+    """
+    booking_code = checkout_booking(cursor, checkout_request_id)
+    if not booking_code:
+        return None
+    cursor.execute('''
+        UPDATE stk_checkouts SET status = 'failed' WHERE checkout_request_id = ?
+    ''', (checkout_request_id,))
+    cursor.execute('''
+        UPDATE bookings SET payment_status = 'pending'
+        WHERE booking_code = ? AND payment_status = 'pending_stk'
+          AND NOT EXISTS (
+              SELECT 1 FROM stk_checkouts s
+              WHERE s.booking_code = bookings.booking_code AND s.status = 'pending'
+          )
+    ''', (booking_code,))
+    return booking_code
+
+
+def release_expired(cursor, now=None, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Expire holds and STK checkouts whose time is up, one batch of each
+
+    Bookings left without a live hold and still unpaid become 'expired';
+    bookings whose only STK checkouts timed out go back to 'pending'
+    payment so the visitor can try again. The caller commits.
+
+    Returns:
+        (holds expired, checkouts expired) in this batch
+    """
+    now = now or time.time()
+
+    cursor.execute('''
+        UPDATE reservation_holds SET status = 'expired'
+        WHERE id IN (
+            SELECT id FROM reservation_holds
+            WHERE status = 'held' AND expires_at <= ?
+            ORDER BY expires_at LIMIT ?
+        )
+        RETURNING booking_code
+    ''', (now, batch_size))
+    expired = [row[0] for row in cursor.fetchall()]
+
+    if expired:
+        codes = sorted(set(expired))
+        cursor.execute(f'''
+            UPDATE bookings SET status = 'expired'
+            WHERE booking_code IN ({','.join('?' * len(codes))})
+              AND payment_status != 'paid'
+              AND status IN ('pending', 'confirmed')
+              AND NOT EXISTS (
+                  SELECT 1 FROM reservation_holds h
+                  WHERE h.booking_code = bookings.booking_code
+                    AND h.status IN ('held', 'committed')
+              )
+        ''', codes)
+
+    cursor.execute('''
+        UPDATE stk_checkouts SET status = 'expired'
+        WHERE checkout_request_id IN (
+            SELECT checkout_request_id FROM stk_checkouts
+            WHERE status = 'pending' AND expires_at <= ?
+            ORDER BY expires_at LIMIT ?
+        )
+        RETURNING booking_code
+    ''', (now, batch_size))
+    abandoned = [row[0] for row in cursor.fetchall()]
+    if abandoned:
+        codes = sorted(set(abandoned))
+        cursor.execute(f'''
+            UPDATE bookings SET payment_status = 'pending'
+            WHERE booking_code IN ({','.join('?' * len(codes))})
+              AND payment_status = 'pending_stk'
+              AND NOT EXISTS (
+                  SELECT 1 FROM stk_checkouts s
+                  WHERE s.booking_code = bookings.booking_code AND s.status = 'pending'
+              )
+        ''', codes)
+
+    metrics.count('holds_expired', len(expired))
+    metrics.count('checkouts_expired', len(abandoned))
+    return len(expired), len(abandoned)
+
+
+def next_expiry(cursor):
+    """Earliest expires_at among open holds and checkouts, or None"""
+    cursor.execute('''
+        SELECT MIN(expires_at) FROM (
+            SELECT MIN(expires_at) AS expires_at FROM reservation_holds WHERE status = 'held'
+            UNION ALL
+            SELECT MIN(expires_at) FROM stk_checkouts WHERE status = 'pending'
+        )
+    ''')
+    return cursor.fetchone()[0]
+
+
+class HoldExpirer:
+    """
+    Background thread releasing expired holds in batches
+
+    Sleeps until the earliest open hold or checkout is due (re-checking at
+    least every max_sleep seconds, as other processes add holds too).
+    """
+
+    def __init__(self, db_path, max_sleep=60):
+        self.db_path = db_path
+        self.max_sleep = max_sleep
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def wake(self):
+        """Start the worker if needed and have it re-check the next expiry"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='hold-expirer', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                next_due = self.run_once()
+            except Exception as e:
+                print(f"[HOLDS] Expiry error: {e}")
+                next_due = None
+            timeout = self.max_sleep if next_due is None else min(self.max_sleep, max(0.0, next_due - time.time()))
+            self._wakeup.wait(timeout=timeout)
+            self._wakeup.clear()
+
+    def run_once(self):
+        """
+        Release everything that is due, a batch per transaction
+
+        Returns:
+            Next expiry time, or None if nothing is open
+        """
+        conn = connect(self.db_path)
+        try:
+            while True:
+                begin_immediate(conn)
+                holds, checkouts = release_expired(conn.cursor())
+                conn.commit()
+                if holds < EXPIRY_BATCH_SIZE and checkouts < EXPIRY_BATCH_SIZE:
+                    break
+            return next_expiry(conn.cursor())
+        finally:
+            conn.close()
@@ -23,14 +23,19 @@ source venv/bin/activate
 echo "Installing dependencies..."
 pip install -r requirements.txt
 
-# Run the server
+# Run the server: ./run.sh dev for Flask's debug server, otherwise gunicorn
 echo ""
-echo "Starting Flask server..."
 echo "Website will be available at: http://localhost:5000"
 echo "API endpoints available at: http://localhost:5000/api/"
 echo ""
 echo "Press Ctrl+C to stop the server"
 echo ""
 
-python3 app.py
+if [ "$1" = "dev" ]; then
+    echo "Starting Flask development server..."
+    FLASK_DEBUG=1 exec python3 app.py
+fi
+
+echo "Starting production server (gunicorn, ${WEB_WORKERS:-one worker per core})..."
+exec gunicorn -c gunicorn.conf.py app:app
 
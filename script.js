@@ -28,6 +28,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeReviews();
     initializeCrossPageNavLoading();
     initializeShopScrollTopButton();
+    initializeServiceWorker();
 });
 
 /** Basenames that typically mean a full page load or heavy JS work on this site. */
@@ -344,35 +345,10 @@ function initializeGallery() {
     const galleryGrid = document.getElementById('galleryGrid');
     if (!galleryGrid) return;
 
-    // List of image files with titles (excluding images used in service previews)
-    const imageData = [
-        { file: 'content_visit_cropped-Sundowner-9.jpg', title: 'Sundowner Experience' },
-        { file: 'content_visit_2016_04_04_staying-at-il-ngwesi_Pool-Jan-2016-8.jpg', title: 'Infinity Pool' },
-        { file: 'content_visit_2016_04_04_staying-at-il-ngwesi_Main-House-Night-9.jpg', title: 'Main House at Night' },
-        { file: 'content_visit_2016_04_04_staying-at-il-ngwesi_Camera-Kenya-2-336.jpg', title: 'Wildlife Photography' },
-        { file: 'content_visit_2016_04_04_staying-at-il-ngwesi_Manyatta-Hunting-8.jpg', title: 'Cultural Experience' },
-        { file: 'content_visit_2016_04_04_staying-at-il-ngwesi_Camera-Kenya-2-516.jpg', title: 'Conservancy Views' },
-        { file: 'content_visit_2016_04_04_staying-at-il-ngwesi_Beef-and-Wine-10.jpg', title: 'Dining Experience' },
-        { file: 'content_visit_Il-Ngwesi-Elephant.jpg', title: 'Elephant Encounter' },
-        { file: 'content_visit_Mukogodo-Escarpment.jpg', title: 'Mukogodo Escarpment' },
-        { file: 'content_visit_Dancing-at-the-Manyatta.jpg', title: 'Manyatta Dancing' },
-        { file: 'content_visit_Manyatta-Dancing-7b.jpg', title: 'Cultural Celebration' },
-        { file: 'content_visit_Pool-Air-9.jpg', title: 'Pool & Views' },
-        { file: 'content_visit_Il-Ngwesi-Board-Directors-.jpg', title: 'Community Leadership' }
-    ];
-
-    // Filter to get only full-size images (not thumbnails)
-    const fullSizeImages = imageData.filter(item => 
-        !item.file.includes('-300x') && 
-        !item.file.includes('-768x') && 
-        !item.file.includes('-1024x') &&
-        !item.file.includes('-200x') &&
-        !item.file.includes('-682x') &&
-        !item.file.includes('-683x') &&
-        !item.file.includes('-512x') &&
-        !item.file.includes('-1152x') &&
-        !item.file.includes('-1153x')
-    );
+    // Entries come from the gallery manifest API one page at a time, with intrinsic
+    // sizes and a placeholder colour so cells never shift as images arrive
+    const pageSize = 3; // Show first 3 images, fetch more on demand
+    const gallerySizes = '(max-width: 400px) 100vw, (max-width: 768px) 50vw, 33vw';
 
     // Create lightbox
     const lightbox = document.createElement('div');
@@ -390,7 +366,9 @@ function initializeGallery() {
 
     let currentImageIndex = 0;
     const images = [];
-    const initialDisplayCount = 3; // Show first 3 images
+    let totalImages = 0;
+    let nextPage = 1;
+    let loading = false;
     let allImagesVisible = false;
 
     // Create "See More" button
@@ -400,31 +378,47 @@ function initializeGallery() {
     seeMoreBtn.innerHTML = '<button class="btn btn-primary" id="gallerySeeMoreBtn">See More</button>';
     galleryGrid.parentElement.appendChild(seeMoreBtn);
 
-    fullSizeImages.forEach((item, index) => {
+    // Sentinel just below the grid: when it scrolls into view, fetch the next page
+    const sentinel = document.createElement('div');
+    sentinel.className = 'gallery-sentinel';
+    galleryGrid.after(sentinel);
+    const observer = 'IntersectionObserver' in window
+        ? new IntersectionObserver(entries => {
+            if (entries[0].isIntersecting && allImagesVisible) {
+                loadNextPage();
+            }
+        }, { rootMargin: '400px 0px' })
+        : null;
+
+    function addGalleryItem(item) {
+        const index = images.length;
         const galleryItem = document.createElement('div');
         galleryItem.className = 'gallery-item';
         galleryItem.dataset.index = index;
-        
-        // Hide items beyond initial count
-        if (index >= initialDisplayCount) {
-            galleryItem.style.display = 'none';
+        if (item.color) {
+            galleryItem.style.backgroundColor = item.color;
         }
-        
+
         const img = document.createElement('img');
-        img.src = `images/${item.file}`;
+        img.width = item.width;
+        img.height = item.height;
+        img.srcset = item.srcset.map(candidate => `${candidate.src} ${candidate.width}w`).join(', ');
+        img.sizes = gallerySizes;
+        img.src = item.srcset[0].src;
         img.alt = item.title;
         img.loading = 'lazy';
-        
+        img.decoding = 'async';
+
         const title = document.createElement('div');
         title.className = 'gallery-item-title';
         title.textContent = item.title;
-        
+
         galleryItem.appendChild(img);
         galleryItem.appendChild(title);
         galleryGrid.appendChild(galleryItem);
-        
+
         images.push({
-            src: `images/${item.file}`,
+            src: item.src,
             title: item.title
         });
 
@@ -433,31 +427,61 @@ function initializeGallery() {
             currentImageIndex = index;
             showLightbox();
         });
-    });
+    }
+
+    async function loadNextPage() {
+        if (loading || nextPage === null) return;
+        loading = true;
+        try {
+            const response = await fetch(`${API_BASE_URL}/gallery?page=${nextPage}&per_page=${pageSize}`);
+            if (!response.ok) throw new Error(`Gallery request failed: ${response.status}`);
+            const data = await response.json();
+            data.items.forEach(addGalleryItem);
+            totalImages = data.total;
+            nextPage = data.next_page;
+        } catch (error) {
+            console.error('Error loading gallery:', error);
+            nextPage = null;
+        } finally {
+            loading = false;
+        }
+
+        if (nextPage === null && observer) {
+            observer.disconnect();
+        }
+        if (totalImages <= pageSize) {
+            seeMoreBtn.style.display = 'none';
+        }
+    }
 
     // Handle "See More" button click
     const seeMoreButton = document.getElementById('gallerySeeMoreBtn');
     if (seeMoreButton) {
-        seeMoreButton.addEventListener('click', function() {
-            const hiddenItems = galleryGrid.querySelectorAll('.gallery-item[style*="display: none"]');
-            
+        seeMoreButton.addEventListener('click', async function() {
             if (!allImagesVisible) {
-                // Show all hidden items
-                hiddenItems.forEach(item => {
+                // Reveal anything already loaded, then keep loading as the user scrolls
+                galleryGrid.querySelectorAll('.gallery-item').forEach(item => {
                     item.style.display = '';
                 });
                 seeMoreButton.textContent = 'See Less';
                 allImagesVisible = true;
+                await loadNextPage();
+                if (observer && nextPage !== null) {
+                    observer.observe(sentinel);
+                }
             } else {
                 // Hide items beyond initial count
                 const allItems = galleryGrid.querySelectorAll('.gallery-item');
                 allItems.forEach((item, index) => {
-                    if (index >= initialDisplayCount) {
+                    if (index >= pageSize) {
                         item.style.display = 'none';
                     }
                 });
                 seeMoreButton.textContent = 'See More';
                 allImagesVisible = false;
+                if (observer) {
+                    observer.unobserve(sentinel);
+                }
                 
                 // Scroll to gallery section
                 const gallerySection = document.getElementById('gallery');
@@ -472,12 +496,14 @@ function initializeGallery() {
         });
     }
 
+    loadNextPage();
+
     function showLightbox() {
         const lightboxImg = lightbox.querySelector('img');
         const lightboxInfo = lightbox.querySelector('.gallery-lightbox-info');
         
         lightboxImg.src = images[currentImageIndex].src;
-        lightboxInfo.textContent = `${currentImageIndex + 1} / ${images.length} - ${images[currentImageIndex].title}`;
+        lightboxInfo.textContent = `${currentImageIndex + 1} / ${totalImages || images.length} - ${images[currentImageIndex].title}`;
         lightbox.classList.add('active');
         document.body.style.overflow = 'hidden';
     }
@@ -1054,3 +1080,13 @@ function initializeReviews() {
     }
 }
 
+// Offline support: register the service worker once the page has loaded so
+// precaching does not compete with first paint
+function initializeServiceWorker() {
+    if (!('serviceWorker' in navigator) || location.protocol === 'file:') return;
+    window.addEventListener('load', function() {
+        navigator.serviceWorker.register('/sw.js').catch(function(error) {
+            console.warn('Service worker registration failed:', error);
+        });
+    });
+}
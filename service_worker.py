@@ -0,0 +1,87 @@
+"""
+Service worker script
+Serves sw.js with its precache list and a version derived from the precached
+files, so any deployed change to one of them installs a fresh cache
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# Same-origin files cached at install time (pages work offline after one visit)
+PRECACHE_ASSETS = (
+    'index.html', 'marketplace.html', 'product.html', 'cart.html', 'checkout.html',
+    'gallery.html', 'community.html', 'dashboard.html', 'login.html',
+    'merchant-login.html', 'merchant-dashboard.html',
+    'styles.css', 'script.js', 'cart.js', 'sync.js',
+    'assets/fonts/FreightSansProBook-Regular.woff2',
+    'assets/fonts/FreightSansProMedium-Regular.woff2',
+    'assets/fonts/FreightSansProBold-Regular.woff2',
+    'assets/fonts/UtopiaStd-Regular.woff2',
+    'assets/fonts/UtopiaStd-Italic.woff2',
+    'assets/fonts/UtopiaStd-Bold.woff2',
+)
+
+VERSION_PLACEHOLDER = '__PRECACHE_VERSION__'
+ASSETS_PLACEHOLDER = '/* __PRECACHE_ASSETS__ */'
+
+
+class ServiceWorkerScript:
+    """Renders the service worker template, re-rendering only when an input changes"""
+
+    def __init__(self, root, template='sw.js', assets=PRECACHE_ASSETS):
+        """
+        Args:
+            root: Directory the site is served from
+            template: Service worker source, relative to root
+            assets: Paths precached by the worker, relative to root
+        """
+        self.root = root
+        self.template = template
+        self.assets = [a for a in assets if os.path.isfile(os.path.join(root, a))]
+        self._lock = threading.Lock()
+        self._signature = None
+        self._rendered = None
+
+    def render(self):
+        """
+        Current service worker source
+
+        Returns:
+            (script body as bytes, precache version string)
+        """
+        signature = self._signature_of([self.template, *self.assets])
+        with self._lock:
+            if signature != self._signature:
+                self._rendered = self._render(signature)
+                self._signature = signature
+            return self._rendered
+
+    def _signature_of(self, paths):
+        """(path, size, mtime) of every input - cheap to compute per request"""
+        signature = []
+        for path in paths:
+            try:
+                st = os.stat(os.path.join(self.root, path))
+                signature.append((path, st.st_size, st.st_mtime_ns))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def _render(self, signature):
+        digest = hashlib.sha256()
+        for path in self.assets:
+            try:
+                with open(os.path.join(self.root, path), 'rb') as f:
+                    digest.update(path.encode())
+                    digest.update(f.read())
+            except OSError:
+                continue
+        version = digest.hexdigest()[:12]
+
+        with open(os.path.join(self.root, self.template), encoding='utf-8') as f:
+            source = f.read()
+        asset_list = ', '.join(json.dumps(f'/{a}') for a in self.assets)
+        source = source.replace(VERSION_PLACEHOLDER, version).replace(ASSETS_PLACEHOLDER, asset_list)
+        return source.encode('utf-8'), version
@@ -0,0 +1,412 @@
+"""
+SMS gateway and outbox
+Outbound SMS are queued in the sms_outbox table with the caller's cursor and
+committed by the caller, in a short transaction of their own once the booking
+or payment that triggers them has committed (so the booking lock is never held
+for them). A background dispatcher flushes whatever has queued up in bulk
+provider calls over one persistent HTTP session.
+Delivery reports posted back by the provider update each message's status.
+
+Gateways (SMS_GATEWAY):
+    console        - print messages (default, as before)
+    http           - JSON batch API at SMS_GATEWAY_URL (sms_standin.py speaks it)
+    africastalking - Africa's Talking bulk messaging (AT_USERNAME, AT_API_KEY)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import requests
+
+# Messages handed to the provider per call
+DEFAULT_MAX_BATCH = 100
+# Seconds the dispatcher waits after a wake-up so concurrent bookings share a call
+DEFAULT_LINGER = 0.2
+# Provider calls per message before it is marked failed, and the base retry delay
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 5
+# Messages left 'sending' this long (worker died mid-call) are queued again
+SENDING_TIMEOUT = 300
+
+REQUEST_TIMEOUT = 30
+
+# Outbox statuses: queued -> sending -> sent -> delivered / undelivered, or failed
+DELIVERY_STATUSES = ('sent', 'delivered', 'undelivered', 'failed')
+
+
+def init_sms_outbox(cursor):
+    """Create the outbound SMS table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sms_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            provider_id TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sms_outbox_status
+        ON sms_outbox (status, next_attempt)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sms_outbox_provider_id
+        ON sms_outbox (provider_id)
+    ''')
+
+
+def queue_sms(cursor, recipient, message):
+    """
+    Queue an SMS (the caller commits, then wakes the dispatcher)
+
+    Returns:
+        Outbox id of the message
+    """
+    cursor.execute(
+        'INSERT INTO sms_outbox (recipient, message, updated_at) VALUES (?, ?, ?)',
+        (recipient, message, time.time())
+    )
+    return cursor.lastrowid
+
+
+def record_delivery(cursor, reports):
+    """
+    Apply delivery reports (the caller commits)
+
+    Args:
+        reports: (provider_id, status, error) tuples; status is one of DELIVERY_STATUSES
+
+    Returns:
+        Number of messages updated
+    """
+    updated = 0
+    for provider_id, status, error in reports:
+        if status not in DELIVERY_STATUSES:
+            continue
+        # A late 'sent' report must not undo a final status
+        cursor.execute('''
+            UPDATE sms_outbox
+            SET status = ?, error = COALESCE(?, error), updated_at = ?
+            WHERE provider_id = ?
+              AND NOT (? = 'sent' AND status IN ('delivered', 'undelivered'))
+        ''', (status, error, time.time(), provider_id, status))
+        updated += cursor.rowcount
+    return updated
+
+
+class SmsGateway(ABC):
+    """
+    Provider interface
+
+    send_bulk() hands a batch to the provider in as few calls as it allows and
+    returns a result per message; raising means the whole batch is retried.
+    """
+
+    max_batch = DEFAULT_MAX_BATCH
+
+    @abstractmethod
+    def send_bulk(self, messages):
+        """
+        Args:
+            messages: [{id, to, message}] outbox rows
+
+        Returns:
+            {id: {status ('sent' or 'failed'), provider_id, error}}
+        """
+
+    def parse_delivery_reports(self, payload):
+        """(provider_id, status, error) tuples from a delivery-report callback body"""
+        return []
+
+    def close(self):
+        pass
+
+
+class ConsoleGateway(SmsGateway):
+    """Prints messages instead of sending them (development default)"""
+
+    def send_bulk(self, messages):
+        results = {}
+        for message in messages:
+            print(f"[SMS TO {message['to']}]")
+            print(message['message'])
+            print("-" * 50)
+            results[message['id']] = {'status': 'sent', 'provider_id': f"console-{message['id']}", 'error': None}
+        return results
+
+
+class HttpBatchGateway(SmsGateway):
+    """
+    Generic JSON batch API
+
+    POST {url}/messages  {"messages": [{"id", "to", "message"}]}
+      -> {"messages": [{"id", "status": "accepted"|"rejected", "provider_id", "error"}]}
+    Delivery reports: {"reports": [{"provider_id", "status": "delivered"|"undelivered", "error"}]}
+    """
+
+    def __init__(self, url, api_key=None, timeout=REQUEST_TIMEOUT, max_batch=DEFAULT_MAX_BATCH):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.max_batch = max_batch
+        # One keep-alive session for every flush
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def send_bulk(self, messages):
+        response = self.session.post(
+            f'{self.url}/messages',
+            json={'messages': [{'id': str(m['id']), 'to': m['to'], 'message': m['message']} for m in messages]},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+        results = {}
+        for item in response.json().get('messages', []):
+            accepted = item.get('status') == 'accepted'
+            results[int(item['id'])] = {
+                'status': 'sent' if accepted else 'failed',
+                'provider_id': item.get('provider_id'),
+                'error': None if accepted else item.get('error') or item.get('status')
+            }
+        return results
+
+    def parse_delivery_reports(self, payload):
+        return [
+            (report.get('provider_id'), report.get('status'), report.get('error'))
+            for report in payload.get('reports', [])
+        ]
+
+    def close(self):
+        self.session.close()
+
+
+class AfricasTalkingGateway(SmsGateway):
+    """
+    Africa's Talking bulk messaging
+
+    Their API takes one text per call with any number of recipients, so a
+    batch is grouped by message text: alerts with identical text share a call.
+    """
+
+    SEND_URL = 'https://api.africastalking.com/version1/messaging'
+    SANDBOX_SEND_URL = 'https://api.sandbox.africastalking.com/version1/messaging'
+    # Recipient statusCodes meaning the message was accepted (Processed, Sent, Queued)
+    ACCEPTED_CODES = (100, 101, 102)
+    DELIVERY_STATUS = {
+        'Success': 'delivered',
+        'Failed': 'undelivered',
+        'Rejected': 'undelivered',
+        'Sent': 'sent',
+        'Submitted': 'sent',
+        'Buffered': 'sent',
+    }
+
+    def __init__(self, username, api_key, sender_id=None, timeout=REQUEST_TIMEOUT):
+        self.username = username
+        self.sender_id = sender_id
+        self.timeout = timeout
+        self.send_url = self.SANDBOX_SEND_URL if username == 'sandbox' else self.SEND_URL
+        self.session = requests.Session()
+        self.session.headers.update({'apiKey': api_key, 'Accept': 'application/json'})
+
+    def send_bulk(self, messages):
+        # Same text, distinct recipients per call
+        groups = []
+        for message in messages:
+            for group in groups:
+                if group['text'] == message['message'] and message['to'] not in group['ids']:
+                    group['ids'][message['to']] = message['id']
+                    break
+            else:
+                groups.append({'text': message['message'], 'ids': {message['to']: message['id']}})
+
+        results = {}
+        for group in groups:
+            payload = {
+                'username': self.username,
+                'to': ','.join(group['ids']),
+                'message': group['text'],
+                'bulkSMSMode': 1,
+                'enqueue': 1
+            }
+            if self.sender_id:
+                payload['from'] = self.sender_id
+            response = self.session.post(self.send_url, data=payload, timeout=self.timeout)
+            response.raise_for_status()
+
+            for recipient in response.json().get('SMSMessageData', {}).get('Recipients', []):
+                message_id = group['ids'].get(recipient.get('number'))
+                if message_id is None:
+                    continue
+                accepted = recipient.get('statusCode') in self.ACCEPTED_CODES
+                results[message_id] = {
+                    'status': 'sent' if accepted else 'failed',
+                    'provider_id': recipient.get('messageId'),
+                    'error': None if accepted else recipient.get('status')
+                }
+        return results
+
+    def parse_delivery_reports(self, payload):
+        status = self.DELIVERY_STATUS.get(payload.get('status'))
+        if not payload.get('id') or status is None:
+            return []
+        return [(payload['id'], status, payload.get('failureReason'))]
+
+    def close(self):
+        self.session.close()
+
+
+def gateway_from_env():
+    """Gateway selected by SMS_GATEWAY (console, http or africastalking)"""
+    kind = os.getenv('SMS_GATEWAY', 'console')
+    if kind == 'http':
+        return HttpBatchGateway(
+            os.getenv('SMS_GATEWAY_URL', 'http://127.0.0.1:8025'),
+            api_key=os.getenv('SMS_GATEWAY_API_KEY'),
+            max_batch=int(os.getenv('SMS_MAX_BATCH', DEFAULT_MAX_BATCH))
+        )
+    if kind == 'africastalking':
+        return AfricasTalkingGateway(
+            os.getenv('AT_USERNAME', 'sandbox'),
+            os.getenv('AT_API_KEY', ''),
+            sender_id=os.getenv('AT_SENDER_ID')
+        )
+    return ConsoleGateway()
+
+
+class SmsDispatcher:
+    """
+    Flushes the outbox through a gateway from a background thread
+
+    The thread starts on the first wake() in each process (so it also works
+    after a pre-forking server forks) and otherwise polls for retries.
+    """
+
+    def __init__(self, db_path, gateway, linger=DEFAULT_LINGER, max_attempts=MAX_ATTEMPTS,
+                 retry_delay=RETRY_DELAY):
+        """
+        Args:
+            db_path: SQLite database holding sms_outbox
+            gateway: SmsGateway used for sending
+            linger: Seconds to let messages accumulate after a wake-up
+            max_attempts: Provider calls per message before it is marked failed
+            retry_delay: Base of the exponential delay between attempts
+        """
+        self.db_path = db_path
+        self.gateway = gateway
+        self.linger = linger
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def wake(self):
+        """Signal that messages were queued, starting the worker if needed"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='sms-dispatcher', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            woken = self._wakeup.wait(timeout=self.retry_delay)
+            self._wakeup.clear()
+            if woken and self.linger:
+                time.sleep(self.linger)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[SMS] Dispatcher error: {e}")
+
+    def flush(self):
+        """
+        Send everything that is due, one provider call per batch
+
+        Returns:
+            (messages accepted by the provider, messages that failed for good)
+        """
+        sent = failed = 0
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            while True:
+                batch = self._claim(conn)
+                if not batch:
+                    break
+                batch_sent, batch_failed = self._send(conn, batch)
+                sent += batch_sent
+                failed += batch_failed
+        finally:
+            conn.close()
+        return sent, failed
+
+    def _claim(self, conn):
+        """Mark the next due batch 'sending' so no other worker picks it up"""
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('''
+                SELECT id, recipient, message, attempts FROM sms_outbox
+                WHERE (status = 'queued' AND next_attempt <= ?)
+                   OR (status = 'sending' AND updated_at < ?)
+                ORDER BY id LIMIT ?
+            ''', (now, now - SENDING_TIMEOUT, self.gateway.max_batch)).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE sms_outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [{'id': row[0], 'to': row[1], 'message': row[2], 'attempts': row[3] + 1} for row in rows]
+
+    def _send(self, conn, batch):
+        """Hand one batch to the gateway and record the outcome of every message"""
+        now = time.time()
+        try:
+            results = self.gateway.send_bulk(batch)
+            error = None
+        except Exception as e:
+            print(f"[SMS] Gateway call failed for {len(batch)} messages: {e}")
+            results = {}
+            error = str(e)
+
+        updates = []
+        sent = failed = 0
+        for message in batch:
+            result = results.get(message['id'])
+            if result and result['status'] == 'sent':
+                updates.append(('sent', result['provider_id'], None, 0, now, message['id']))
+                sent += 1
+            elif result:
+                # Rejected by the provider (bad number, blacklisted): retrying will not help
+                updates.append(('failed', result.get('provider_id'), result.get('error'), 0, now, message['id']))
+                failed += 1
+            elif message['attempts'] >= self.max_attempts:
+                updates.append(('failed', None, error or 'no result from gateway', 0, now, message['id']))
+                failed += 1
+            else:
+                retry_at = now + self.retry_delay * 2 ** (message['attempts'] - 1)
+                updates.append(('queued', None, error or 'no result from gateway', retry_at, now, message['id']))
+
+        conn.executemany('''
+            UPDATE sms_outbox
+            SET status = ?, provider_id = ?, error = ?, next_attempt = ?, updated_at = ?
+            WHERE id = ?
+        ''', updates)
+        conn.commit()
+        return sent, failed
@@ -0,0 +1,280 @@
+"""
+Steward SMS replies
+Parses the replies stewards send to VISITOR ALERT messages with a table-driven
+tokenizer (one compiled pattern built from the keyword tables below) and a
+small grammar, so every service code, YES/NO answers and several bookings in
+one message are understood. Codes listed together share the answers that
+follow them, so one reply can settle a whole digest of alerts. Replies are applied to the bookings table in the
+caller's transaction, so a batch of inbound messages commits at once.
+
+Grammar (case-insensitive, separators , ; . : and newlines are ignored):
+    message := clause+
+    clause  := [CONFIRM] CODE+ answer*
+    answer  := SERVICE ANSWER | ALL ANSWER
+
+    "CONFIRM V2269F506HBP WALK YES HOME NO"
+    "CONFIRM V2269F506HBP ALL YES CONFIRM V229EW00QKFS RHINO NO"
+    "CONFIRM V2269F506HBP V229EW00QKFS ALL YES"
+"""
+
+import json
+import re
+
+from booking_codes import CODE_PATTERN, LEGACY_CODE_PATTERN, normalize_code
+
+# Reply words per service code in communities.services_offered; the first
+# word is the one suggested in VISITOR ALERT messages
+SERVICE_KEYWORDS = {
+    'guided_walk': ('WALK', 'GUIDED_WALK', 'GUIDED-WALK', 'GW'),
+    'homestay': ('HOME', 'HOMESTAY', 'HS'),
+    'cultural_evening': ('CULTURE', 'CULTURAL_EVENING', 'CULTURAL-EVENING', 'CULTURAL', 'EVENING', 'CE'),
+    'bush_breakfast': ('BREAKFAST', 'BUSH_BREAKFAST', 'BUSH-BREAKFAST', 'BUSH', 'BB'),
+    'rhino_sanctuary': ('RHINO', 'RHINO_SANCTUARY', 'RHINO-SANCTUARY', 'SANCTUARY', 'RS'),
+    'beading_workshop': ('BEADING', 'BEADING_WORKSHOP', 'BEADING-WORKSHOP', 'BEADS', 'BEAD', 'BW'),
+}
+
+# Answers, including the Swahili words stewards commonly reply with
+ANSWER_KEYWORDS = {
+    True: ('YES', 'Y', 'OK', 'NDIO'),
+    False: ('NO', 'N', 'HAPANA'),
+}
+
+CONFIRM_KEYWORD = 'CONFIRM'
+ALL_KEYWORD = 'ALL'
+
+# Booking codes as typed (booking_codes.py), including pre-2026 codes
+# and codes grouped with hyphens
+BOOKING_CODE = rf'{LEGACY_CODE_PATTERN}|{CODE_PATTERN}'
+
+# Bookings still waiting for the steward's answer; replies to bookings that
+# expired, were cancelled or overbooked, or were already answered are refused
+REPLYABLE_STATUSES = ('pending',)
+
+# Upper bound on inbound messages handled per webhook call
+MAX_BATCH_SIZE = 100
+
+
+def _build_tokenizer():
+    """One alternation of named groups; longer keywords first so WALK never shadows GUIDED_WALK"""
+    def words(keywords):
+        ordered = sorted(keywords, key=len, reverse=True)
+        return '|'.join(re.escape(word) for word in ordered)
+
+    service_words = {word: service for service, keywords in SERVICE_KEYWORDS.items() for word in keywords}
+    answer_words = {word: answer for answer, keywords in ANSWER_KEYWORDS.items() for word in keywords}
+    pattern = re.compile(
+        rf'(?P<CODE>{BOOKING_CODE})(?![\w-])'
+        rf'|(?P<CONFIRM>{CONFIRM_KEYWORD})(?![\w-])'
+        rf'|(?P<ALL>{ALL_KEYWORD})(?![\w-])'
+        rf'|(?P<SERVICE>{words(service_words)})(?![\w-])'
+        rf'|(?P<ANSWER>{words(answer_words)})(?![\w-])'
+        r'|(?P<SKIP>[\s,;.:]+)'
+        r'|(?P<UNKNOWN>[^\s,;.:]+)'
+    )
+    return pattern, service_words, answer_words
+
+
+TOKEN_PATTERN, SERVICE_WORDS, ANSWER_WORDS = _build_tokenizer()
+
+
+def tokenize(message):
+    """
+    Split a reply into (kind, value) tokens
+
+    Kinds are CODE (value is the normalized code), BADCODE (a code whose
+    check character is wrong), CONFIRM, ALL, SERVICE (value is the service
+    code), ANSWER (value is True/False) and UNKNOWN; separators are dropped.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(message.upper()):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == 'SKIP':
+            continue
+        if kind == 'CODE':
+            code = normalize_code(text)
+            tokens.append(('CODE', code) if code else ('BADCODE', text))
+        elif kind == 'SERVICE':
+            tokens.append((kind, SERVICE_WORDS[text]))
+        elif kind == 'ANSWER':
+            tokens.append((kind, ANSWER_WORDS[text]))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+def reply_template(booking_code, services):
+    """Reply line for a VISITOR ALERT: CONFIRM <code> WALK YES/NO HOME YES/NO ..."""
+    words = [f"{SERVICE_KEYWORDS[s][0]} YES/NO" for s in services if s in SERVICE_KEYWORDS]
+    return ' '.join([CONFIRM_KEYWORD, booking_code] + words)
+
+
+def parse_reply(message):
+    """
+    Parse a steward reply
+
+    Args:
+        message: SMS text
+
+    Returns:
+        dict with bookings [{booking_code, answers {service: bool}, all (bool or None)}]
+        in message order, and errors (list of strings) for the parts that
+        were not understood
+    """
+    bookings = []
+    errors = []
+    tokens = tokenize(message)
+    # Answers are shared by every code of the current clause
+    current = None
+    answered = False
+    index = 0
+    while index < len(tokens):
+        kind, value = tokens[index]
+        index += 1
+
+        if kind == 'CONFIRM':
+            if index >= len(tokens) or tokens[index][0] not in ('CODE', 'BADCODE'):
+                errors.append(f'{CONFIRM_KEYWORD} must be followed by a booking code')
+            current = None
+            continue
+        if kind == 'CODE':
+            if current is None or answered:
+                current = {'answers': {}, 'all': None}
+                answered = False
+            bookings.append({'booking_code': value, 'clause': current})
+            continue
+        if kind in ('SERVICE', 'ALL'):
+            label = value if kind == 'SERVICE' else ALL_KEYWORD
+            if current is None:
+                errors.append(f'{label} given before a booking code')
+                continue
+            if index >= len(tokens) or tokens[index][0] != 'ANSWER':
+                errors.append(f'{label} needs YES or NO')
+                continue
+            answer = tokens[index][1]
+            index += 1
+            answered = True
+            if kind == 'ALL':
+                current['all'] = answer
+            else:
+                current['answers'][value] = answer
+            continue
+        if kind == 'ANSWER':
+            errors.append('YES/NO given without a service')
+            continue
+        if kind == 'BADCODE':
+            errors.append(f'Booking code mistyped: {value}')
+            # Answers that follow belong to the bad code: collect and drop them
+            current = {'answers': {}, 'all': None}
+            answered = False
+            continue
+        errors.append(f'Unrecognised word: {value}')
+
+    return {
+        'bookings': [
+            {'booking_code': booking['booking_code'],
+             'answers': dict(booking['clause']['answers']),
+             'all': booking['clause']['all']}
+            for booking in bookings
+        ],
+        'errors': errors
+    }
+
+
+def resolve_services(reply, requested):
+    """
+    Services confirmed by one booking clause
+
+    ALL applies to every requested service and individual answers override
+    it; a bare CONFIRM <code> confirms everything requested. Answers for
+    services the visitor did not request are ignored.
+
+    Returns:
+        (confirmed services in requested order, declined services)
+    """
+    default = reply['all']
+    if default is None and not reply['answers']:
+        default = True
+
+    confirmed, declined = [], []
+    for service in requested:
+        answer = reply['answers'].get(service, default)
+        if answer is True:
+            confirmed.append(service)
+        elif answer is False:
+            declined.append(service)
+    return confirmed, declined
+
+
+def apply_replies(cursor, messages):
+    """
+    Apply a batch of steward replies to their bookings
+
+    Bookings are looked up in one query and updated with one executemany, in
+    the caller's transaction. A booking with at least one confirmed service
+    becomes 'confirmed'; one whose services were all declined becomes
+    'declined'. Only bookings in REPLYABLE_STATUSES are changed, and a
+    booking that has been paid for cannot be declined by SMS.
+
+    Args:
+        cursor: sqlite3 cursor (the caller commits)
+        messages: [{from, message}] inbound SMS
+
+    Returns:
+        One dict per message: from, bookings [{booking_code, status,
+        confirmed_services, declined_services}] and errors
+    """
+    parsed = [parse_reply(str(message.get('message') or '')) for message in messages]
+
+    codes = sorted({reply['booking_code'] for result in parsed for reply in result['bookings']})
+    requested = {}
+    if codes:
+        cursor.execute(
+            f"SELECT booking_code, requested_services, status, payment_status FROM bookings "
+            f"WHERE booking_code IN ({','.join('?' * len(codes))})",
+            codes
+        )
+        bookings = {row[0]: row[1:] for row in cursor.fetchall()}
+        requested = {code: json.loads(row[0]) for code, row in bookings.items()}
+
+    updates = {}
+    results = []
+    for message, result in zip(messages, parsed):
+        outcome = {'from': message.get('from'), 'bookings': [], 'errors': list(result['errors'])}
+        for reply in result['bookings']:
+            code = reply['booking_code']
+            if code not in requested:
+                outcome['errors'].append(f'Unknown booking code: {code}')
+                continue
+            current, payment_status = bookings[code][1:]
+            if current not in REPLYABLE_STATUSES:
+                outcome['errors'].append(f'Booking {code} is {current}; reply not applied')
+                continue
+            confirmed, declined = resolve_services(reply, requested[code])
+            if not confirmed and not declined:
+                outcome['errors'].append(f'No requested service answered for {code}')
+                continue
+            status = 'confirmed' if confirmed else 'declined'
+            if status == 'declined' and payment_status == 'paid':
+                outcome['errors'].append(f'Booking {code} is paid; contact the office to cancel it')
+                continue
+            # A later reply in the batch for the same booking wins
+            updates[code] = (status, json.dumps(confirmed), code, *REPLYABLE_STATUSES, status)
+            outcome['bookings'].append({
+                'booking_code': code,
+                'status': status,
+                'confirmed_services': confirmed,
+                'declined_services': declined
+            })
+        results.append(outcome)
+
+    if updates:
+        cursor.executemany(f'''
+            UPDATE bookings
+            SET status = ?,
+                confirmed_services = ?
+            WHERE booking_code = ?
+              AND status IN ({','.join('?' * len(REPLYABLE_STATUSES))})
+              AND (? = 'confirmed' OR payment_status != 'paid')
+        ''', list(updates.values()))
+    return results
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Local stand-in SMS gateway
+Speaks the JSON batch API of sms_gateway.HttpBatchGateway so the outbox and
+dispatcher can be exercised without a provider account: configurable latency
+per call, rejected messages, failing calls (503) and delivery reports posted
+back to the app.
+
+Usage:
+    python sms_standin.py                          # serve on 127.0.0.1:8025
+    python sms_standin.py --dlr-url http://localhost:5000/api/sms/delivery
+    python sms_standin.py --bench 1000             # throughput: one call per message vs bulk
+
+Point the app at it with SMS_GATEWAY=http SMS_GATEWAY_URL=http://127.0.0.1:8025
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from sms_gateway import HttpBatchGateway, SmsDispatcher, init_sms_outbox, queue_sms
+
+
+class StandInGateway(ThreadingHTTPServer):
+    """HTTP server holding the stand-in's settings and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.05, reject_rate=0.0, error_rate=0.0,
+                 undelivered_rate=0.0, dlr_url=None, dlr_delay=0.5, quiet=False):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.error_rate = error_rate
+        self.undelivered_rate = undelivered_rate
+        self.dlr_url = dlr_url
+        self.dlr_delay = dlr_delay
+        self.quiet = quiet
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'messages': 0, 'rejected': 0, 'errors': 0, 'connections': 0}
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def send_reports(self, reports):
+        """Post delivery reports back to the app after dlr_delay"""
+        def post():
+            time.sleep(self.dlr_delay)
+            try:
+                requests.post(self.dlr_url, json={'reports': reports}, timeout=10)
+            except requests.RequestException as e:
+                print(f"[STAND-IN] Could not post delivery reports: {e}")
+        threading.Thread(target=post, daemon=True).start()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a client session reuses its connection
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.count(connections=1)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.path.rstrip('/') != '/messages':
+            return self._reply(404, {'error': 'not found'})
+
+        server = self.server
+        time.sleep(server.latency)
+        if random.random() < server.error_rate:
+            server.count(calls=1, errors=1)
+            return self._reply(503, {'error': 'gateway busy'})
+
+        try:
+            messages = json.loads(body)['messages']
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {'error': 'expected {"messages": [...]}'})
+
+        results, reports = [], []
+        for message in messages:
+            if random.random() < server.reject_rate or not str(message.get('to', '')).startswith('+'):
+                results.append({'id': message.get('id'), 'status': 'rejected', 'error': 'invalid recipient'})
+                continue
+            provider_id = f'SI-{uuid.uuid4().hex[:12]}'
+            results.append({'id': message.get('id'), 'status': 'accepted', 'provider_id': provider_id})
+            delivered = random.random() >= server.undelivered_rate
+            reports.append({
+                'provider_id': provider_id,
+                'status': 'delivered' if delivered else 'undelivered',
+                'error': None if delivered else 'handset unreachable'
+            })
+
+        server.count(calls=1, messages=len(messages), rejected=len(messages) - len(reports))
+        if server.dlr_url and reports:
+            server.send_reports(reports)
+        self._reply(200, {'messages': results})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host='127.0.0.1', port=0, **options):
+    """Start a stand-in gateway on a background thread; returns the server"""
+    server = StandInGateway((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark(count, batch_sizes=(1, 100), **options):
+    """Queue `count` alerts and time how long the dispatcher takes to flush them"""
+    server = serve(quiet=True, **options)
+    url = f'http://{server.server_address[0]}:{server.server_address[1]}'
+    print(f"Stand-in gateway at {url}: {options.get('latency', 0.05) * 1000:.0f} ms per call, "
+          f"{options.get('reject_rate', 0):.0%} rejected, {options.get('error_rate', 0):.0%} failing calls\n")
+    print(f"{'batch size':>10} {'calls':>7} {'conns':>6} {'sent':>6} {'failed':>7} {'seconds':>8} {'msg/s':>8}")
+
+    for batch_size in batch_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            init_sms_outbox(cursor)
+            for n in range(count):
+                queue_sms(cursor, f'+2547{n:08d}', f'VISITOR ALERT {n}: 2 people, guided walk')
+            conn.commit()
+            conn.close()
+
+            for key in server.stats:
+                server.stats[key] = 0
+            gateway = HttpBatchGateway(url, max_batch=batch_size)
+            dispatcher = SmsDispatcher(db_path, gateway, retry_delay=0)
+            start = time.perf_counter()
+            sent = failed = 0
+            # Failed calls are retried until every message has a final status
+            while sent + failed < count:
+                batch_sent, batch_failed = dispatcher.flush()
+                sent += batch_sent
+                failed += batch_failed
+            elapsed = time.perf_counter() - start
+            gateway.close()
+
+            print(f"{batch_size:>10} {server.stats['calls']:>7} {server.stats['connections']:>6} "
+                  f"{sent:>6} {failed:>7} {elapsed:>8.2f} {count / elapsed:>8.0f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in SMS gateway')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per provider call')
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='Share of messages rejected')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls answered with 503')
+    parser.add_argument('--undelivered-rate', type=float, default=0.0, help='Share of delivery reports that fail')
+    parser.add_argument('--dlr-url', help='Where to post delivery reports (the app\'s /api/sms/delivery)')
+    parser.add_argument('--dlr-delay', type=float, default=0.5, help='Seconds before a delivery report')
+    parser.add_argument('--bench', type=int, metavar='N', help='Benchmark flushing N messages and exit')
+    args = parser.parse_args()
+
+    options = {
+        'latency': args.latency,
+        'reject_rate': args.reject_rate,
+        'error_rate': args.error_rate,
+        'undelivered_rate': args.undelivered_rate
+    }
+    if args.bench:
+        benchmark(args.bench, **options)
+    else:
+        server = StandInGateway((args.host, args.port), dlr_url=args.dlr_url,
+                                dlr_delay=args.dlr_delay, **options)
+        print(f"Stand-in SMS gateway on http://{args.host}:{args.port}/messages")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
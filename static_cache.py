@@ -0,0 +1,233 @@
+"""
+Static file serving engine for the Bridge Server
+Keeps small, hot files in a size-bounded in-memory LRU and streams large files
+through the WSGI server's file wrapper (sendfile where the server supports it)
+"""
+
+import gzip
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+# Files at or below this size are held in memory
+DEFAULT_MAX_FILE_SIZE = 256 * 1024
+
+# Total memory budget for the hot-file cache
+DEFAULT_MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+# Content types worth storing gzip-encoded alongside the identity body
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json',
+    'image/svg+xml', 'application/xml'
+)
+
+
+class CachedFile:
+    """A pre-encoded static file held in memory"""
+
+    __slots__ = ('mtime_ns', 'size', 'etag', 'body', 'gzip_body', 'headers')
+
+    def __init__(self, mtime_ns, size, etag, body, gzip_body, headers):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = etag
+        self.body = body
+        self.gzip_body = gzip_body
+        self.headers = headers
+
+    @property
+    def gzip_etag(self):
+        """Tag of the gzip variant; each encoding needs its own for caches to tell them apart"""
+        return self.etag[:-1] + '-gz"'
+
+    @property
+    def cost(self):
+        """Bytes this entry charges against the cache budget"""
+        return len(self.body) + (len(self.gzip_body) if self.gzip_body else 0)
+
+
+class StaticFileCache:
+    """Serves files from a directory with an mtime-validated LRU in front"""
+
+    def __init__(self, root, max_file_size=DEFAULT_MAX_FILE_SIZE,
+                 max_cache_bytes=DEFAULT_MAX_CACHE_BYTES, max_age=0):
+        """
+        Args:
+            root: Directory files are served from
+            max_file_size: Largest file (bytes) kept in memory
+            max_cache_bytes: Total memory budget for cached entries
+            max_age: Cache-Control max-age sent to browsers (seconds)
+        """
+        self.root = os.path.abspath(root)
+        self.max_file_size = max_file_size
+        self.max_cache_bytes = max_cache_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def serve(self, path):
+        """Return a response for `path`, relative to the served root"""
+        filepath = safe_join(self.root, path)
+        if filepath is None:
+            abort(404)
+
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            abort(404)
+
+        if not os.path.isfile(filepath):
+            abort(404)
+
+        if st.st_size > self.max_file_size:
+            return self._send_large(filepath)
+
+        entry = self._lookup(filepath, st)
+        if entry is None:
+            entry = self._load(filepath, st)
+            if entry is None:
+                abort(404)
+
+        return self._respond(entry)
+
+    def stats(self):
+        """Cache occupancy and hit counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_cache_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _lookup(self, filepath, st):
+        """Return the cached entry if it still matches the file on disk"""
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.mtime_ns != st.st_mtime_ns or entry.size != st.st_size:
+                # File changed on disk - invalidate
+                del self._entries[filepath]
+                self.current_bytes -= entry.cost
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(filepath)
+            self.hits += 1
+            return entry
+
+    def _load(self, filepath, st):
+        """Read a small file and store it pre-encoded with its headers"""
+        try:
+            with open(filepath, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+
+        mimetype = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+        content_type = mimetype
+        if mimetype.startswith('text/') or mimetype == 'application/javascript':
+            content_type = f'{mimetype}; charset=utf-8'
+
+        gzip_body = None
+        if mimetype.startswith(COMPRESSIBLE_TYPES) and len(body) > 1024:
+            compressed = gzip.compress(body, compresslevel=6, mtime=0)
+            if len(compressed) < len(body):
+                gzip_body = compressed
+
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        headers = {
+            'Content-Type': content_type,
+            'ETag': etag,
+            'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+            'Cache-Control': f'public, max-age={self.max_age}' if self.max_age else 'no-cache'
+        }
+        if gzip_body is not None:
+            headers['Vary'] = 'Accept-Encoding'
+
+        entry = CachedFile(st.st_mtime_ns, st.st_size, etag, body, gzip_body, headers)
+
+        with self._lock:
+            previous = self._entries.pop(filepath, None)
+            if previous is not None:
+                self.current_bytes -= previous.cost
+
+            if entry.cost <= self.max_cache_bytes:
+                self._entries[filepath] = entry
+                self.current_bytes += entry.cost
+
+                # Evict least recently used entries until within budget
+                while self.current_bytes > self.max_cache_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted.cost
+
+        return entry
+
+    def _respond(self, entry):
+        """Build a response from a cached entry, honouring conditional GETs"""
+        # Honours q-values: "gzip;q=0" refuses gzip
+        use_gzip = entry.gzip_body is not None and request.accept_encodings['gzip']
+        etag = entry.gzip_etag if use_gzip else entry.etag
+
+        if self._not_modified(entry, etag):
+            response = Response(status=304)
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = entry.headers['Cache-Control']
+            if 'Vary' in entry.headers:
+                response.headers['Vary'] = entry.headers['Vary']
+            return response
+
+        body = entry.body
+        headers = dict(entry.headers)
+        if use_gzip:
+            body = entry.gzip_body
+            headers['Content-Encoding'] = 'gzip'
+            headers['ETag'] = etag
+
+        # HEAD gets the same headers; Werkzeug leaves the body out
+        headers['Content-Length'] = str(len(body))
+
+        return Response(body, status=200, headers=headers, direct_passthrough=True)
+
+    def _not_modified(self, entry, etag):
+        """True when the request's validators match the variant being served (tag etag)"""
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return etag in tags or '*' in tags
+
+        if_modified_since = request.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.mtime_ns // 1_000_000_000) <= since
+
+        return False
+
+    def _send_large(self, filepath):
+        """
+        Stream a large file without reading it into memory
+        send_file hands the open file to wsgi.file_wrapper, which production
+        servers (gunicorn, uWSGI) turn into a sendfile() call
+        """
+        return send_file(filepath, conditional=True, max_age=self.max_age or None)
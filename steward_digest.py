@@ -0,0 +1,196 @@
+"""
+Steward alert digests
+New bookings no longer text the steward one by one: each alert waits in
+steward_alerts and a scheduler sends every steward one compact digest per
+window (STEWARD_DIGEST_WINDOW seconds after their oldest waiting alert).
+Same-day arrivals are urgent and go out at once, taking any waiting alerts
+for that steward with them. Digests are queued in the SMS outbox, so they
+share its bulk sending and delivery tracking.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from sms_gateway import queue_sms
+from sms_replies import CONFIRM_KEYWORD, SERVICE_KEYWORDS
+
+# Seconds an alert may wait for others to the same steward (0 sends each at once)
+DEFAULT_DIGEST_WINDOW = int(os.getenv('STEWARD_DIGEST_WINDOW', 15 * 60))
+# Arrivals this many days ahead or sooner are sent immediately (0: same day)
+DEFAULT_URGENT_DAYS = int(os.getenv('STEWARD_URGENT_DAYS', 0))
+# Alerts per digest SMS; more waiting alerts go out in further messages
+MAX_ALERTS_PER_DIGEST = 6
+
+
+def init_steward_alerts(cursor):
+    """Create the table of alerts waiting for a digest"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS steward_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            booking_code TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            message TEXT NOT NULL,
+            urgent INTEGER NOT NULL DEFAULT 0,
+            due_at REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            sms_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_steward_alerts_pending
+        ON steward_alerts (status, recipient, due_at)
+    ''')
+
+
+def is_urgent(arrival_date, urgent_days=DEFAULT_URGENT_DAYS, today=None):
+    """True if the arrival (YYYY-MM-DD) is within urgent_days of today, or unparseable"""
+    try:
+        arrival = date.fromisoformat(str(arrival_date)[:10])
+    except ValueError:
+        return True
+    return (arrival - (today or date.today())).days <= urgent_days
+
+
+def alert_summary(booking_code, arrival_date, num_visitors, services, contact):
+    """One digest line: code, date, party size, reply words of the services, contact"""
+    words = ' '.join(SERVICE_KEYWORDS[s][0] for s in services if s in SERVICE_KEYWORDS)
+    people = f"{num_visitors} {'person' if num_visitors == 1 else 'people'}"
+    return f"{booking_code} {arrival_date} {people}: {words}. Tel {contact}"
+
+
+def queue_alert(cursor, recipient, booking_code, summary, message, urgent,
+                window=DEFAULT_DIGEST_WINDOW):
+    """
+    Hold a booking alert for the steward's next digest (the caller commits,
+    then wakes the scheduler)
+
+    Args:
+        recipient: Steward phone number
+        summary: Digest line for the booking (alert_summary())
+        message: Full VISITOR ALERT, sent as-is when it goes out alone
+        urgent: Send now instead of waiting for the window
+    """
+    due_at = time.time() + (0 if urgent else window)
+    cursor.execute('''
+        INSERT INTO steward_alerts (recipient, booking_code, summary, message, urgent, due_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (recipient, booking_code, summary, message, 1 if urgent else 0, due_at))
+    return cursor.lastrowid
+
+
+def compose_digest(alerts):
+    """
+    SMS text for a steward's waiting alerts
+
+    Args:
+        alerts: (booking_code, summary, message, urgent) rows, oldest first
+
+    Returns:
+        The full alert when there is only one, else a numbered digest
+    """
+    if len(alerts) == 1:
+        return alerts[0][2]
+
+    lines = [f"{len(alerts)} VISITOR ALERTS"]
+    for number, (_, summary, _, urgent) in enumerate(alerts, 1):
+        lines.append(f"{number}) {'URGENT ' if urgent else ''}{summary}")
+    lines.append(f"Reply: {CONFIRM_KEYWORD} <code> <code> ALL YES, or per code e.g. "
+                 f"{CONFIRM_KEYWORD} <code> WALK YES HOME NO")
+    return '\n'.join(lines)
+
+
+class DigestScheduler:
+    """
+    Background thread that turns due alerts into digest SMS
+
+    Like SmsDispatcher, it starts on the first wake() in each process and
+    sleeps until the earliest pending alert is due.
+    """
+
+    def __init__(self, db_path, dispatcher, max_alerts=MAX_ALERTS_PER_DIGEST):
+        """
+        Args:
+            db_path: SQLite database holding steward_alerts and sms_outbox
+            dispatcher: SmsDispatcher woken after digests are queued
+            max_alerts: Alerts per digest message
+        """
+        self.db_path = db_path
+        self.dispatcher = dispatcher
+        self.max_alerts = max_alerts
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def wake(self):
+        """Signal that an alert was queued, starting the worker if needed"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='steward-digest', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                sent, next_due = self.flush_due()
+            except Exception as e:
+                print(f"[DIGEST] Scheduler error: {e}")
+                sent, next_due = 0, None
+            if sent:
+                self.dispatcher.wake()
+            timeout = 60 if next_due is None else min(60, max(0.0, next_due - time.time()))
+            self._wakeup.wait(timeout=timeout)
+            self._wakeup.clear()
+
+    def flush_due(self, now=None):
+        """
+        Queue a digest for every steward whose oldest waiting alert is due
+
+        Returns:
+            (digest messages queued, due time of the next waiting alert or None)
+        """
+        now = now or time.time()
+        queued = 0
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            recipients = [row[0] for row in conn.execute('''
+                SELECT recipient FROM steward_alerts
+                WHERE status = 'pending'
+                GROUP BY recipient
+                HAVING MIN(due_at) <= ?
+            ''', (now,))]
+
+            cursor = conn.cursor()
+            for recipient in recipients:
+                alerts = conn.execute('''
+                    SELECT id, booking_code, summary, message, urgent FROM steward_alerts
+                    WHERE status = 'pending' AND recipient = ?
+                    ORDER BY urgent DESC, id
+                ''', (recipient,)).fetchall()
+                for start in range(0, len(alerts), self.max_alerts):
+                    chunk = alerts[start:start + self.max_alerts]
+                    sms_id = queue_sms(cursor, recipient, compose_digest([row[1:] for row in chunk]))
+                    cursor.executemany(
+                        "UPDATE steward_alerts SET status = 'sent', sms_id = ? WHERE id = ?",
+                        [(sms_id, row[0]) for row in chunk]
+                    )
+                    queued += 1
+
+            next_due = conn.execute(
+                "SELECT MIN(due_at) FROM steward_alerts WHERE status = 'pending'"
+            ).fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return queued, next_due
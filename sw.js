@@ -0,0 +1,99 @@
+// Service worker: offline pages and cached images for low-connectivity visits.
+// Served by app.py (/sw.js), which fills in the precache list and a version
+// hash of the precached files; a new version replaces the old cache.
+const PRECACHE_VERSION = '__PRECACHE_VERSION__';
+const PRECACHE_ASSETS = [/* __PRECACHE_ASSETS__ */];
+
+const PRECACHE = `precache-${PRECACHE_VERSION}`;
+const IMAGE_CACHE = 'images-v1';
+const MAX_CACHED_IMAGES = 150;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(PRECACHE)
+            .then(cache => cache.addAll(PRECACHE_ASSETS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    // Drop precaches from earlier versions
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(
+                keys
+                    .filter(key => key.startsWith('precache-') && key !== PRECACHE)
+                    .map(key => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Keep the image cache bounded by evicting the oldest entries
+async function trimImageCache() {
+    const cache = await caches.open(IMAGE_CACHE);
+    const keys = await cache.keys();
+    for (let i = 0; i < keys.length - MAX_CACHED_IMAGES; i++) {
+        await cache.delete(keys[i]);
+    }
+}
+
+// Serve cached images immediately and refresh them in the background
+async function staleWhileRevalidate(event) {
+    const cache = await caches.open(IMAGE_CACHE);
+    const cached = await cache.match(event.request);
+
+    const refresh = fetch(event.request)
+        .then(response => {
+            if (response.ok) {
+                cache.put(event.request, response.clone()).then(trimImageCache);
+            }
+            return response;
+        })
+        .catch(() => cached);
+
+    if (cached) {
+        event.waitUntil(refresh);
+        return cached;
+    }
+    return refresh;
+}
+
+// Pages and assets: precached copy first, network for anything else
+async function precacheFirst(event) {
+    const cached = await caches.match(event.request, { cacheName: PRECACHE, ignoreSearch: true });
+    if (cached) return cached;
+
+    try {
+        return await fetch(event.request);
+    } catch (error) {
+        if (event.request.mode === 'navigate') {
+            const fallback = await caches.match('/index.html', { cacheName: PRECACHE });
+            if (fallback) return fallback;
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    // API calls (including delta sync) always go to the network
+    if (url.origin !== self.location.origin || url.pathname.startsWith('/api/')) return;
+
+    if (request.destination === 'image' || /\.(jpe?g|png|gif|webp|svg)$/i.test(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event));
+        return;
+    }
+
+    if (url.pathname === '/') {
+        event.respondWith(caches.match('/index.html', { cacheName: PRECACHE }).then(
+            cached => cached || fetch(request)
+        ));
+        return;
+    }
+
+    event.respondWith(precacheFirst(event));
+});
@@ -0,0 +1,116 @@
+// Delta Sync - keeps a local copy of bookings, orders and payments and asks
+// the server only for what changed since the last sync. The data is private:
+// pass the community dashboard's sign-in token.
+class DeltaSync {
+    constructor(apiBaseUrl, storageKey = 'deltaSyncState', token = null) {
+        this.apiBaseUrl = apiBaseUrl;
+        this.storageKey = storageKey;
+        this.token = token;
+        this.state = this.loadState();
+        this.listeners = [];
+        this.unauthorizedListeners = [];
+        this.syncing = null;
+    }
+
+    loadState() {
+        const empty = { cursor: 0, lastSynced: null, bookings: {}, orders: {}, payments: {} };
+        try {
+            const saved = JSON.parse(localStorage.getItem(this.storageKey) || 'null');
+            return saved ? Object.assign(empty, saved) : empty;
+        } catch (error) {
+            return empty;
+        }
+    }
+
+    saveState() {
+        try {
+            localStorage.setItem(this.storageKey, JSON.stringify(this.state));
+        } catch (error) {
+            console.warn('Could not persist sync state:', error);
+        }
+    }
+
+    // Register a callback run with the local data after every sync (and once now)
+    onChange(listener) {
+        this.listeners.push(listener);
+        listener(this.snapshot());
+    }
+
+    // Register a callback run when the server rejects the sign-in token
+    onUnauthorized(listener) {
+        this.unauthorizedListeners.push(listener);
+    }
+
+    snapshot() {
+        return {
+            bookings: Object.values(this.state.bookings),
+            orders: Object.values(this.state.orders),
+            payments: Object.values(this.state.payments),
+            lastSynced: this.state.lastSynced,
+            online: navigator.onLine
+        };
+    }
+
+    applyChanges(data) {
+        const keys = { bookings: 'booking_code', orders: 'order_code', payments: 'id' };
+        Object.entries(keys).forEach(([entity, key]) => {
+            (data[entity] || []).forEach(row => {
+                this.state[entity][row[key]] = row;
+            });
+            ((data.deleted && data.deleted[entity]) || []).forEach(removed => {
+                delete this.state[entity][removed];
+            });
+        });
+        this.state.cursor = data.cursor;
+    }
+
+    // Pull changes until caught up; concurrent calls share one request chain
+    sync() {
+        if (this.syncing) return this.syncing;
+
+        this.syncing = (async () => {
+            try {
+                let hasMore = true;
+                while (hasMore) {
+                    const response = await fetch(`${this.apiBaseUrl}/sync?since=${this.state.cursor}`, {
+                        headers: this.token ? { 'Authorization': `Bearer ${this.token}` } : {}
+                    });
+                    if (response.status === 401) {
+                        this.unauthorizedListeners.forEach(listener => listener());
+                        throw new Error('Sign in required');
+                    }
+                    if (!response.ok) throw new Error(`Sync failed: ${response.status}`);
+                    const data = await response.json();
+                    this.applyChanges(data);
+                    hasMore = data.has_more;
+                }
+                this.state.lastSynced = new Date().toISOString();
+                this.saveState();
+            } catch (error) {
+                console.warn('Delta sync unavailable, showing local data:', error);
+            } finally {
+                this.syncing = null;
+            }
+            const snapshot = this.snapshot();
+            this.listeners.forEach(listener => listener(snapshot));
+            return snapshot;
+        })();
+        return this.syncing;
+    }
+
+    // Sync now, when the connection returns, and on an interval while visible
+    start(intervalMs = 60000) {
+        this.sync();
+        window.addEventListener('online', () => this.sync());
+        setInterval(() => {
+            if (document.visibilityState === 'visible' && navigator.onLine) {
+                this.sync();
+            }
+        }, intervalMs);
+    }
+}
+
+// Export for use in other scripts
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = DeltaSync;
+}
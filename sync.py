@@ -0,0 +1,129 @@
+"""
+Delta sync
+Every insert, update or delete of a booking, marketplace order or payment is
+appended to a change log by triggers. Clients hold the sequence number of the
+last change they saw and ask only for what changed after it.
+"""
+
+# Synced entities: table, key column and the columns sent to clients
+SYNC_ENTITIES = {
+    'bookings': {
+        'table': 'bookings',
+        'key': 'booking_code',
+        'columns': (
+            'booking_code', 'tourist_name', 'arrival_date', 'num_visitors',
+            'requested_services', 'confirmed_services', 'status', 'payment_status',
+            'amount_paid', 'total_amount', 'created_at'
+        )
+    },
+    'orders': {
+        'table': 'orders',
+        'key': 'order_code',
+        'columns': (
+            'order_code', 'customer_name', 'payment_method', 'subtotal',
+            'shipping', 'total_amount', 'status', 'created_at'
+        )
+    },
+    'payments': {
+        'table': 'transactions',
+        'key': 'id',
+        'columns': ('id', 'booking_code', 'mpesa_code', 'amount', 'status', 'timestamp')
+    }
+}
+
+MAX_SYNC_CHANGES = 500
+
+
+def init_sync(cursor):
+    """
+    Create the change log and the triggers that feed it
+    Each entity keeps only its latest log row, so the log stays as small as
+    the data it describes.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_key TEXT NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_change_log_entity ON change_log (entity, entity_key)
+    ''')
+
+    for entity, spec in SYNC_ENTITIES.items():
+        table, key = spec['table'], spec['key']
+        for event, row, deleted in (('INSERT', 'new', 0), ('UPDATE', 'new', 0), ('DELETE', 'old', 1)):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_change_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    DELETE FROM change_log WHERE entity = '{entity}' AND entity_key = {row}.{key};
+                    INSERT INTO change_log (entity, entity_key, deleted)
+                    VALUES ('{entity}', {row}.{key}, {deleted});
+                END
+            ''')
+
+        if not exists:
+            # Log rows that predate the change log so a first sync sees them
+            cursor.execute(f'''
+                INSERT INTO change_log (entity, entity_key)
+                SELECT '{entity}', {key} FROM {table}
+            ''')
+
+
+def changes_since(cursor, since=0, limit=MAX_SYNC_CHANGES):
+    """
+    Rows changed after a cursor, in change order
+
+    Args:
+        cursor: sqlite3 cursor
+        since: Sequence number the client last synced to (0 for everything)
+        limit: Maximum number of changed rows to return
+
+    Returns:
+        dict with the current row of each changed entity, deleted keys,
+        the next cursor and whether more changes remain
+    """
+    limit = max(1, min(int(limit), MAX_SYNC_CHANGES))
+    cursor.execute('''
+        SELECT seq, entity, entity_key, deleted
+        FROM change_log
+        WHERE seq > ?
+        ORDER BY seq
+        LIMIT ?
+    ''', (int(since), limit + 1))
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    result = {entity: [] for entity in SYNC_ENTITIES}
+    result['deleted'] = {entity: [] for entity in SYNC_ENTITIES}
+
+    # Group keys per entity so each table is read with one query
+    changed = {entity: [] for entity in SYNC_ENTITIES}
+    for _, entity, key, deleted in rows:
+        if entity not in SYNC_ENTITIES:
+            continue
+        if deleted:
+            result['deleted'][entity].append(key)
+        else:
+            changed[entity].append(key)
+
+    for entity, keys in changed.items():
+        if not keys:
+            continue
+        spec = SYNC_ENTITIES[entity]
+        cursor.execute(f'''
+            SELECT {', '.join(spec['columns'])}
+            FROM {spec['table']}
+            WHERE {spec['key']} IN ({','.join('?' * len(keys))})
+        ''', keys)
+        result[entity] = [dict(zip(spec['columns'], row)) for row in cursor.fetchall()]
+
+    result['cursor'] = rows[-1][0] if rows else int(since)
+    result['has_more'] = has_more
+    return result